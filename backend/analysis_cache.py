@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from backend.db import (
+    evict_cached_analyses,
+    get_cached_analysis,
+    has_cached_analysis,
+    put_cached_analysis,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _content_hash(
+    chunk_path: str,
+    start: float,
+    end: float,
+    source_hash: Optional[str] = None,
+    clip: bool = False,
+) -> str:
+    if source_hash:
+        # Chunks of an upload: the upload's hash plus the chunk's range in it.
+        # Known before anything is decoded, and the same on every run.
+        return f"video:{source_hash}:{start:.3f}-{end:.3f}"
+    if clip:
+        # A virtual chunk is a range of the whole upload; hashing the upload
+        # for every chunk would cost more than the analysis. Identify the
+        # file by path, size and mtime instead, plus the range.
+        stat = os.stat(chunk_path)
+        return (
+            f"clip:{os.path.realpath(chunk_path)}:{stat.st_size}:{stat.st_mtime_ns}:"
+            f"{start:.3f}-{end:.3f}"
+        )
+    digest = hashlib.sha256()
+    with open(chunk_path, "rb") as f:
+        while True:
+            block = f.read(1024 * 1024)
+            if not block:
+                break
+            digest.update(block)
+    return f"file:{digest.hexdigest()}"
+
+
+def config_fingerprint(use_case: Dict[str, Any]) -> str:
+    # Everything in the use case shapes the result: prompt and event list,
+    # frame sampling, activity threshold and frame packing.
+    raw = json.dumps(use_case, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class AnalysisCache:
+    # Mongo-backed cache of analyzer results keyed by chunk content, use case
+    # (name and settings) and the model that produced the result. Least
+    # recently used entries are evicted past max_entries; eviction runs once
+    # every evict_every writes, so the collection may briefly hold that many
+    # extra entries.
+    def __init__(self, max_entries: int = 100000, evict_every: Optional[int] = None):
+        self.max_entries = max_entries
+        self.evict_every = evict_every or max(1, max_entries // 100)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+
+    def content_hash(
+        self,
+        chunk_path: str,
+        start: float,
+        end: float,
+        source_hash: Optional[str] = None,
+        clip: bool = False,
+    ) -> Optional[str]:
+        try:
+            return _content_hash(chunk_path, start, end, source_hash, clip)
+        except OSError:
+            logger.warning("Could not hash chunk %s for the analysis cache", chunk_path)
+            return None
+
+    def make_key(
+        self,
+        content: Optional[str],
+        use_case_key: str,
+        use_case: Dict[str, Any],
+        model_name: str,
+    ) -> Optional[str]:
+        if content is None:
+            return None
+        raw = f"{content}|{use_case_key}|{config_fingerprint(use_case)}|{model_name}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            result = get_cached_analysis(key)
+        except Exception:
+            logger.exception("Analysis cache lookup failed")
+            with self._lock:
+                self.errors += 1
+            return None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def contains(self, key: str) -> bool:
+        # Does not count as a lookup; used to skip work ahead of one.
+        try:
+            return has_cached_analysis(key)
+        except Exception:
+            logger.exception("Analysis cache lookup failed")
+            return False
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        try:
+            put_cached_analysis(key, result)
+            with self._lock:
+                self._puts_since_evict += 1
+                evict = self._puts_since_evict >= self.evict_every
+                if evict:
+                    self._puts_since_evict = 0
+            if evict:
+                evict_cached_analyses(self.max_entries)
+        except Exception:
+            logger.exception("Analysis cache write failed")
+            with self._lock:
+                self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "max_entries": self.max_entries,
+                "evict_every": self.evict_every,
+            }
@@ -1,67 +1,193 @@
 import asyncio
+import base64
+import csv
+import functools
+import hashlib
+import io
 import json
+import logging
+import math
 import os
 import re
+import subprocess
 import threading
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 from uuid import uuid4
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+from bson import ObjectId
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from pymongo.errors import DuplicateKeyError
+from fastapi import (
+    BackgroundTasks,
+    FastAPI,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from sse_starlette.sse import EventSourceResponse
 
-from backend.config import DEFAULT_USE_CASE, USE_CASES, get_use_case
+from backend import db_async, uploads
+from backend.analysis_cache import AnalysisCache
+from backend.config import (
+    DEFAULT_PRIORITY,
+    DEFAULT_USE_CASE,
+    PRIORITY_CLASSES,
+    SHORT_CLIP_SECONDS,
+    USE_CASES,
+    get_use_case,
+)
 from backend.db import (
-    create_video,
-    get_db,
+    BatchWriter,
+    add_write_listener,
+    advance_video_run,
+    iter_events,
+    delete_chunk_jobs,
     get_video,
-    get_event,
+    get_video_keyframes,
     init_db,
-    list_events,
-    list_chunk_summaries,
-    search_chunk_summaries,
-    search_events,
+    list_videos_by_status,
+    maybe_mark_video_complete,
+    put_video_keyframes,
     to_object_id,
-    update_event,
     update_video,
 )
 from backend.event_processor import AlertBroker, ChunkTask, EventProcessor
 from backend.models import (
+    BulkReviewRequest,
+    CreateUploadRequest,
     EventOut,
     ReviewRequest,
     SearchRequest,
     StartMonitoringRequest,
+    StartStreamRequest,
     UploadResponse,
+    UploadSessionOut,
     UseCaseOut,
 )
-from backend.video_analyzer import GeminiVisionAnalyzer
-from backend.video_chunker import get_video_duration_seconds, split_video_to_chunks
+from backend.query_cache import QueryCache
+from backend.rate_limiter import RateLimiter
+from backend.renditions import parse_hls_ladder, prepare_renditions
+from backend.search import matching, merge_hits, semantic_index
+from backend.video_analyzer import (
+    GeminiVisionAnalyzer,
+    VideoFrameSampler,
+    frame_sampling_params,
+    select_frames,
+)
+from backend.video_chunker import (
+    cut_clip_command,
+    get_keyframe_times,
+    get_video_duration_seconds,
+    iter_stream_chunks,
+    iter_video_chunks,
+    plan_virtual_chunks,
+)
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent
 load_dotenv(dotenv_path=BASE_DIR / ".env")
 DATA_DIR = BASE_DIR / "data"
 UPLOAD_DIR = DATA_DIR / "uploads"
 CHUNKS_DIR = DATA_DIR / "chunks"
+RENDITIONS_DIR = DATA_DIR / "renditions"
 
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 CHUNKS_DIR.mkdir(parents=True, exist_ok=True)
+RENDITIONS_DIR.mkdir(parents=True, exist_ok=True)
 
 MONGODB_URI = os.getenv("MONGODB_URI", "")
 MONGODB_DB = os.getenv("MONGODB_DB", "sentinelai")
+# Startup creates missing indexes from db.INDEXES; with this set it also drops
+# indexes that are no longer listed there.
+MONGODB_DROP_UNLISTED_INDEXES = os.getenv("MONGODB_DROP_UNLISTED_INDEXES", "0") == "1"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
 DEFAULT_CHUNK_DURATION = int(os.getenv("CHUNK_DURATION_SECONDS", "6"))
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "4"))
+# Consecutive chunks of one video sent to Gemini in a single request.
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "1"))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "100000"))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "200"))
+DB_FLUSH_INTERVAL_SECONDS = float(os.getenv("DB_FLUSH_INTERVAL_SECONDS", "0.25"))
+# A leased chunk becomes visible to other workers again after this long.
+CHUNK_LEASE_SECONDS = float(os.getenv("CHUNK_LEASE_SECONDS", "300"))
+CHUNK_MAX_ATTEMPTS = int(os.getenv("CHUNK_MAX_ATTEMPTS", "3"))
+# Playback renditions built after upload: a faststart MP4 copy, and an HLS
+# ladder when HLS_LADDER lists "height:kbps" variants (e.g. "360:800,720:2500").
+PLAYBACK_FASTSTART = os.getenv("PLAYBACK_FASTSTART", "1") == "1"
+HLS_LADDER = parse_hls_ladder(os.getenv("HLS_LADDER", ""))
+# /source switches from the upload to the faststart copy, and renditions are
+# rebuilt in place under the same URLs, so clients revalidate every time; an
+# unchanged file costs a 304 against its ETag rather than the whole body.
+PLAYBACK_CACHE_CONTROL = "no-cache"
+HLS_CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+}
+# "files" writes every chunk to CHUNKS_DIR; "virtual" keeps only a keyframe
+# index and analyzes time ranges of the upload in place.
+CHUNK_MODE = os.getenv("CHUNK_MODE", "files")
+# Live streams use shorter chunks so alerts arrive within seconds, and keep
+# only the newest STREAM_RETENTION_CHUNKS chunk files on disk. Older chunks
+# still waiting for analysis are expired; chunks being analyzed are kept.
+STREAM_CHUNK_DURATION = int(os.getenv("STREAM_CHUNK_DURATION_SECONDS", "4"))
+STREAM_RETENTION_CHUNKS = int(os.getenv("STREAM_RETENTION_CHUNKS", "150"))
+# /api/search and /api/events responses are cached in process until a write
+# touches their video or the TTL runs out; 0 entries disables the cache.
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1000"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "30"))
+QUERY_CACHE_MAX_MB = float(os.getenv("QUERY_CACHE_MAX_MB", "64"))
+# Upper bound on the events one bulk review may change.
+BULK_REVIEW_MAX_EVENTS = int(os.getenv("BULK_REVIEW_MAX_EVENTS", "5000"))
+# Largest page /api/events returns; bigger result sets are paged with cursor.
+EVENTS_MAX_PAGE_SIZE = int(os.getenv("EVENTS_MAX_PAGE_SIZE", "500"))
+# Resumable upload sessions with no part for this long are expired and their
+# partial files deleted.
+UPLOAD_SESSION_TTL_SECONDS = float(os.getenv("UPLOAD_SESSION_TTL_SECONDS", "86400"))
+UPLOAD_SWEEP_INTERVAL_SECONDS = 600.0
 
 if not MONGODB_URI:
     raise RuntimeError("MONGODB_URI is not set")
 
-init_db(MONGODB_URI, MONGODB_DB)
+init_db(MONGODB_URI, MONGODB_DB, drop_unlisted_indexes=MONGODB_DROP_UNLISTED_INDEXES)
+query_cache = QueryCache(
+    max_entries=QUERY_CACHE_MAX_ENTRIES,
+    ttl_seconds=QUERY_CACHE_TTL_SECONDS,
+    max_bytes=int(QUERY_CACHE_MAX_MB * 1024 * 1024),
+)
+# New events and summaries reach the semantic index as they are written, and
+# drop cached query results for their video.
+add_write_listener(semantic_index.on_write)
+add_write_listener(query_cache.on_write)
+
 
-app = FastAPI(title="SentinelAI Backend")
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    alert_broker.bind_loop(asyncio.get_running_loop())
+    semantic_index.start_loading()
+    _resume_interrupted_videos()
+    upload_sweeper = asyncio.create_task(_sweep_upload_sessions())
+    yield
+    upload_sweeper.cancel()
+    semantic_index.stop()
+    # Make buffered events and summaries durable before exiting.
+    batch_writer.stop()
+
+
+app = FastAPI(title="SentinelAI Backend", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -69,15 +195,46 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-alert_broker = AlertBroker()
-analyzer = GeminiVisionAnalyzer(api_key=GEMINI_API_KEY, model_name=GEMINI_MODEL)
-processor = EventProcessor(analyzer=analyzer, alert_broker=alert_broker)
+alert_broker = AlertBroker(serializer=lambda event: json.dumps(serialize_event(event)))
+rate_limiter = RateLimiter(
+    requests_per_minute=GEMINI_RPM,
+    tokens_per_minute=GEMINI_TPM,
+    max_concurrency=ANALYSIS_WORKERS,
+)
+analyzer = GeminiVisionAnalyzer(
+    api_key=GEMINI_API_KEY,
+    model_name=GEMINI_MODEL,
+    rate_limiter=rate_limiter,
+)
+analysis_cache = (
+    AnalysisCache(max_entries=ANALYSIS_CACHE_MAX_ENTRIES)
+    if ANALYSIS_CACHE_MAX_ENTRIES > 0
+    else None
+)
+batch_writer = BatchWriter(
+    max_batch_size=DB_BATCH_SIZE,
+    flush_interval=DB_FLUSH_INTERVAL_SECONDS,
+)
+batch_writer.start()
+processor = EventProcessor(
+    analyzer=analyzer,
+    alert_broker=alert_broker,
+    writer=batch_writer,
+    num_workers=ANALYSIS_WORKERS,
+    cache=analysis_cache,
+    batch_size=ANALYSIS_BATCH_SIZE,
+    lease_seconds=CHUNK_LEASE_SECONDS,
+    max_attempts=CHUNK_MAX_ATTEMPTS,
+)
 processor.start()
 
 active_jobs: Dict[str, threading.Thread] = {}
 active_jobs_lock = threading.Lock()
+# How long start-monitoring waits for a stopped run's thread to exit.
+JOB_STOP_WAIT_SECONDS = 10.0
 
 
 def serialize_event(doc: Dict[str, Any]) -> Dict[str, Any]:
@@ -209,48 +366,318 @@ def _parse_datetime(value: str) -> datetime:
         raise HTTPException(status_code=400, detail=f"Invalid datetime: {value}") from exc
 
 
-def _process_video_job(video_id: str, use_case: str, chunk_duration: int) -> None:
+def _default_priority(video: Dict[str, Any]) -> str:
+    duration = float(video.get("duration_seconds") or 0)
+    if 0 < duration <= SHORT_CLIP_SECONDS:
+        return "high"
+    return DEFAULT_PRIORITY
+
+
+def _segmentation_error(exc: Exception) -> str:
+    # The end of ffmpeg's stderr says why it stopped; the command line does not.
+    if isinstance(exc, subprocess.CalledProcessError) and exc.stderr:
+        lines = exc.stderr.decode("utf-8", errors="ignore").strip().splitlines()
+        if lines:
+            return lines[-1][:400]
+    return (str(exc) or type(exc).__name__)[:400]
+
+
+def _virtual_chunk_ranges(
+    video_id: str, video: Dict[str, Any], chunk_duration: int
+) -> Optional[List[tuple[float, float]]]:
+    # Builds the keyframe index once per upload and returns the chunk time
+    # ranges, or None to fall back to writing chunk files.
+    try:
+        duration = float(video.get("duration_seconds") or 0)
+        if duration <= 0:
+            duration = get_video_duration_seconds(video["filepath"])
+        if duration <= 0:
+            return None
+        if get_video_keyframes(video_id) is None:
+            put_video_keyframes(video_id, get_keyframe_times(video["filepath"]))
+        update_video(
+            to_object_id(video_id),
+            {"chunk_mode": "virtual", "duration_seconds": duration},
+        )
+    except Exception:
+        logger.exception("Could not index %s; writing chunk files", video["filepath"])
+        return None
+    return plan_virtual_chunks(duration, chunk_duration)
+
+
+def _process_video_job(
+    video_id: str,
+    use_case: str,
+    chunk_duration: int,
+    resume: bool = False,
+    priority: Optional[str] = None,
+) -> None:
+    # Taken once: a stop sets this token, and a later start replaces the
+    # video's token, which this run must not pick up.
+    cancelled = processor.cancel_token(video_id)
     video = get_video(to_object_id(video_id))
     if not video:
         return
+    priority = priority or video.get("priority") or _default_priority(video)
+
+    run_generation = int(video.get("run_generation") or 0)
+    if not resume:
+        # A fresh run analyzes every chunk again; chunks of the previous run
+        # still being analyzed discard their results.
+        run_generation = advance_video_run(video_id)
+        delete_chunk_jobs(video_id)
+        # chunk_count starts as an estimate for the progress bar; the real
+        # count is written once segmentation finishes.
+        duration = float(video.get("duration_seconds") or 0)
+        update_video(
+            to_object_id(video_id),
+            {
+                "status": "processing",
+                "use_case": use_case,
+                "chunk_duration_seconds": chunk_duration,
+                "priority": priority,
+                "chunk_count": math.ceil(duration / chunk_duration) if duration else 0,
+                "chunks_processed": 0,
+                "chunks_failed": 0,
+                "chunks_skipped": 0,
+                "chunks_throttled": 0,
+                "segmentation_complete": False,
+                "segmentation_error": None,
+            },
+        )
 
-    update_video(to_object_id(video_id), {"status": "processing"})
-
-    chunks_output_dir = CHUNKS_DIR / video_id
+    chunk_ranges = None
+    if CHUNK_MODE == "virtual":
+        chunk_ranges = _virtual_chunk_ranges(video_id, video, chunk_duration)
+    if chunk_ranges is not None:
+        chunk_sources = (
+            (video["filepath"], start, end, True) for start, end in chunk_ranges
+        )
+    else:
+        chunk_sources = (
+            (chunk_path, start, end, False)
+            for chunk_path, start, end in iter_video_chunks(
+                video_path=video["filepath"],
+                output_dir=str(CHUNKS_DIR / video_id),
+                chunk_duration_seconds=chunk_duration,
+            )
+        )
+    # Frames for every chunk come from a single decode of the source, run
+    # alongside segmentation, and are assigned by each chunk's real start and
+    # end time; chunk files cut with stream copy do not end on multiples of
+    # chunk_duration. The processor holds a bounded number of chunks' frames
+    # in memory; segmentation and decoding wait for workers to claim them.
+    use_case_cfg = get_use_case(use_case)
+    interval, _ = frame_sampling_params(use_case_cfg, chunk_duration)
+    sampler = VideoFrameSampler(video["filepath"], frame_interval_seconds=interval)
+    total_chunks = 0
+    error = None
     try:
-        chunk_paths = split_video_to_chunks(
-            video_path=video["filepath"],
-            output_dir=str(chunks_output_dir),
-            chunk_duration_seconds=chunk_duration,
+        for idx, (chunk_path, start, end, virtual) in enumerate(chunk_sources):
+            if cancelled.is_set():
+                logger.info("Stopped segmenting video %s", video_id)
+                return
+            if idx == 0 and not resume:
+                update_video(to_object_id(video_id), {"status": "processing_events"})
+            if start is None or end is None:
+                start, end = idx * chunk_duration, (idx + 1) * chunk_duration
+            chunk_filename = Path(chunk_path).name
+            clip = None
+            if virtual:
+                # Same name a chunk file would have; get_chunk cuts it on demand.
+                chunk_filename = f"chunk_{idx:04d}.mp4"
+                clip = (start, end)
+
+            # total_chunks is unknown while segmenting; the processor checks
+            # completion against the video document instead. When resuming,
+            # chunks that are already queued or finished are left alone.
+            task = ChunkTask(
+                video_id=video_id,
+                chunk_path=chunk_path,
+                chunk_filename=chunk_filename,
+                chunk_index=idx,
+                timestamp_start=start,
+                timestamp_end=end,
+                use_case=use_case,
+                total_chunks=0,
+                priority=PRIORITY_CLASSES[priority],
+                clip_start=clip[0] if clip else None,
+                clip_end=clip[1] if clip else None,
+                run_generation=run_generation,
+                source_hash=video.get("sha256"),
+            )
+            # A chunk analyzed before (same upload, range and settings) is
+            # answered from the cache; its frames are skipped.
+            if not processor.has_cached_analysis(task, use_case_cfg):
+                _, frames_per_chunk = frame_sampling_params(use_case_cfg, end - start)
+                frames, frame_times = sampler.take(start, end, frames_per_chunk)
+                if frames:
+                    task.frames, task.frame_times = select_frames(
+                        frames, frame_times, use_case_cfg
+                    )
+
+            # Waits while earlier chunks' frames are still unclaimed.
+            if not processor.enqueue(task, cancelled) and cancelled.is_set():
+                logger.info("Stopped segmenting video %s", video_id)
+                return
+            total_chunks += 1
+    except Exception as exc:
+        logger.exception("Segmentation failed for video %s", video_id)
+        error = _segmentation_error(exc)
+    finally:
+        sampler.close()
+
+    if cancelled.is_set():
+        logger.info("Stopped segmenting video %s", video_id)
+        return
+
+    if total_chunks == 0:
+        update_video(
+            to_object_id(video_id), {"status": "failed", "segmentation_error": error}
         )
-    except Exception:
-        update_video(to_object_id(video_id), {"status": "failed"})
+        processor.forget_video(video_id)
         return
 
+    # Chunks queued before an error are still analyzed, but the rest of the
+    # video was never segmented: the error makes the video partial, not
+    # complete, once they are done.
     update_video(
         to_object_id(video_id),
-        {"chunk_count": len(chunk_paths), "chunks_processed": 0, "status": "queued"},
+        {
+            "chunk_count": total_chunks,
+            "segmentation_complete": True,
+            "segmentation_error": error,
+        },
     )
+    # Workers may already have finished every chunk before the count was known.
+    if maybe_mark_video_complete(video_id, 0, 0):
+        processor.forget_video(video_id)
+
+
+def _process_stream_job(
+    video_id: str,
+    use_case: str,
+    chunk_duration: int,
+    resume: bool = False,
+    priority: str = "high",
+) -> None:
+    cancelled = processor.cancel_token(video_id)
+    video = get_video(to_object_id(video_id))
+    if not video:
+        return
 
-    total_chunks = len(chunk_paths)
-    for idx, chunk_path in enumerate(chunk_paths):
-        chunk_filename = Path(chunk_path).name
-        timestamp_start = idx * chunk_duration
-        timestamp_end = timestamp_start + chunk_duration
-
-        task = ChunkTask(
-            video_id=video_id,
-            chunk_path=chunk_path,
-            chunk_filename=chunk_filename,
-            chunk_index=idx,
-            timestamp_start=timestamp_start,
-            timestamp_end=timestamp_end,
-            use_case=use_case,
-            total_chunks=total_chunks,
+    # Chunk numbering continues after a restart so jobs and files never clash.
+    start_index = int(video.get("chunk_count") or 0) if resume else 0
+    run_generation = int(video.get("run_generation") or 0)
+    if not resume:
+        run_generation = advance_video_run(video_id)
+        delete_chunk_jobs(video_id)
+        update_video(
+            to_object_id(video_id),
+            {
+                "status": "processing_events",
+                "use_case": use_case,
+                "chunk_duration_seconds": chunk_duration,
+                "priority": priority,
+                "chunk_count": 0,
+                "chunks_processed": 0,
+                "chunks_failed": 0,
+                "chunks_skipped": 0,
+                "chunks_throttled": 0,
+                "segmentation_complete": False,
+                "segmentation_error": None,
+                "stream_started_at": datetime.utcnow(),
+            },
         )
-        processor.enqueue(task)
 
-    update_video(to_object_id(video_id), {"status": "processing_events"})
+    total_chunks = start_index
+    error = None
+    try:
+        # Frames are extracted per chunk by the analyzer; there is no single
+        # decode of the whole source to share.
+        for idx, chunk_path in iter_stream_chunks(
+            video["stream_url"],
+            str(CHUNKS_DIR / video_id),
+            chunk_duration,
+            start_index=start_index,
+            retention_chunks=STREAM_RETENTION_CHUNKS,
+            stop_event=cancelled,
+            release_chunk=functools.partial(processor.release_chunk, video_id),
+        ):
+            if cancelled.is_set():
+                break
+            processor.enqueue(
+                ChunkTask(
+                    video_id=video_id,
+                    chunk_path=chunk_path,
+                    chunk_filename=Path(chunk_path).name,
+                    chunk_index=idx,
+                    timestamp_start=idx * chunk_duration,
+                    timestamp_end=(idx + 1) * chunk_duration,
+                    use_case=use_case,
+                    total_chunks=0,
+                    priority=PRIORITY_CLASSES[priority],
+                    run_generation=run_generation,
+                )
+            )
+            total_chunks = idx + 1
+            update_video(to_object_id(video_id), {"chunk_count": total_chunks})
+    except Exception as exc:
+        logger.exception("Stream ingestion failed for video %s", video_id)
+        error = _segmentation_error(exc)
+        if total_chunks == 0 and not cancelled.is_set():
+            update_video(
+                to_object_id(video_id),
+                {"status": "failed", "segmentation_error": error},
+            )
+            processor.forget_video(video_id)
+            return
+
+    if cancelled.is_set():
+        logger.info("Stopped stream for video %s", video_id)
+        return
+    # The source ended (or kept failing): finish once the last chunks are done.
+    # A source that kept failing leaves the stream partial.
+    update_video(
+        to_object_id(video_id),
+        {
+            "chunk_count": total_chunks,
+            "segmentation_complete": True,
+            "segmentation_error": error,
+        },
+    )
+    if maybe_mark_video_complete(video_id, 0, 0):
+        processor.forget_video(video_id)
+
+
+def _resume_interrupted_videos() -> None:
+    # Chunks already in chunk_jobs are picked up by the workers on their own.
+    # Videos whose segmentation was cut short are segmented again; chunks
+    # that were already queued keep their jobs and progress.
+    for video in list_videos_by_status(["processing", "processing_events"]):
+        if video.get("segmentation_complete"):
+            continue
+        video_id = str(video["_id"])
+        target = _process_video_job
+        if video.get("source") == "stream":
+            target = _process_stream_job
+        with active_jobs_lock:
+            if video_id in active_jobs:
+                continue
+            logger.info("Resuming segmentation for video %s", video_id)
+            t = threading.Thread(
+                target=target,
+                args=(
+                    video_id,
+                    video.get("use_case", DEFAULT_USE_CASE),
+                    int(video.get("chunk_duration_seconds") or DEFAULT_CHUNK_DURATION),
+                    True,
+                    video.get("priority") or DEFAULT_PRIORITY,
+                ),
+                daemon=True,
+            )
+            active_jobs[video_id] = t
+            t.start()
 
 
 @app.get("/health")
@@ -273,8 +700,85 @@ async def list_use_cases():
     return results
 
 
+def _probe_video_duration(video_id: str, filepath: str) -> None:
+    # Runs after the upload response is sent; ffprobe can take seconds on
+    # large files.
+    try:
+        duration = get_video_duration_seconds(filepath)
+    except Exception:
+        logger.exception("Could not probe duration of %s", filepath)
+        return
+    update_video(to_object_id(video_id), {"duration_seconds": duration})
+
+
+def _prepare_playback(video_id: str, filepath: str) -> None:
+    # Runs in the background after upload; until it finishes the source
+    # endpoint serves the original file, which it keeps doing if every
+    # rendition fails.
+    if not PLAYBACK_FASTSTART and not HLS_LADDER:
+        return
+    update_video(to_object_id(video_id), {"playback_status": "processing"})
+    try:
+        result = prepare_renditions(
+            filepath,
+            str(RENDITIONS_DIR / video_id),
+            faststart=PLAYBACK_FASTSTART,
+            hls_ladder=HLS_LADDER,
+        )
+    except Exception:
+        logger.exception("Preparing playback failed for video %s", video_id)
+        update_video(to_object_id(video_id), {"playback_status": "failed"})
+        return
+    status = "ready" if any(result.values()) else "failed"
+    update_video(to_object_id(video_id), {"playback_status": status, **result})
+
+
+async def _register_upload(
+    filepath: Path,
+    original_name: str,
+    use_case: str,
+    sha256: str,
+    background_tasks: BackgroundTasks,
+) -> UploadResponse:
+    # Same bytes as an earlier upload: reuse that video (and its analysis)
+    # instead of storing and processing the file again.
+    existing = await db_async.find_video_by_sha256(sha256)
+    if not existing:
+        try:
+            video_id = await db_async.create_video(
+                filename=filepath.name,
+                filepath=str(filepath),
+                use_case=use_case,
+                original_name=original_name,
+                sha256=sha256,
+            )
+        except DuplicateKeyError:
+            # A concurrent upload of the same bytes won the unique index.
+            existing = await db_async.find_video_by_sha256(sha256)
+            if not existing:
+                raise
+    if existing:
+        await asyncio.to_thread(filepath.unlink, True)
+        return UploadResponse(
+            video_id=str(existing["_id"]),
+            filename=existing["filename"],
+            use_case=existing.get("use_case", use_case),
+            status=existing.get("status", "uploaded"),
+        )
+
+    background_tasks.add_task(_probe_video_duration, str(video_id), str(filepath))
+    background_tasks.add_task(_prepare_playback, str(video_id), str(filepath))
+    return UploadResponse(
+        video_id=str(video_id),
+        filename=filepath.name,
+        use_case=use_case,
+        status="uploaded",
+    )
+
+
 @app.post("/api/upload", response_model=UploadResponse)
 async def upload_video(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     use_case: str = Form(DEFAULT_USE_CASE),
 ):
@@ -285,29 +789,179 @@ async def upload_video(
     filename = f"{unique_prefix}_{file.filename}"
     filepath = UPLOAD_DIR / filename
 
-    with open(filepath, "wb") as f:
+    async def file_chunks():
         while True:
-            chunk = await file.read(1024 * 1024)
+            chunk = await file.read(uploads.WRITE_BUFFER_BYTES)
             if not chunk:
                 break
-            f.write(chunk)
+            yield chunk
 
-    video_id = create_video(
-        filename=filename,
-        filepath=str(filepath),
-        use_case=use_case,
-        original_name=file.filename,
+    hasher = hashlib.sha256()
+    written, interrupted = await uploads.write_stream(
+        str(filepath), 0, file_chunks(), hasher
     )
+    if interrupted or not written:
+        await asyncio.to_thread(filepath.unlink, True)
+        detail = "Upload interrupted" if interrupted else "Empty upload"
+        raise HTTPException(status_code=400, detail=detail)
 
-    duration = get_video_duration_seconds(str(filepath))
-    update_video(video_id, {"duration_seconds": duration})
+    return await _register_upload(
+        filepath, file.filename, use_case, hasher.hexdigest(), background_tasks
+    )
 
-    return UploadResponse(
-        video_id=str(video_id),
-        filename=filename,
+
+def _upload_session_out(upload: Dict[str, Any]) -> UploadSessionOut:
+    return UploadSessionOut(
+        upload_id=str(upload["_id"]),
+        offset=int(upload.get("offset", 0)),
+        size=upload.get("size"),
+        status=upload.get("status", "uploading"),
+        video_id=upload.get("video_id"),
+    )
+
+
+async def _get_upload_or_404(upload_id: str) -> Dict[str, Any]:
+    upload = await db_async.get_upload(to_object_id(upload_id))
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+
+# Only one part may be written to an upload at a time.
+upload_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _check_uploading(upload: Dict[str, Any]) -> None:
+    status = upload.get("status", "uploading")
+    if status == "expired":
+        raise HTTPException(status_code=410, detail="Upload session expired")
+    if status != "uploading":
+        raise HTTPException(status_code=409, detail="Upload already completed")
+
+
+async def _sweep_upload_sessions() -> None:
+    # Expires sessions abandoned mid-upload and drops the in-memory state
+    # (locks, hashers) of sessions that are no longer uploading.
+    while True:
+        await asyncio.sleep(UPLOAD_SWEEP_INTERVAL_SECONDS)
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)
+            for upload in await db_async.list_stale_uploads(cutoff):
+                upload_id = str(upload["_id"])
+                lock = upload_locks.get(upload_id)
+                if lock is not None and lock.locked():
+                    continue
+                if not await db_async.expire_upload(upload["_id"], cutoff):
+                    continue
+                logger.info("Expired upload session %s", upload_id)
+                await asyncio.to_thread(Path(upload["filepath"]).unlink, True)
+                uploads.forget_hasher(upload_id)
+                upload_locks.pop(upload_id, None)
+            for upload_id in set(upload_locks) | set(uploads.hasher_ids()):
+                lock = upload_locks.get(upload_id)
+                if lock is not None and lock.locked():
+                    continue
+                upload = await db_async.get_upload(to_object_id(upload_id))
+                if upload is None or upload.get("status") != "uploading":
+                    uploads.forget_hasher(upload_id)
+                    upload_locks.pop(upload_id, None)
+        except Exception:
+            logger.exception("Sweeping upload sessions failed")
+
+
+@app.post("/api/uploads", response_model=UploadSessionOut)
+async def create_upload_session(request: CreateUploadRequest):
+    use_case = request.use_case or DEFAULT_USE_CASE
+    if use_case not in USE_CASES:
+        raise HTTPException(status_code=400, detail="Invalid use case")
+    original_name = Path(request.filename).name
+    if not original_name:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    filepath = UPLOAD_DIR / f"{uuid4().hex}_{original_name}"
+    upload_id = await db_async.create_upload(
+        filename=original_name,
+        filepath=str(filepath),
         use_case=use_case,
-        status="uploaded",
+        size=request.size,
     )
+    return _upload_session_out(await db_async.get_upload(upload_id))
+
+
+@app.get("/api/uploads/{upload_id}", response_model=UploadSessionOut)
+async def get_upload_session(upload_id: str):
+    return _upload_session_out(await _get_upload_or_404(upload_id))
+
+
+@app.put("/api/uploads/{upload_id}", response_model=UploadSessionOut)
+async def upload_part(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+):
+    upload = await _get_upload_or_404(upload_id)
+    _check_uploading(upload)
+    lock = upload_locks.setdefault(upload_id, asyncio.Lock())
+    if lock.locked():
+        raise HTTPException(status_code=409, detail="A part is already being uploaded")
+    async with lock:
+        upload = await _get_upload_or_404(upload_id)
+        _check_uploading(upload)
+        offset = int(upload.get("offset", 0))
+        if upload_offset != offset:
+            # The client resumes from the offset we report.
+            return JSONResponse(
+                status_code=409,
+                content=_upload_session_out(upload).model_dump(),
+            )
+        hasher = await uploads.get_hasher(upload_id, upload["filepath"], offset)
+        written, _ = await uploads.write_stream(
+            upload["filepath"], offset, request.stream(), hasher, upload_id=upload_id
+        )
+        await db_async.update_upload(upload["_id"], {"offset": offset + written})
+        upload["offset"] = offset + written
+    return _upload_session_out(upload)
+
+
+@app.post("/api/uploads/{upload_id}/complete", response_model=UploadResponse)
+async def complete_upload(upload_id: str, background_tasks: BackgroundTasks):
+    upload = await _get_upload_or_404(upload_id)
+    lock = upload_locks.setdefault(upload_id, asyncio.Lock())
+    async with lock:
+        upload = await _get_upload_or_404(upload_id)
+        if upload.get("status") == "expired":
+            raise HTTPException(status_code=410, detail="Upload session expired")
+        if upload.get("status") == "complete":
+            video = await db_async.get_video(to_object_id(upload["video_id"]))
+            if video:
+                return UploadResponse(
+                    video_id=str(video["_id"]),
+                    filename=video["filename"],
+                    use_case=video.get("use_case", upload["use_case"]),
+                    status=video.get("status", "uploaded"),
+                )
+        offset = int(upload.get("offset", 0))
+        if upload.get("size") is not None and offset != upload["size"]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Upload incomplete: {offset} of {upload['size']} bytes",
+            )
+        if offset == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        filepath = Path(upload["filepath"])
+        hasher = await uploads.get_hasher(upload_id, str(filepath), offset)
+        response = await _register_upload(
+            filepath,
+            upload["filename"],
+            upload["use_case"],
+            hasher.hexdigest(),
+            background_tasks,
+        )
+        await db_async.update_upload(
+            upload["_id"], {"status": "complete", "video_id": response.video_id}
+        )
+    uploads.forget_hasher(upload_id)
+    upload_locks.pop(upload_id, None)
+    return response
 
 
 @app.post("/api/start-monitoring")
@@ -317,20 +971,41 @@ async def start_monitoring(request: StartMonitoringRequest):
     except KeyError:
         raise HTTPException(status_code=400, detail="Invalid use case")
 
-    video = get_video(to_object_id(request.video_id))
+    video = await db_async.get_video(to_object_id(request.video_id))
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
 
     use_case = request.use_case or video.get("use_case", DEFAULT_USE_CASE)
     chunk_duration = request.chunk_duration_seconds or DEFAULT_CHUNK_DURATION
+    if request.priority and request.priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail="Invalid priority")
+    priority = request.priority or _default_priority(video)
 
     with active_jobs_lock:
-        if request.video_id in active_jobs:
+        previous = active_jobs.get(request.video_id)
+    if previous is not None:
+        if not processor.is_cancelled(request.video_id):
             raise HTTPException(status_code=409, detail="Monitoring already started")
+        # Stopped, but its segmentation loop only notices at the next chunk.
+        # Starting over before it exits would run two loops on one video.
+        await asyncio.to_thread(previous.join, JOB_STOP_WAIT_SECONDS)
+        if previous.is_alive():
+            raise HTTPException(
+                status_code=409, detail="Previous run is still stopping"
+            )
 
+    with active_jobs_lock:
+        if active_jobs.get(request.video_id) is not previous:
+            raise HTTPException(status_code=409, detail="Monitoring already started")
+
+        processor.reset_video(request.video_id)
         t = threading.Thread(
-            target=_process_video_job,
-            args=(request.video_id, use_case, chunk_duration),
+            target=(
+                _process_stream_job
+                if video.get("source") == "stream"
+                else _process_video_job
+            ),
+            args=(request.video_id, use_case, chunk_duration, False, priority),
             daemon=True,
         )
         active_jobs[request.video_id] = t
@@ -339,21 +1014,68 @@ async def start_monitoring(request: StartMonitoringRequest):
     return {"status": "started", "video_id": request.video_id}
 
 
+@app.post("/api/streams")
+async def start_stream(request: StartStreamRequest):
+    use_case = request.use_case or DEFAULT_USE_CASE
+    if use_case not in USE_CASES:
+        raise HTTPException(status_code=400, detail="Invalid use case")
+    priority = request.priority or "high"
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail="Invalid priority")
+    chunk_duration = request.chunk_duration_seconds or STREAM_CHUNK_DURATION
+
+    name = request.name or request.url
+    video_id = await db_async.create_video(
+        filename=name,
+        filepath=request.url,
+        use_case=use_case,
+        original_name=name,
+    )
+    await db_async.update_video(
+        video_id, {"source": "stream", "stream_url": request.url}
+    )
+
+    # Stopped with /api/stop-monitoring?video_id=..., like uploaded videos.
+    with active_jobs_lock:
+        t = threading.Thread(
+            target=_process_stream_job,
+            args=(str(video_id), use_case, chunk_duration, False, priority),
+            daemon=True,
+        )
+        active_jobs[str(video_id)] = t
+        t.start()
+
+    return {"status": "started", "video_id": str(video_id)}
+
+
 @app.post("/api/stop-monitoring")
 async def stop_monitoring(video_id: Optional[str] = None):
-    processor.clear_queue()
-    if video_id:
-        update_video(to_object_id(video_id), {"status": "stopped"})
-        with active_jobs_lock:
-            active_jobs.pop(video_id, None)
+    if not video_id:
+        await asyncio.to_thread(processor.clear_queue)
+    else:
+        # Only this video's chunks are dropped; in-flight ones discard their
+        # results instead of storing them.
+        await asyncio.to_thread(processor.cancel_video, video_id)
+        await db_async.update_video(to_object_id(video_id), {"status": "stopped"})
+        # The job thread stays registered until it exits, so a restart can
+        # wait for it.
     return {"status": "stopped"}
 
 
 @app.get("/api/status")
 async def status():
     return {
-        "queue_size": processor.queue.qsize(),
-        "active_jobs": list(active_jobs.keys()),
+        "queue_size": await db_async.count_chunk_jobs(["queued"]),
+        "workers": processor.num_workers,
+        "batch_size": processor.batch_size,
+        "active_jobs": [
+            video_id for video_id, job in list(active_jobs.items()) if job.is_alive()
+        ],
+        "analysis_cache": analysis_cache.stats() if analysis_cache else None,
+        "alert_stream": alert_broker.stats(),
+        "gemini": analyzer.stats(),
+        "semantic_index": semantic_index.stats(),
+        "query_cache": query_cache.stats(),
     }
 
 
@@ -374,48 +1096,17 @@ async def analytics(
             time_filter["$lte"] = _parse_datetime(to_date)
         filters["detected_at"] = time_filter
 
-    db = get_db()
-    total = db.events.count_documents(filters)
-    confirmed = db.events.count_documents({**filters, "status": "confirmed"})
-    dismissed = db.events.count_documents({**filters, "status": "dismissed"})
-
-    avg_conf = 0.0
-    if total > 0:
-        agg = list(
-            db.events.aggregate(
-                [
-                    {"$match": filters},
-                    {"$group": {"_id": None, "avg": {"$avg": "$confidence"}}},
-                ]
-            )
-        )
-        if agg:
-            avg_conf = float(agg[0].get("avg") or 0.0)
+    stats = await db_async.event_analytics(filters)
+    total = stats["total"]
+    confirmed = stats["confirmed"]
+    dismissed = stats["dismissed"]
+    avg_conf = stats["avg_confidence"]
 
     denom = confirmed + dismissed
     ai_accuracy = (confirmed / denom) if denom > 0 else 0.0
 
     event_stats = []
-    pipeline = [
-        {"$match": filters},
-        {
-            "$group": {
-                "_id": "$event_type",
-                "count": {"$sum": 1},
-                "confirmed": {
-                    "$sum": {
-                        "$cond": [{"$eq": ["$status", "confirmed"]}, 1, 0]
-                    }
-                },
-                "dismissed": {
-                    "$sum": {
-                        "$cond": [{"$eq": ["$status", "dismissed"]}, 1, 0]
-                    }
-                },
-            }
-        },
-    ]
-    for row in db.events.aggregate(pipeline):
+    for row in stats["by_type"]:
         row_confirmed = int(row.get("confirmed") or 0)
         row_dismissed = int(row.get("dismissed") or 0)
         row_denom = row_confirmed + row_dismissed
@@ -446,7 +1137,7 @@ async def analytics(
 
 @app.get("/api/videos/{video_id}")
 async def get_video_info(video_id: str):
-    video = get_video(to_object_id(video_id))
+    video = await db_async.get_video(to_object_id(video_id))
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
     return {
@@ -455,48 +1146,130 @@ async def get_video_info(video_id: str):
         "original_name": video.get("original_name"),
         "use_case": video.get("use_case"),
         "status": video.get("status"),
+        "segmentation_error": video.get("segmentation_error"),
         "chunk_count": video.get("chunk_count", 0),
         "chunks_processed": video.get("chunks_processed", 0),
+        "chunks_skipped": video.get("chunks_skipped", 0),
+        "chunks_failed": video.get("chunks_failed", 0),
+        "chunks_throttled": video.get("chunks_throttled", 0),
         "duration_seconds": video.get("duration_seconds", 0),
         "source_url": f"/api/videos/{video_id}/source",
+        "playback_status": video.get("playback_status"),
+        "hls_url": (
+            f"/api/videos/{video_id}/hls/master.m3u8"
+            if video.get("hls_master")
+            else None
+        ),
     }
 
 
 @app.get("/api/videos/{video_id}/processing")
 async def get_processing(video_id: str):
-    video = get_video(to_object_id(video_id))
+    video = await db_async.get_video(to_object_id(video_id))
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
     total = int(video.get("chunk_count", 0) or 0)
     done = int(video.get("chunks_processed", 0) or 0)
     failed = int(video.get("chunks_failed", 0) or 0)
+    skipped = int(video.get("chunks_skipped", 0) or 0)
     progress = int((done / total) * 100) if total > 0 else 0
     return {
         "progress": progress,
         "chunksAnalyzed": done,
         "totalChunks": total,
         "failedChunks": failed,
+        "skippedChunks": skipped,
+        "throttledChunks": int(video.get("chunks_throttled", 0) or 0),
+        "status": video.get("status"),
+        "segmentationError": video.get("segmentation_error"),
     }
 
 
+def _playback_file_response(
+    path: Path, media_type: str, if_none_match: Optional[str]
+) -> Response:
+    # FileResponse sets an ETag but does not answer conditional requests.
+    stat = path.stat()
+    tag = hashlib.md5(
+        f"{path}-{stat.st_mtime_ns}-{stat.st_size}".encode("utf-8")
+    ).hexdigest()
+    headers = {"Cache-Control": PLAYBACK_CACHE_CONTROL, "ETag": f'"{tag}"'}
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or headers["ETag"] in [t.strip() for t in if_none_match.split(",")]
+    ):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path=str(path), media_type=media_type, headers=headers)
+
+
 @app.get("/api/videos/{video_id}/source")
-async def get_video_source(video_id: str):
-    video = get_video(to_object_id(video_id))
+async def get_video_source(
+    video_id: str, if_none_match: Optional[str] = Header(default=None)
+):
+    video = await db_async.get_video(to_object_id(video_id))
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
+    # Prefer the faststart copy: its index comes first, so the player can
+    # seek with a couple of range requests instead of reading the whole file.
     path = Path(video.get("filepath", ""))
+    faststart_path = video.get("faststart_path")
+    if faststart_path and Path(faststart_path).exists():
+        path = Path(faststart_path)
     if not path.exists():
         raise HTTPException(status_code=404, detail="Source file not found")
-    return FileResponse(path=str(path), media_type="video/mp4")
+    return _playback_file_response(path, "video/mp4", if_none_match)
 
 
-@app.get("/api/events", response_model=List[EventOut])
-async def get_events(
-    status: Optional[str] = None,
-    event_type: Optional[str] = None,
-    video_id: Optional[str] = None,
-    limit: int = 50,
+@app.get("/api/videos/{video_id}/hls/{asset_path:path}")
+async def get_video_hls(
+    video_id: str,
+    asset_path: str,
+    if_none_match: Optional[str] = Header(default=None),
 ):
+    hls_dir = (RENDITIONS_DIR / video_id / "hls").resolve()
+    path = (hls_dir / asset_path).resolve()
+    media_type = HLS_CONTENT_TYPES.get(path.suffix)
+    if media_type is None or hls_dir not in path.parents or not path.is_file():
+        raise HTTPException(status_code=404, detail="Playlist or segment not found")
+    return _playback_file_response(path, media_type, if_none_match)
+
+
+# Fields selectable with ?fields= on /api/events and its export.
+EVENT_FIELDS = [name for name in EventOut.model_fields if name != "id"]
+EXPORT_BATCH_SIZE = 1000
+
+
+def _encode_event_cursor(doc: Dict[str, Any]) -> str:
+    raw = f"{doc['detected_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_event_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        detected_at, event_id = raw.split("|")
+        return datetime.fromisoformat(detected_at), to_object_id(event_id)
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
+
+def _parse_event_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in EVENT_FIELDS and name != "id"]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return [name for name in names if name != "id"] or None
+
+
+def _event_filters(
+    status: Optional[str],
+    event_type: Optional[str],
+    video_id: Optional[str],
+) -> Dict[str, Any]:
     filters: Dict[str, Any] = {}
     if status:
         filters["status"] = status
@@ -504,29 +1277,182 @@ async def get_events(
         filters["event_type"] = event_type
     if video_id:
         filters["video_id"] = video_id
+    return filters
 
-    events = list_events(filters, limit=limit)
-    return serialize_events(events)
+
+@app.get("/api/events", response_model=List[EventOut])
+async def get_events(
+    response: Response,
+    status: Optional[str] = None,
+    event_type: Optional[str] = None,
+    video_id: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=EVENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    # Pages newest first; pass the X-Next-Cursor header of a response as
+    # cursor to get the next page. The header is absent on the last page.
+    filters = _event_filters(status, event_type, video_id)
+    after = _decode_event_cursor(cursor) if cursor else None
+    projection = _parse_event_fields(fields)
+
+    key = query_cache.make_key(
+        "events", limit=limit, cursor=cursor, fields=fields, **filters
+    )
+    page = query_cache.get(key)
+    if page is None:
+        scope = video_id or None
+        generation = query_cache.generation(scope)
+        docs = await db_async.list_events(
+            filters, limit=limit, after=after, fields=projection
+        )
+        next_cursor = _encode_event_cursor(docs[-1]) if len(docs) == limit else None
+        page = (serialize_events(docs), next_cursor)
+        query_cache.put(key, page, scope, generation)
+    events, next_cursor = page
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if projection:
+        # Partial documents do not validate against EventOut.
+        return JSONResponse(events, headers=headers)
+    response.headers.update(headers)
+    return events
+
+
+def _export_lines(
+    docs, export_format: str, columns: List[str], batch_rows: int = 500
+):
+    # Yields the export a few hundred rows at a time; only the current rows
+    # are held in memory.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+    if writer:
+        writer.writerow(columns)
+    rows = 0
+    for doc in docs:
+        event = serialize_event(doc)
+        if writer:
+            writer.writerow(
+                ["" if event.get(column) is None else event[column] for column in columns]
+            )
+        else:
+            buffer.write(json.dumps(event, default=str))
+            buffer.write("\n")
+        rows += 1
+        if rows % batch_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@app.get("/api/events/export")
+async def export_events(
+    format: str = "ndjson",
+    status: Optional[str] = None,
+    event_type: Optional[str] = None,
+    video_id: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    export_format = format.lower()
+    if export_format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    filters = _event_filters(status, event_type, video_id)
+    if from_date or to_date:
+        time_filter: Dict[str, Any] = {}
+        if from_date:
+            time_filter["$gte"] = _parse_datetime(from_date)
+        if to_date:
+            time_filter["$lte"] = _parse_datetime(to_date)
+        filters["detected_at"] = time_filter
+    projection = _parse_event_fields(fields)
+    columns = ["id", *(projection or EVENT_FIELDS)]
+
+    # A sync generator: Starlette iterates it on a worker thread, so each
+    # cursor batch is fetched off the event loop.
+    docs = iter_events(filters, projection, batch_size=EXPORT_BATCH_SIZE)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return StreamingResponse(
+        _export_lines(docs, export_format, columns),
+        media_type="text/csv" if export_format == "csv" else "application/x-ndjson",
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="events-{stamp}.{export_format}"'
+            )
+        },
+    )
 
 
 @app.get("/api/events/stream")
-async def stream_events():
-    subscriber = alert_broker.subscribe()
+async def stream_events(last_event_id: Optional[str] = Header(default=None)):
+    replay_after = None
+    if last_event_id and last_event_id.isdigit():
+        replay_after = int(last_event_id)
+    subscriber = alert_broker.subscribe(last_event_id=replay_after)
 
     async def event_generator():
         try:
             while True:
-                data = await asyncio.to_thread(subscriber.get)
-                yield {
-                    "event": "alert",
-                    "data": json.dumps(serialize_event(data)),
-                }
+                event_id, data = await subscriber.get()
+                yield {"event": "alert", "id": str(event_id), "data": data}
         finally:
             alert_broker.unsubscribe(subscriber)
 
     return EventSourceResponse(event_generator())
 
 
+@app.post("/api/events/review")
+async def review_events(review: BulkReviewRequest):
+    # Reviews many events at once, selected by id or by filter. Events whose
+    # status changed concurrently, or that do not exist, come back in
+    # "skipped" so they can be reviewed again.
+    if (review.event_ids is None) == (review.filter is None):
+        raise HTTPException(
+            status_code=400, detail="Provide exactly one of event_ids or filter"
+        )
+    event_ids = None
+    filters = None
+    if review.event_ids is not None:
+        if len(review.event_ids) > BULK_REVIEW_MAX_EVENTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {BULK_REVIEW_MAX_EVENTS} events per review",
+            )
+        invalid = [value for value in review.event_ids if not ObjectId.is_valid(value)]
+        if invalid:
+            raise HTTPException(
+                status_code=400, detail=f"Invalid event ids: {', '.join(invalid[:10])}"
+            )
+        event_ids = [to_object_id(value) for value in review.event_ids]
+    else:
+        filters = _event_filters(
+            review.filter.status, review.filter.event_type, review.filter.video_id
+        )
+        if not filters:
+            raise HTTPException(status_code=400, detail="filter must not be empty")
+
+    fields: Dict[str, Any] = {
+        "status": review.status,
+        "severity": review.severity,
+        "reviewer_notes": review.reviewer_notes,
+    }
+    try:
+        updated, skipped = await db_async.review_events(
+            fields,
+            event_ids=event_ids,
+            filters=filters,
+            max_events=BULK_REVIEW_MAX_EVENTS,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {
+        "updated": serialize_events(updated),
+        "skipped": [str(event_id) for event_id in skipped],
+    }
+
+
 @app.post("/api/events/{event_id}/review")
 async def review_event(event_id: str, review: ReviewRequest):
     fields: Dict[str, Any] = {
@@ -535,15 +1461,47 @@ async def review_event(event_id: str, review: ReviewRequest):
         "reviewer_notes": review.reviewer_notes,
         "reviewed_at": datetime.utcnow(),
     }
-    update_event(to_object_id(event_id), fields)
-    updated = get_event(to_object_id(event_id))
+    updated = await db_async.update_event(to_object_id(event_id), fields)
     if not updated:
         raise HTTPException(status_code=404, detail="Event not found")
     return serialize_event(updated)
 
 
+async def _semantic_search(
+    query: str, collection: str, filters: Dict[str, Any], limit: int
+) -> List[Dict[str, Any]]:
+    hits = await asyncio.to_thread(
+        semantic_index.query, query, collection, filters, limit
+    )
+    if not hits:
+        return []
+    docs = await db_async.get_documents_by_ids(collection, [doc_id for doc_id, _ in hits])
+    return matching(docs, filters)
+
+
 @app.post("/api/search")
 async def search(request: SearchRequest):
+    key = query_cache.make_key(
+        "search",
+        query=request.query or "",
+        limit=request.limit,
+        status=request.status,
+        event_type=request.event_type,
+        video_id=request.video_id,
+        mode=(request.mode or "monitor").lower(),
+        semantic=semantic_index.ready,
+    )
+    cached = query_cache.get(key)
+    if cached is not None:
+        return cached
+    scope = request.video_id or None
+    generation = query_cache.generation(scope)
+    response = await _run_search(request)
+    query_cache.put(key, response, scope, generation)
+    return response
+
+
+async def _run_search(request: SearchRequest) -> Dict[str, Any]:
     filters: Dict[str, Any] = {}
     if request.status:
         filters["status"] = request.status
@@ -564,6 +1522,9 @@ async def search(request: SearchRequest):
     if query:
         tokens = [t for t in re.split(r"\\W+", query) if t]
         regex = "|".join(re.escape(token) for token in tokens) if tokens else None
+        # The regex fallback scans whole collections; it is only used until the
+        # semantic index has loaded.
+        semantic = semantic_index.supports(filters)
 
         if target_seconds is not None and request.video_id:
             window = 15
@@ -573,37 +1534,48 @@ async def search(request: SearchRequest):
                     "$lte": target_seconds + window,
                 }
             }
-            summary_hits = list_chunk_summaries(
+            summary_hits = await db_async.list_chunk_summaries(
                 {**filters, **time_filter},
                 limit=request.limit,
             )
             summary_hits.sort(
                 key=lambda item: abs((item.get("timestamp_start") or 0) - target_seconds)
             )
-            time_event_hits = list_events(
+            time_event_hits = await db_async.list_events(
                 {**filters, **time_filter},
                 limit=request.limit,
             )
         else:
+            if semantic:
+                summary_hits = await _semantic_search(
+                    query, "chunk_summaries", filters, request.limit
+                )
+            # The text index finds words the embedding has no concept for (a
+            # name, an id, a number, an unlisted synonym); both rankings are
+            # merged.
             try:
-                summary_hits = search_chunk_summaries(
+                text_hits = await db_async.search_chunk_summaries(
                     query, filters, limit=request.limit
                 )
             except Exception:
-                summary_hits = []
+                text_hits = []
+            summary_hits = merge_hits(summary_hits, text_hits, limit=request.limit)
 
-            if not summary_hits and regex:
+            if not summary_hits and regex and not semantic:
                 regex_filter = {"summary": {"$regex": regex, "$options": "i"}}
-                summary_hits = list_chunk_summaries(
+                summary_hits = await db_async.list_chunk_summaries(
                     {**filters, **regex_filter},
                     limit=request.limit,
                 )
 
+        if semantic:
+            event_hits = await _semantic_search(query, "events", filters, request.limit)
         try:
-            event_hits = search_events(query, filters, limit=request.limit)
+            text_hits = await db_async.search_events(query, filters, limit=request.limit)
         except Exception:
-            event_hits = []
-        if not event_hits:
+            text_hits = []
+        event_hits = merge_hits(event_hits, text_hits, limit=request.limit)
+        if not event_hits and not semantic:
             if regex:
                 regex_filter = {
                     "$or": [
@@ -612,15 +1584,15 @@ async def search(request: SearchRequest):
                         {"explanation": {"$regex": regex, "$options": "i"}},
                     ]
                 }
-                event_hits = list_events(
+                event_hits = await db_async.list_events(
                     {**filters, **regex_filter},
                     limit=request.limit,
                 )
 
         if not summary_hits and request.video_id:
-            summary_hits = list_chunk_summaries(filters, limit=request.limit)
+            summary_hits = await db_async.list_chunk_summaries(filters, limit=request.limit)
     else:
-        event_hits = list_events(filters, limit=request.limit)
+        event_hits = await db_async.list_events(filters, limit=request.limit)
 
     # Merge in time-based events (if any) without duplicates
     if time_event_hits:
@@ -659,9 +1631,45 @@ async def search(request: SearchRequest):
 @app.get("/api/video/{video_id}/{chunk_filename}")
 async def get_chunk(video_id: str, chunk_filename: str):
     path = CHUNKS_DIR / video_id / chunk_filename
-    if not path.exists():
+    if path.exists():
+        return FileResponse(path=str(path), media_type="video/mp4")
+
+    # Virtual chunks have no file; cut the range from the upload on demand.
+    match = re.fullmatch(r"chunk_(\d+)\.mp4", chunk_filename)
+    video = await db_async.get_video(to_object_id(video_id)) if match else None
+    if not video or video.get("chunk_mode") != "virtual":
+        raise HTTPException(status_code=404, detail="Chunk not found")
+    chunk_duration = float(video.get("chunk_duration_seconds") or DEFAULT_CHUNK_DURATION)
+    duration = float(video.get("duration_seconds") or 0)
+    start = int(match.group(1)) * chunk_duration
+    if start >= duration:
         raise HTTPException(status_code=404, detail="Chunk not found")
-    return FileResponse(path=str(path), media_type="video/mp4")
+    cmd = cut_clip_command(
+        video["filepath"],
+        start,
+        min(start + chunk_duration, duration),
+        await db_async.get_video_keyframes(video_id) or [],
+    )
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+
+    async def clip_body():
+        try:
+            while True:
+                block = await proc.stdout.read(64 * 1024)
+                if not block:
+                    break
+                yield block
+        finally:
+            if proc.returncode is None:
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass
+            await proc.wait()
+
+    return StreamingResponse(clip_body(), media_type="video/mp4")
 
 
 @app.exception_handler(RuntimeError)
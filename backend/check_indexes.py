@@ -0,0 +1,400 @@
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, MongoClient
+
+from backend.db import EVENT_ORDER, event_analytics_pipeline, sync_indexes
+
+# Plan stages that mean a query is not served by an index.
+BAD_STAGES = {"COLLSCAN", "SORT"}
+# Scratch database names must end with this, so a typo in --db cannot drop
+# a real database.
+SCRATCH_SUFFIX = "_index_check"
+
+# The filter and sort of every query in backend/db.py, with representative
+# values. "analytics" shapes are the filters of event_analytics, explained as
+# the aggregation it actually runs. "allow" lists bad stages a shape cannot
+# avoid: $text matches come back in relevance order, so sorting them by
+# detected_at is always in memory, and a lookup by unique key sorts at most
+# one document.
+QUERY_SHAPES: List[Dict[str, Any]] = [
+    {"name": "get_video", "collection": "videos", "filter": {"_id": 1}},
+    {
+        "name": "find_video_by_sha256",
+        "collection": "videos",
+        "filter": {"sha256": "hash-1"},
+        "sort": [("upload_time", ASCENDING)],
+        "allow": {"SORT"},
+    },
+    {
+        "name": "list_stale_uploads",
+        "collection": "uploads",
+        "filter": {"status": "uploading", "updated_at": {"$lt": datetime(2024, 1, 2)}},
+    },
+    {
+        "name": "list_videos_by_status",
+        "collection": "videos",
+        "filter": {"status": {"$in": ["processing", "processing_events"]}},
+    },
+    {
+        "name": "list_events",
+        "collection": "events",
+        "filter": {},
+        "sort": EVENT_ORDER,
+    },
+    {
+        "name": "list_events by video",
+        "collection": "events",
+        "filter": {"video_id": "video-1"},
+        "sort": EVENT_ORDER,
+    },
+    {
+        "name": "list_events by status",
+        "collection": "events",
+        "filter": {"status": "new"},
+        "sort": EVENT_ORDER,
+    },
+    {
+        "name": "list_events by event_type",
+        "collection": "events",
+        "filter": {"event_type": "fall"},
+        "sort": EVENT_ORDER,
+    },
+    {
+        "name": "list_events by video and status",
+        "collection": "events",
+        "filter": {"video_id": "video-1", "status": "new", "event_type": "fall"},
+        "sort": EVENT_ORDER,
+    },
+    {
+        "name": "list_events in a timestamp window",
+        "collection": "events",
+        "filter": {"video_id": "video-1", "timestamp_start": {"$gte": 30, "$lte": 60}},
+        "sort": EVENT_ORDER,
+    },
+    {
+        "name": "list_events next page",
+        "collection": "events",
+        "filter": {
+            "status": "new",
+            "detected_at": {"$lte": datetime(2024, 1, 1, 0, 10)},
+            "$and": [
+                {
+                    "$or": [
+                        {"detected_at": {"$lt": datetime(2024, 1, 1, 0, 10)}},
+                        {"_id": {"$lt": 1}},
+                    ]
+                }
+            ],
+        },
+        "sort": EVENT_ORDER,
+    },
+    {
+        "name": "iter_events export by video and date range",
+        "collection": "events",
+        "filter": {"video_id": "video-1", "detected_at": {"$gte": datetime(2024, 1, 1)}},
+        "sort": EVENT_ORDER,
+    },
+    {
+        "name": "search_events",
+        "collection": "events",
+        "filter": {"$text": {"$search": "person fell"}, "video_id": "video-1"},
+        "sort": [("detected_at", DESCENDING)],
+        "allow": {"SORT"},
+    },
+    {
+        "name": "list_event_timestamps",
+        "collection": "events",
+        "filter": {"video_id": "video-1"},
+    },
+    {
+        "name": "event_analytics by date range",
+        "analytics": {"detected_at": {"$gte": datetime(2024, 1, 1)}},
+    },
+    {
+        "name": "event_analytics by video and date range",
+        "analytics": {
+            "video_id": "video-1",
+            "detected_at": {"$gte": datetime(2024, 1, 1)},
+        },
+    },
+    {
+        "name": "event_analytics by video",
+        "analytics": {"video_id": "video-1"},
+    },
+    {
+        # Reads every rollup row: one per video and event type.
+        "name": "event_analytics",
+        "analytics": {},
+        "allow": {"COLLSCAN"},
+    },
+    {
+        "name": "list_chunk_summaries",
+        "collection": "chunk_summaries",
+        "filter": {},
+        "sort": [("detected_at", DESCENDING)],
+    },
+    {
+        "name": "list_chunk_summaries by video",
+        "collection": "chunk_summaries",
+        "filter": {"video_id": "video-1"},
+        "sort": [("detected_at", DESCENDING)],
+    },
+    {
+        "name": "list_chunk_summaries in a timestamp window",
+        "collection": "chunk_summaries",
+        "filter": {"video_id": "video-1", "timestamp_start": {"$gte": 30, "$lte": 60}},
+        "sort": [("detected_at", DESCENDING)],
+    },
+    {
+        "name": "search_chunk_summaries",
+        "collection": "chunk_summaries",
+        "filter": {"$text": {"$search": "person fell"}},
+        "sort": [("detected_at", DESCENDING)],
+        "allow": {"SORT"},
+    },
+    {
+        "name": "get_cached_analysis",
+        "collection": "analysis_cache",
+        "filter": {"key": "key-1"},
+    },
+    {
+        "name": "evict_cached_analyses",
+        "collection": "analysis_cache",
+        "filter": {},
+        "sort": [("last_used", ASCENDING)],
+    },
+    {
+        "name": "claim_chunk_job",
+        "collection": "chunk_jobs",
+        "filter": {
+            "$or": [
+                {"status": "queued"},
+                {"status": "leased", "lease_until": {"$lt": datetime(2024, 6, 1)}},
+            ]
+        },
+        "sort": [
+            ("priority", ASCENDING),
+            ("seq", ASCENDING),
+            ("created_at", ASCENDING),
+        ],
+    },
+    {
+        "name": "claim_chunk_job following a chunk",
+        "collection": "chunk_jobs",
+        "filter": {
+            "$or": [
+                {"status": "queued"},
+                {"status": "leased", "lease_until": {"$lt": datetime(2024, 6, 1)}},
+            ],
+            "video_id": "video-1",
+            "chunk_index": 5,
+            "use_case": "general",
+        },
+        "sort": [
+            ("priority", ASCENDING),
+            ("seq", ASCENDING),
+            ("created_at", ASCENDING),
+        ],
+        "allow": {"SORT"},
+    },
+    {
+        "name": "renew_chunk_job_lease",
+        "collection": "chunk_jobs",
+        "filter": {"_id": 1, "status": "leased", "worker": "worker-1"},
+    },
+    {
+        "name": "enqueue_chunk_job",
+        "collection": "chunk_jobs",
+        "filter": {"video_id": "video-1", "chunk_index": 5},
+    },
+    {
+        "name": "finish_chunk_job",
+        "collection": "chunk_jobs",
+        "filter": {"_id": 1, "status": "leased", "worker": "worker-1"},
+    },
+    {
+        "name": "count_chunk_jobs",
+        "collection": "chunk_jobs",
+        "filter": {"status": {"$in": ["queued"]}},
+    },
+    {
+        "name": "cancel_chunk_jobs",
+        "collection": "chunk_jobs",
+        "filter": {"status": {"$in": ["queued", "leased"]}, "video_id": "video-1"},
+    },
+]
+
+EVENT_WORDS = ["person", "fell", "car", "crash", "fight", "bag", "smoke", "door"]
+
+
+def seed(db, documents: int) -> None:
+    # Enough spread in every filtered field that the planner has real choices.
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    videos = [f"video-{i}" for i in range(20)]
+    statuses = ["new", "confirmed", "dismissed"]
+    event_types = ["fall", "fight", "vehicle_collision", "intrusion"]
+
+    def text() -> str:
+        return " ".join(rng.choice(EVENT_WORDS) for _ in range(8))
+
+    db.videos.insert_many(
+        {
+            "sha256": f"hash-{i}",
+            "upload_time": start + timedelta(minutes=i),
+            "status": rng.choice(["uploaded", "processing", "completed"]),
+        }
+        for i in range(documents)
+    )
+    db.uploads.insert_many(
+        {
+            "status": rng.choice(["uploading", "complete", "complete", "expired"]),
+            "updated_at": start + timedelta(minutes=i),
+        }
+        for i in range(documents)
+    )
+    db.events.insert_many(
+        {
+            "video_id": rng.choice(videos),
+            "event_type": rng.choice(event_types),
+            "status": rng.choice(statuses),
+            "chunk_index": i,
+            "timestamp_start": float(rng.randint(0, 600)),
+            "detected_at": start + timedelta(seconds=i),
+            "event_description": text(),
+            "explanation": text(),
+        }
+        for i in range(documents)
+    )
+    db.chunk_summaries.insert_many(
+        {
+            "video_id": rng.choice(videos),
+            "chunk_index": i,
+            "timestamp_start": float(rng.randint(0, 600)),
+            "detected_at": start + timedelta(seconds=i),
+            "summary": text(),
+        }
+        for i in range(documents)
+    )
+    db.event_rollups.insert_many(
+        {"video_id": video_id, "event_type": event_type, "count": 1}
+        for video_id in videos
+        for event_type in event_types
+    )
+    db.analysis_cache.insert_many(
+        {"key": f"key-{i}", "last_used": start + timedelta(seconds=i)}
+        for i in range(documents)
+    )
+    db.chunk_jobs.insert_many(
+        {
+            "video_id": videos[i % len(videos)],
+            "chunk_index": i // len(videos),
+            "use_case": "general",
+            "status": rng.choice(["queued", "leased", "done", "done", "done"]),
+            "priority": rng.randint(0, 2),
+            "seq": i,
+            "lease_until": start + timedelta(days=rng.randint(0, 300)),
+            "worker": "worker-1",
+            "created_at": start + timedelta(seconds=i),
+        }
+        for i in range(documents)
+    )
+
+
+def _stages(plan: Any) -> Iterator[str]:
+    # Every stage name in a winning plan, classic or slot-based engine.
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+
+def _winning_plans(explain: Any) -> Iterator[Any]:
+    # Aggregate explain output nests the plan under $cursor stages (or per
+    # shard), depending on the server version and pipeline.
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield value
+            else:
+                yield from _winning_plans(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from _winning_plans(item)
+
+
+def explain_shape(db, shape: Dict[str, Any]) -> Dict[str, Any]:
+    if "analytics" in shape:
+        collection, pipeline = event_analytics_pipeline(shape["analytics"])
+        explain = db.command("aggregate", collection, pipeline=pipeline, explain=True)
+    else:
+        cursor = db[shape["collection"]].find(shape["filter"])
+        if shape.get("sort"):
+            cursor = cursor.sort(shape["sort"])
+        explain = cursor.limit(50).explain()
+    stages = set(_stages(list(_winning_plans(explain))))
+    bad = (stages & BAD_STAGES) - shape.get("allow", set())
+    return {"name": shape["name"], "stages": sorted(stages), "bad": sorted(bad)}
+
+
+def check(db, documents: int = 2000) -> List[Dict[str, Any]]:
+    # Seeds db, creates the indexes from db.INDEXES and returns one report per
+    # query shape.
+    seed(db, documents)
+    sync_indexes(db)
+    return [explain_shape(db, shape) for shape in QUERY_SHAPES]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(
+        description="Explain every query shape against a seeded scratch database "
+        "and fail on collection scans or in-memory sorts."
+    )
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI", ""))
+    parser.add_argument(
+        "--db",
+        default=f"{os.getenv('MONGODB_DB', 'sentinelai')}{SCRATCH_SUFFIX}",
+        help=f"scratch database ending in {SCRATCH_SUFFIX}; it is dropped "
+        "before and after the run",
+    )
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    args = parser.parse_args(argv)
+    if not args.uri:
+        parser.error("--uri or MONGODB_URI is required")
+    app_db = os.getenv("MONGODB_DB", "sentinelai")
+    if args.db == app_db or not args.db.endswith(SCRATCH_SUFFIX):
+        parser.error(f"--db must be a scratch database ending in {SCRATCH_SUFFIX}")
+
+    client = MongoClient(args.uri)
+    client.drop_database(args.db)
+    try:
+        reports = check(client[args.db], args.documents)
+    finally:
+        if not args.keep:
+            client.drop_database(args.db)
+
+    failed = [report for report in reports if report["bad"]]
+    for report in reports:
+        marker = "FAIL" if report["bad"] else "ok"
+        print(f"{marker:4}  {report['name']}: {', '.join(report['stages'])}")
+    if failed:
+        print(f"{len(failed)} of {len(reports)} query shapes need an index")
+        return 1
+    print(f"All {len(reports)} query shapes use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,32 @@
 from typing import Any, Dict
 
 DEFAULT_USE_CASE = "general_security"
+# Detections of the same event type starting within this many seconds of an
+# existing one are treated as duplicates. Use cases may override it.
+DEFAULT_DEDUPE_WINDOW_SECONDS = 8.0
+# Chunks whose largest frame-to-frame change (fraction of pixels) stays below
+# this are recorded as "no activity" without calling Gemini. 0 disables it.
+DEFAULT_ACTIVITY_THRESHOLD = 0.002
+# Frame sampling per chunk. "fixed" takes one frame every
+# frame_interval_seconds; "adaptive" decodes candidates every
+# candidate_interval_seconds and keeps the ones that differ from the previous
+# kept frame by at least min_frame_change. Both send at most max_frames.
+DEFAULT_FRAME_SAMPLING = "adaptive"
+DEFAULT_MAX_FRAMES = 6
+DEFAULT_FRAME_INTERVAL_SECONDS = 1.0
+DEFAULT_CANDIDATE_INTERVAL_SECONDS = 0.5
+DEFAULT_MIN_FRAME_CHANGE = 0.01
+# "mosaic" downsizes a chunk's frames and sends them as one labeled grid image
+# instead of separate full-resolution images.
+DEFAULT_FRAME_PACKING = "separate"
+DEFAULT_MOSAIC_TILE_WIDTH = 480
+DEFAULT_MOSAIC_JPEG_QUALITY = 70
+# Scheduling classes for chunk jobs; lower values are analyzed first. Clips
+# no longer than SHORT_CLIP_SECONDS default to "high" so they are not stuck
+# behind bulk backfills.
+PRIORITY_CLASSES: Dict[str, int] = {"high": 0, "normal": 1, "bulk": 2}
+DEFAULT_PRIORITY = "normal"
+SHORT_CLIP_SECONDS = 60.0
 
 USE_CASES: Dict[str, Dict[str, Any]] = {
     "general_security": {
@@ -26,6 +52,13 @@ USE_CASES: Dict[str, Dict[str, Any]] = {
             "General public-space surveillance (campuses, retail, parking lots, "
             "transit hubs). Focus on safety risks, suspicious behavior, and incidents."
         ),
+        "dedupe_window_seconds": DEFAULT_DEDUPE_WINDOW_SECONDS,
+        "activity_threshold": DEFAULT_ACTIVITY_THRESHOLD,
+        "frame_sampling": DEFAULT_FRAME_SAMPLING,
+        "max_frames": DEFAULT_MAX_FRAMES,
+        "frame_packing": DEFAULT_FRAME_PACKING,
+        "mosaic_tile_width": DEFAULT_MOSAIC_TILE_WIDTH,
+        "mosaic_jpeg_quality": DEFAULT_MOSAIC_JPEG_QUALITY,
     },
     "campus_safety": {
         "name": "Campus Safety",
@@ -44,6 +77,13 @@ USE_CASES: Dict[str, Dict[str, Any]] = {
             "University campus security camera monitoring common areas like "
             "entrances, parking lots, and walkways."
         ),
+        "dedupe_window_seconds": DEFAULT_DEDUPE_WINDOW_SECONDS,
+        "activity_threshold": DEFAULT_ACTIVITY_THRESHOLD,
+        "frame_sampling": DEFAULT_FRAME_SAMPLING,
+        "max_frames": DEFAULT_MAX_FRAMES,
+        "frame_packing": DEFAULT_FRAME_PACKING,
+        "mosaic_tile_width": DEFAULT_MOSAIC_TILE_WIDTH,
+        "mosaic_jpeg_quality": DEFAULT_MOSAIC_JPEG_QUALITY,
     },
     "traffic": {
         "name": "Traffic Monitoring",
@@ -62,6 +102,14 @@ USE_CASES: Dict[str, Dict[str, Any]] = {
             "Traffic intersection camera monitoring vehicles and pedestrians in "
             "an urban environment."
         ),
+        # Traffic incidents are short; keep distinct ones a few seconds apart.
+        "dedupe_window_seconds": 4.0,
+        "activity_threshold": DEFAULT_ACTIVITY_THRESHOLD,
+        "frame_sampling": DEFAULT_FRAME_SAMPLING,
+        "max_frames": DEFAULT_MAX_FRAMES,
+        "frame_packing": DEFAULT_FRAME_PACKING,
+        "mosaic_tile_width": DEFAULT_MOSAIC_TILE_WIDTH,
+        "mosaic_jpeg_quality": DEFAULT_MOSAIC_JPEG_QUALITY,
     },
 }
 
@@ -1,29 +1,213 @@
+import logging
 import os
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+import socket
+from array import array
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from bson import ObjectId
-from pymongo import ASCENDING, MongoClient, TEXT, ReturnDocument
+from bson import Binary, ObjectId
+from pymongo import (
+    ASCENDING,
+    DESCENDING,
+    TEXT,
+    IndexModel,
+    MongoClient,
+    ReturnDocument,
+    UpdateOne,
+)
+from pymongo.errors import (
+    BulkWriteError,
+    ConnectionFailure,
+    DuplicateKeyError,
+    OperationFailure,
+    PyMongoError,
+)
+
+logger = logging.getLogger(__name__)
 
 _client: MongoClient | None = None
 _db = None
 
+# Called as listener(collection, docs, op) after events or chunk summaries are
+# written ("insert") or an event is changed ("update"; docs hold _id, video_id
+# and the changed fields). In-process indexes and caches stay in sync this way.
+WriteListener = Callable[[str, List[Dict[str, Any]], str], None]
+_write_listeners: List[WriteListener] = []
+
+
+def add_write_listener(listener: WriteListener) -> None:
+    _write_listeners.append(listener)
+
+
+def _notify_write(collection: str, docs: List[Dict[str, Any]], op: str = "insert"):
+    for listener in _write_listeners:
+        try:
+            listener(collection, docs, op)
+        except Exception:
+            logger.exception("Write listener failed for %s", collection)
+
+
+# Every index the queries in this module rely on, per collection. Equality
+# fields come first, then the sort key, then range fields, so list queries
+# read index order instead of sorting in memory. sync_indexes() turns this
+# into migrations: missing indexes are created, and with drop_unlisted=True
+# indexes that are no longer listed (or whose options changed) are dropped.
+# backend/check_indexes.py explains every query shape against these.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "videos": [
+        IndexModel([("upload_time", ASCENDING)]),
+        # find_video_by_sha256. Unique, so two concurrent uploads of the same
+        # bytes cannot both create a video; streams have no hash.
+        IndexModel(
+            [("sha256", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"sha256": {"$type": "string"}},
+        ),
+        # list_videos_by_status on startup.
+        IndexModel([("status", ASCENDING)]),
+    ],
+    "events": [
+        # search_events
+        IndexModel(
+            [("event_type", TEXT), ("explanation", TEXT), ("event_description", TEXT)]
+        ),
+        IndexModel([("video_id", ASCENDING), ("chunk_index", ASCENDING)]),
+        # Cross-process de-duplication: at most one event per video and
+        # dedupe_key (event type and dedupe window bucket); BatchWriter drops
+        # the inserts that lose. Events stored without a key are exempt.
+        IndexModel(
+            [("video_id", ASCENDING), ("dedupe_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"dedupe_key": {"$type": "string"}},
+        ),
+        # list_events and iter_events in EVENT_ORDER, unfiltered or by
+        # status / event_type; event_analytics by detected_at range.
+        IndexModel([("detected_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel(
+            [("status", ASCENDING), ("detected_at", DESCENDING), ("_id", DESCENDING)]
+        ),
+        IndexModel(
+            [
+                ("event_type", ASCENDING),
+                ("detected_at", DESCENDING),
+                ("_id", DESCENDING),
+            ]
+        ),
+        # list_events for one video, optionally within a timestamp window;
+        # list_event_timestamps.
+        IndexModel(
+            [
+                ("video_id", ASCENDING),
+                ("detected_at", DESCENDING),
+                ("_id", DESCENDING),
+                ("timestamp_start", ASCENDING),
+            ]
+        ),
+    ],
+    "chunk_summaries": [
+        # search_chunk_summaries
+        IndexModel([("summary", TEXT)]),
+        IndexModel([("video_id", ASCENDING), ("chunk_index", ASCENDING)]),
+        # list_chunk_summaries, as list_events.
+        IndexModel([("detected_at", DESCENDING)]),
+        IndexModel(
+            [
+                ("video_id", ASCENDING),
+                ("detected_at", DESCENDING),
+                ("timestamp_start", ASCENDING),
+            ]
+        ),
+    ],
+    "event_rollups": [
+        IndexModel([("video_id", ASCENDING), ("event_type", ASCENDING)], unique=True),
+    ],
+    "analysis_cache": [
+        IndexModel([("key", ASCENDING)], unique=True),
+        # evict_cached_analyses
+        IndexModel([("last_used", ASCENDING)]),
+    ],
+    "uploads": [
+        # expire_upload and list_stale_uploads.
+        IndexModel([("status", ASCENDING), ("updated_at", ASCENDING)]),
+    ],
+    "chunk_jobs": [
+        # enqueue_chunk_job; take_following claims by (video_id, chunk_index).
+        IndexModel([("video_id", ASCENDING), ("chunk_index", ASCENDING)], unique=True),
+        # claim_chunk_job: per status branch of its $or, in claim order.
+        IndexModel(
+            [
+                ("status", ASCENDING),
+                ("priority", ASCENDING),
+                ("seq", ASCENDING),
+                ("created_at", ASCENDING),
+            ]
+        ),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)]),
+    ],
+}
+
 
-def init_db(uri: str, db_name: str):
+def sync_indexes(db, drop_unlisted: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    # Returns {collection: {"created": [...], "dropped": [...]}} of the index
+    # names changed. Without drop_unlisted, stale indexes are only logged.
+    changes: Dict[str, Dict[str, List[str]]] = {}
+    for collection, models in INDEXES.items():
+        existing = db[collection].index_information()
+        wanted = {model.document["name"]: model for model in models}
+        created: List[str] = []
+        dropped: List[str] = []
+        for name, info in existing.items():
+            model = wanted.get(name)
+            if name == "_id_" or (
+                model is not None
+                and bool(info.get("unique")) == bool(model.document.get("unique"))
+            ):
+                continue
+            if drop_unlisted:
+                db[collection].drop_index(name)
+                dropped.append(name)
+            else:
+                logger.warning("Index %s.%s is not in INDEXES", collection, name)
+        missing = [
+            model
+            for name, model in wanted.items()
+            if name not in existing or name in dropped
+        ]
+        if missing:
+            try:
+                created = db[collection].create_indexes(missing)
+            except OperationFailure:
+                # e.g. a changed text index while the old one is kept.
+                logger.exception("Could not create indexes on %s", collection)
+        if created or dropped:
+            logger.info(
+                "Indexes on %s: created %s, dropped %s", collection, created, dropped
+            )
+            changes[collection] = {"created": created, "dropped": dropped}
+    return changes
+
+
+def init_db(uri: str, db_name: str, drop_unlisted_indexes: bool = False):
     global _client, _db
     if _client is None:
         _client = MongoClient(uri)
         _db = _client[db_name]
 
-        _db.videos.create_index([("upload_time", ASCENDING)])
-        _db.events.create_index(
-            [("event_type", TEXT), ("explanation", TEXT), ("event_description", TEXT)]
-        )
-        _db.events.create_index([("video_id", ASCENDING), ("chunk_index", ASCENDING)])
-        _db.chunk_summaries.create_index([("summary", TEXT)])
-        _db.chunk_summaries.create_index(
-            [("video_id", ASCENDING), ("chunk_index", ASCENDING)]
-        )
+        sync_indexes(_db, drop_unlisted=drop_unlisted_indexes)
+
+        # Rollups missing next to existing events (first start after an
+        # upgrade) are flagged; a BatchWriter rebuilds flagged rollups, one
+        # process at a time.
+        try:
+            if (
+                _db.event_rollups.estimated_document_count() == 0
+                and _db.events.find_one({}, {"_id": 1}) is not None
+            ):
+                mark_event_rollups_stale()
+        except Exception:
+            logger.exception("Could not check the event rollups")
 
     return _db
 
@@ -43,6 +227,7 @@ def create_video(
     filepath: str,
     use_case: str,
     original_name: str,
+    sha256: Optional[str] = None,
 ) -> ObjectId:
     db = get_db()
     doc = {
@@ -50,11 +235,14 @@ def create_video(
         "filepath": filepath,
         "original_name": original_name,
         "use_case": use_case,
+        "sha256": sha256,
         "status": "uploaded",
         "upload_time": _now(),
         "chunk_count": 0,
         "chunks_processed": 0,
         "chunks_failed": 0,
+        "chunks_skipped": 0,
+        "chunks_throttled": 0,
     }
     result = db.videos.insert_one(doc)
     return result.inserted_id
@@ -89,37 +277,327 @@ def increment_video_failed(video_id: str) -> Optional[int]:
     return int(result.get("chunks_failed", 0))
 
 
-def maybe_mark_video_complete(video_id: str, processed: int, total: int) -> None:
+def increment_video_skipped(video_id: str) -> Optional[int]:
+    db = get_db()
+    result = db.videos.find_one_and_update(
+        {"_id": ObjectId(video_id)},
+        {"$inc": {"chunks_skipped": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not result:
+        return None
+    return int(result.get("chunks_skipped", 0))
+
+
+def increment_video_throttled(video_id: str) -> Optional[int]:
+    db = get_db()
+    result = db.videos.find_one_and_update(
+        {"_id": ObjectId(video_id)},
+        {"$inc": {"chunks_throttled": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not result:
+        return None
+    return int(result.get("chunks_throttled", 0))
+
+
+def maybe_mark_video_complete(video_id: str, processed: int, total: int) -> bool:
+    # Returns True if this call marked the video complete.
+    db = get_db()
     if total <= 0:
-        return
+        # The chunk was queued while segmentation was still running, so the
+        # final count is only known to the video document. Segmentation that
+        # stopped on an error leaves the video partial rather than complete.
+        for status, error in (("complete", None), ("partial", {"$ne": None})):
+            result = db.videos.update_one(
+                {
+                    "_id": ObjectId(video_id),
+                    "segmentation_complete": True,
+                    "segmentation_error": error,
+                    "$expr": {"$gte": ["$chunks_processed", "$chunk_count"]},
+                },
+                {"$set": {"status": status}},
+            )
+            if result.modified_count == 1:
+                return True
+        return False
     if processed >= total:
-        db = get_db()
-        db.videos.update_one(
+        result = db.videos.update_one(
             {"_id": ObjectId(video_id)},
             {"$set": {"status": "complete"}},
         )
+        return result.modified_count == 1
+    return False
+
+
+def advance_video_run(video_id: str) -> int:
+    # Each start and stop of a video begins a new run. Chunk jobs carry the
+    # run they were queued in, and workers in any process discard results
+    # of an older run.
+    db = get_db()
+    doc = db.videos.find_one_and_update(
+        {"_id": ObjectId(video_id)},
+        {"$inc": {"run_generation": 1}},
+        projection={"run_generation": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return int(doc["run_generation"]) if doc else 0
+
+
+def get_video_run_generation(video_id: str) -> Optional[int]:
+    # None if the video was deleted.
+    db = get_db()
+    doc = db.videos.find_one({"_id": ObjectId(video_id)}, {"run_generation": 1})
+    if doc is None:
+        return None
+    return int(doc.get("run_generation") or 0)
 
 
 def get_video(video_id: ObjectId) -> Optional[Dict[str, Any]]:
     db = get_db()
-    return db.videos.find_one({"_id": video_id})
+    # keyframes was stored here by older versions; see get_video_keyframes.
+    return db.videos.find_one({"_id": video_id}, {"keyframes": 0})
+
+
+# Keyframe times of virtual-chunk videos live in video_keyframes, one
+# document per video, as packed float64s: an all-intra source has one per
+# frame, which would bloat every read of the video document.
+def put_video_keyframes(video_id: str, keyframes: List[float]) -> None:
+    db = get_db()
+    db.video_keyframes.replace_one(
+        {"_id": video_id},
+        {"times": Binary(array("d", keyframes).tobytes())},
+        upsert=True,
+    )
 
 
-def list_events(filters: Dict[str, Any], limit: int = 100) -> List[Dict[str, Any]]:
+def get_video_keyframes(video_id: str) -> Optional[List[float]]:
     db = get_db()
-    cursor = db.events.find(filters).sort("detected_at", -1).limit(limit)
+    doc = db.video_keyframes.find_one({"_id": video_id})
+    if doc is None:
+        return None
+    times = array("d")
+    times.frombytes(bytes(doc["times"]))
+    return times.tolist()
+
+
+def find_video_by_sha256(sha256: str) -> Optional[Dict[str, Any]]:
+    db = get_db()
+    return db.videos.find_one({"sha256": sha256}, sort=[("upload_time", ASCENDING)])
+
+
+def create_upload(
+    filename: str,
+    filepath: str,
+    use_case: str,
+    size: Optional[int] = None,
+) -> ObjectId:
+    db = get_db()
+    doc = {
+        "filename": filename,
+        "filepath": filepath,
+        "use_case": use_case,
+        "size": size,
+        "offset": 0,
+        "status": "uploading",
+        "video_id": None,
+        "created_at": _now(),
+        "updated_at": _now(),
+    }
+    return db.uploads.insert_one(doc).inserted_id
+
+
+def get_upload(upload_id: ObjectId) -> Optional[Dict[str, Any]]:
+    db = get_db()
+    return db.uploads.find_one({"_id": upload_id})
+
+
+def update_upload(upload_id: ObjectId, fields: Dict[str, Any]) -> None:
+    db = get_db()
+    db.uploads.update_one(
+        {"_id": upload_id}, {"$set": {**fields, "updated_at": _now()}}
+    )
+
+
+def list_stale_uploads(updated_before: datetime) -> List[Dict[str, Any]]:
+    db = get_db()
+    return list(
+        db.uploads.find({"status": "uploading", "updated_at": {"$lt": updated_before}})
+    )
+
+
+def expire_upload(upload_id: ObjectId, updated_before: datetime) -> bool:
+    # Returns False if the session received a part (or completed) since it
+    # was listed as stale.
+    db = get_db()
+    result = db.uploads.update_one(
+        {
+            "_id": upload_id,
+            "status": "uploading",
+            "updated_at": {"$lt": updated_before},
+        },
+        {"$set": {"status": "expired", "updated_at": _now()}},
+    )
+    return result.modified_count == 1
+
+
+def list_videos_by_status(statuses: List[str]) -> List[Dict[str, Any]]:
+    db = get_db()
+    return list(db.videos.find({"status": {"$in": statuses}}))
+
+
+# Newest first, with _id breaking ties so keyset pages neither skip nor
+# repeat events detected in the same millisecond.
+EVENT_ORDER = [("detected_at", DESCENDING), ("_id", DESCENDING)]
+
+
+def _event_projection(fields: Optional[List[str]]) -> Optional[Dict[str, int]]:
+    # detected_at is always returned because the page cursor is built from it.
+    if not fields:
+        return None
+    return {**{field: 1 for field in fields}, "detected_at": 1}
+
+
+def list_events(
+    filters: Dict[str, Any],
+    limit: int = 100,
+    after: Optional[Tuple[datetime, ObjectId]] = None,
+    fields: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    # after is the (detected_at, _id) of the last event of the previous page.
+    db = get_db()
+    query = dict(filters)
+    if after is not None:
+        detected_at, event_id = after
+        # The $lte bound keeps the scan on the detected_at index range; the
+        # $or only decides ties.
+        query["detected_at"] = {**query.get("detected_at", {}), "$lte": detected_at}
+        # Copied, so a caller's $and list is not extended.
+        query["$and"] = [
+            *query.get("$and", []),
+            {"$or": [{"detected_at": {"$lt": detected_at}}, {"_id": {"$lt": event_id}}]},
+        ]
+    cursor = (
+        db.events.find(query, _event_projection(fields)).sort(EVENT_ORDER).limit(limit)
+    )
     return list(cursor)
 
 
+def iter_events(
+    filters: Dict[str, Any],
+    fields: Optional[List[str]] = None,
+    batch_size: int = 1000,
+):
+    # Streams matching events in EVENT_ORDER from one server-side cursor, a
+    # batch at a time, for exports of any size. The cursor does not time out
+    # while a slow client reads, so it is closed explicitly.
+    db = get_db()
+    cursor = db.events.find(
+        filters,
+        _event_projection(fields),
+        batch_size=batch_size,
+        no_cursor_timeout=True,
+    ).sort(EVENT_ORDER)
+    try:
+        yield from cursor
+    finally:
+        cursor.close()
+
+
 def insert_event(event: Dict[str, Any]) -> ObjectId:
     db = get_db()
     result = db.events.insert_one(event)
+    update_event_rollups([event])
+    _notify_write("events", [event])
     return result.inserted_id
 
 
-def update_event(event_id: ObjectId, fields: Dict[str, Any]) -> None:
+def update_event(
+    event_id: ObjectId, fields: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    # One round trip: the pre-update document gives the old status for the
+    # rollups, and the updated event is that document with fields applied.
+    db = get_db()
+    before = db.events.find_one_and_update({"_id": event_id}, {"$set": fields})
+    if before is None:
+        return None
+    if "status" in fields:
+        apply_event_status_change(before, fields["status"])
+    _notify_write(
+        "events",
+        [{"_id": event_id, "video_id": before.get("video_id"), **fields}],
+        op="update",
+    )
+    return {**before, **fields}
+
+
+def review_events(
+    fields: Dict[str, Any],
+    event_ids: Optional[List[ObjectId]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    max_events: int = 5000,
+) -> Tuple[List[Dict[str, Any]], List[ObjectId]]:
+    # Applies a review to many events in one write: a bulk_write of
+    # per-event updates for event_ids, or update_many per previous status for
+    # filters. Each update only matches while the event still has the status
+    # that was read, so rollup deltas stay exact when another review races
+    # this one. Returns (updated events, ids that were not updated).
     db = get_db()
-    db.events.update_one({"_id": event_id}, {"$set": fields})
+    if event_ids is not None:
+        query: Dict[str, Any] = {"_id": {"$in": event_ids}}
+    else:
+        query = dict(filters or {})
+    before = list(
+        db.events.find(query, {"video_id": 1, "event_type": 1, "status": 1}).limit(
+            max_events + 1
+        )
+    )
+    if len(before) > max_events:
+        raise ValueError(f"More than {max_events} events match; narrow the filter")
+    if not before:
+        return [], list(event_ids or [])
+
+    # A fresh review_id identifies the events this call updated; a timestamp
+    # would also match those of a concurrent review stamped the same moment.
+    review_id = str(ObjectId())
+    update = {"$set": {**fields, "reviewed_at": _now(), "review_id": review_id}}
+    if event_ids is not None:
+        db.events.bulk_write(
+            [
+                UpdateOne({"_id": doc["_id"], "status": doc.get("status")}, update)
+                for doc in before
+            ],
+            ordered=False,
+        )
+    else:
+        by_status: Dict[Any, List[ObjectId]] = {}
+        for doc in before:
+            by_status.setdefault(doc.get("status"), []).append(doc["_id"])
+        for status, ids in by_status.items():
+            db.events.update_many({"_id": {"$in": ids}, "status": status}, update)
+
+    ids = [doc["_id"] for doc in before]
+    updated = list(
+        db.events.find({"_id": {"$in": ids}, "review_id": review_id}).sort(
+            EVENT_ORDER
+        )
+    )
+    updated_ids = {doc["_id"] for doc in updated}
+    if "status" in fields:
+        _apply_status_changes(
+            [doc for doc in before if doc["_id"] in updated_ids], fields["status"]
+        )
+    if updated:
+        _notify_write(
+            "events",
+            [
+                {"_id": doc["_id"], "video_id": doc.get("video_id"), **fields}
+                for doc in updated
+            ],
+            op="update",
+        )
+    requested = event_ids if event_ids is not None else ids
+    return updated, [event_id for event_id in requested if event_id not in updated_ids]
 
 
 def get_event(event_id: ObjectId) -> Optional[Dict[str, Any]]:
@@ -127,6 +605,243 @@ def get_event(event_id: ObjectId) -> Optional[Dict[str, Any]]:
     return db.events.find_one({"_id": event_id})
 
 
+def _status_counters(status: Optional[str]) -> Dict[str, int]:
+    return {
+        "confirmed": 1 if status == "confirmed" else 0,
+        "dismissed": 1 if status == "dismissed" else 0,
+    }
+
+
+def update_event_rollups(events: List[Dict[str, Any]]) -> None:
+    # Rollups hold per (video_id, event_type) counters so analytics does not
+    # have to scan the events collection.
+    increments: Dict[Tuple[Any, Any], Dict[str, float]] = {}
+    for event in events:
+        key = (event.get("video_id"), event.get("event_type"))
+        inc = increments.setdefault(
+            key, {"count": 0, "confirmed": 0, "dismissed": 0, "confidence_sum": 0.0}
+        )
+        inc["count"] += 1
+        inc["confidence_sum"] += float(event.get("confidence") or 0.0)
+        for field, value in _status_counters(event.get("status")).items():
+            inc[field] += value
+    if not increments:
+        return
+    _write_rollups(
+        [
+            UpdateOne(
+                {"video_id": video_id, "event_type": event_type},
+                {"$inc": inc},
+                upsert=True,
+            )
+            for (video_id, event_type), inc in increments.items()
+        ]
+    )
+
+
+def apply_event_status_change(before: Dict[str, Any], new_status: str) -> None:
+    old_status = before.get("status")
+    if old_status == new_status:
+        return
+    added = _status_counters(new_status)
+    removed = _status_counters(old_status)
+    inc = {field: added[field] - removed[field] for field in added}
+    if not any(inc.values()):
+        return
+    _write_rollups(
+        [
+            UpdateOne(
+                {
+                    "video_id": before.get("video_id"),
+                    "event_type": before.get("event_type"),
+                },
+                {"$inc": inc},
+                upsert=True,
+            )
+        ]
+    )
+
+
+def _apply_status_changes(before: List[Dict[str, Any]], new_status: str) -> None:
+    # apply_event_status_change for many events, as one rollup bulk_write.
+    increments: Dict[Tuple[Any, Any], Dict[str, int]] = {}
+    added = _status_counters(new_status)
+    for doc in before:
+        removed = _status_counters(doc.get("status"))
+        inc = increments.setdefault(
+            (doc.get("video_id"), doc.get("event_type")), dict.fromkeys(added, 0)
+        )
+        for field in added:
+            inc[field] += added[field] - removed[field]
+    ops = [
+        UpdateOne(
+            {"video_id": video_id, "event_type": event_type},
+            {"$inc": inc},
+            upsert=True,
+        )
+        for (video_id, event_type), inc in increments.items()
+        if any(inc.values())
+    ]
+    if ops:
+        _write_rollups(ops)
+
+
+_EVENT_TYPE_GROUP = {
+    "$group": {
+        "_id": {"video_id": "$video_id", "event_type": "$event_type"},
+        "count": {"$sum": 1},
+        "confirmed": {"$sum": {"$cond": [{"$eq": ["$status", "confirmed"]}, 1, 0]}},
+        "dismissed": {"$sum": {"$cond": [{"$eq": ["$status", "dismissed"]}, 1, 0]}},
+        "confidence_sum": {"$sum": {"$ifNull": ["$confidence", 0]}},
+    }
+}
+
+
+# The meta collection holds one document per piece of derived state. For
+# the rollups: stale is set when an increment may have been lost, marks
+# counts those flags, and rebuild_owner / rebuild_until is the lease of the
+# process rebuilding them (rebuilds counts the leases taken).
+ROLLUPS_META_ID = "event_rollups"
+ROLLUPS_REBUILD_COLLECTION = "event_rollups_rebuild"
+
+
+def mark_event_rollups_stale() -> None:
+    db = get_db()
+    db.meta.update_one(
+        {"_id": ROLLUPS_META_ID},
+        {"$set": {"stale": True, "marked_at": _now()}, "$inc": {"marks": 1}},
+        upsert=True,
+    )
+
+
+def event_rollups_stale() -> bool:
+    db = get_db()
+    return bool((db.meta.find_one({"_id": ROLLUPS_META_ID}) or {}).get("stale"))
+
+
+def _rollup_rebuild_state() -> Tuple[int, bool]:
+    doc = get_db().meta.find_one(
+        {"_id": ROLLUPS_META_ID}, {"rebuilds": 1, "rebuild_until": 1}
+    ) or {}
+    until = doc.get("rebuild_until")
+    return int(doc.get("rebuilds") or 0), bool(until and until > _now())
+
+
+def _write_rollups(ops: List[UpdateOne]) -> None:
+    # An increment that overlaps a rebuild may land in the collection the
+    # rebuild replaces, or add to an event its aggregate already counted.
+    # The rollups are flagged stale then, and the next rebuild settles them.
+    before = _rollup_rebuild_state()
+    get_db().event_rollups.bulk_write(ops, ordered=False)
+    if before[1] or _rollup_rebuild_state() != before:
+        mark_event_rollups_stale()
+
+
+def rebuild_event_rollups(lease_seconds: float = 600.0) -> bool:
+    # Recomputes the rollups from the events into a scratch collection and
+    # swaps it in with a rename, so readers never see partial counts. Only
+    # one process rebuilds at a time; returns False without doing anything
+    # while another one holds the lease.
+    db = get_db()
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    now = _now()
+    try:
+        marker = db.meta.find_one_and_update(
+            {
+                "_id": ROLLUPS_META_ID,
+                "$or": [{"rebuild_until": None}, {"rebuild_until": {"$lt": now}}],
+            },
+            {
+                "$set": {
+                    "rebuild_owner": owner,
+                    "rebuild_until": now + timedelta(seconds=lease_seconds),
+                },
+                "$inc": {"rebuilds": 1},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        return False
+    try:
+        scratch = db[ROLLUPS_REBUILD_COLLECTION]
+        scratch.drop()
+        # $out keeps the indexes of the collection it replaces, and the
+        # rename keeps them too.
+        scratch.create_indexes(INDEXES["event_rollups"])
+        db.events.aggregate(
+            [
+                _EVENT_TYPE_GROUP,
+                {
+                    "$project": {
+                        "_id": 0,
+                        "video_id": "$_id.video_id",
+                        "event_type": "$_id.event_type",
+                        "count": 1,
+                        "confirmed": 1,
+                        "dismissed": 1,
+                        "confidence_sum": 1,
+                    }
+                },
+                {"$out": ROLLUPS_REBUILD_COLLECTION},
+            ]
+        )
+        scratch.rename("event_rollups", dropTarget=True)
+        # Only clears the flags raised before the rebuild started; one
+        # raised since keeps the rollups stale for the next rebuild.
+        db.meta.update_one(
+            {"_id": ROLLUPS_META_ID, "marks": marker.get("marks")},
+            {"$set": {"stale": False}},
+        )
+    finally:
+        db.meta.update_one(
+            {"_id": ROLLUPS_META_ID, "rebuild_owner": owner},
+            {"$set": {"rebuild_owner": None, "rebuild_until": None}},
+        )
+    return True
+
+
+def event_analytics_pipeline(
+    filters: Dict[str, Any]
+) -> Tuple[str, List[Dict[str, Any]]]:
+    # The collection and aggregation event_analytics runs for filters.
+    if set(filters) <= {"video_id"}:
+        # Rollups are not bucketed by time, so they only answer queries that
+        # filter on nothing but the video.
+        return "event_rollups", [
+            {"$match": filters},
+            {
+                "$group": {
+                    "_id": "$event_type",
+                    "count": {"$sum": "$count"},
+                    "confirmed": {"$sum": "$confirmed"},
+                    "dismissed": {"$sum": "$dismissed"},
+                    "confidence_sum": {"$sum": "$confidence_sum"},
+                }
+            },
+        ]
+    # One pass over the matching events; totals are derived from the
+    # per-type rows instead of separate count and $avg queries.
+    group = {**_EVENT_TYPE_GROUP["$group"], "_id": "$event_type"}
+    return "events", [{"$match": filters}, {"$group": group}]
+
+
+def event_analytics(filters: Dict[str, Any]) -> Dict[str, Any]:
+    db = get_db()
+    collection, pipeline = event_analytics_pipeline(filters)
+    cursor = db[collection].aggregate(pipeline)
+    by_type = [row for row in cursor if row.get("count")]
+    total = sum(int(row["count"]) for row in by_type)
+    confidence_sum = sum(float(row.get("confidence_sum") or 0.0) for row in by_type)
+    return {
+        "total": total,
+        "confirmed": sum(int(row.get("confirmed") or 0) for row in by_type),
+        "dismissed": sum(int(row.get("dismissed") or 0) for row in by_type),
+        "avg_confidence": (confidence_sum / total) if total else 0.0,
+        "by_type": by_type,
+    }
+
+
 def search_events(query: str, filters: Dict[str, Any], limit: int = 10):
     db = get_db()
     base_filter: Dict[str, Any] = {"$text": {"$search": query}}
@@ -136,33 +851,51 @@ def search_events(query: str, filters: Dict[str, Any], limit: int = 10):
     return list(cursor)
 
 
-def find_recent_event(
-    video_id: str,
-    event_type: str,
-    timestamp_start: float,
-    window_seconds: float = 8.0,
-) -> Optional[Dict[str, Any]]:
+def list_event_timestamps(video_id: str) -> Dict[str, List[float]]:
     db = get_db()
-    if not video_id or not event_type:
-        return None
-    return db.events.find_one(
-        {
-            "video_id": video_id,
-            "event_type": event_type,
-            "timestamp_start": {
-                "$gte": max(0.0, timestamp_start - window_seconds),
-                "$lte": timestamp_start + window_seconds,
-            },
-        }
+    timestamps: Dict[str, List[float]] = {}
+    cursor = db.events.find(
+        {"video_id": video_id},
+        {"event_type": 1, "timestamp_start": 1, "_id": 0},
     )
+    for doc in cursor:
+        event_type = doc.get("event_type")
+        if not event_type:
+            continue
+        timestamps.setdefault(event_type, []).append(
+            float(doc.get("timestamp_start") or 0.0)
+        )
+    return timestamps
 
 
 def insert_chunk_summary(summary: Dict[str, Any]) -> ObjectId:
     db = get_db()
     result = db.chunk_summaries.insert_one(summary)
+    _notify_write("chunk_summaries", [summary])
     return result.inserted_id
 
 
+def iter_search_documents(
+    collection: str, fields: List[str], since: Optional[datetime] = None
+):
+    # Streams every document of collection with only the given fields, for
+    # building in-memory indexes at startup; with since, only the ones
+    # detected at or after it.
+    db = get_db()
+    projection = {field: 1 for field in fields}
+    query: Dict[str, Any] = {}
+    if since is not None:
+        query["detected_at"] = {"$gte": since}
+    return db[collection].find(query, projection, batch_size=1000)
+
+
+def get_documents_by_ids(collection: str, ids: List[ObjectId]) -> List[Dict[str, Any]]:
+    # Returns the documents in the order of ids, skipping missing ones.
+    db = get_db()
+    docs = {doc["_id"]: doc for doc in db[collection].find({"_id": {"$in": ids}})}
+    return [docs[doc_id] for doc_id in ids if doc_id in docs]
+
+
 def list_chunk_summaries(filters: Dict[str, Any], limit: int = 50) -> List[Dict[str, Any]]:
     db = get_db()
     cursor = db.chunk_summaries.find(filters).sort("detected_at", -1).limit(limit)
@@ -178,5 +911,534 @@ def search_chunk_summaries(query: str, filters: Dict[str, Any], limit: int = 10)
     return list(cursor)
 
 
+def get_cached_analysis(key: str) -> Optional[Dict[str, Any]]:
+    db = get_db()
+    doc = db.analysis_cache.find_one_and_update(
+        {"key": key},
+        {"$set": {"last_used": _now()}},
+    )
+    if not doc:
+        return None
+    return doc.get("result")
+
+
+def has_cached_analysis(key: str) -> bool:
+    db = get_db()
+    return db.analysis_cache.find_one({"key": key}, {"_id": 1}) is not None
+
+
+def put_cached_analysis(key: str, result: Dict[str, Any]) -> None:
+    db = get_db()
+    now = _now()
+    db.analysis_cache.update_one(
+        {"key": key},
+        {
+            "$set": {"result": result, "last_used": now},
+            "$setOnInsert": {"created_at": now},
+        },
+        upsert=True,
+    )
+
+
+def evict_cached_analyses(max_entries: int) -> int:
+    db = get_db()
+    excess = db.analysis_cache.estimated_document_count() - max_entries
+    if excess <= 0:
+        return 0
+    stale = (
+        db.analysis_cache.find({}, {"_id": 1})
+        .sort("last_used", ASCENDING)
+        .limit(excess)
+    )
+    ids = [doc["_id"] for doc in stale]
+    if not ids:
+        return 0
+    return db.analysis_cache.delete_many({"_id": {"$in": ids}}).deleted_count
+
+
+# chunk_queue_state holds the scheduling clock (the seq of the last claimed
+# job) and, per video, the seq of its last enqueued job.
+QUEUE_CLOCK_ID = "clock"
+
+
+def _next_chunk_seq(video_id: str) -> int:
+    # Virtual-time fair queueing: a video's next job is scheduled one slot
+    # after the later of the current clock and its own previous job. Videos
+    # with queued work therefore take turns, and a video that joins late
+    # starts at the current position instead of ahead of or behind everyone.
+    db = get_db()
+    clock = db.chunk_queue_state.find_one({"_id": QUEUE_CLOCK_ID}) or {}
+    db.chunk_queue_state.update_one(
+        {"_id": video_id}, {"$max": {"seq": clock.get("seq", 0)}}, upsert=True
+    )
+    state = db.chunk_queue_state.find_one_and_update(
+        {"_id": video_id},
+        {"$inc": {"seq": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    return state["seq"]
+
+
+def enqueue_chunk_job(job: Dict[str, Any]) -> Optional[ObjectId]:
+    # Idempotent per (video_id, chunk_index): re-segmenting a video after a
+    # restart leaves queued and finished chunks alone. A job left by an older
+    # run (a segmentation loop that had not seen its stop yet) is queued
+    # again for this one; the worker holding it loses the lease. Returns the
+    # job id, or None if the chunk was already queued for this run.
+    db = get_db()
+    key = {"video_id": job["video_id"], "chunk_index": job["chunk_index"]}
+    existing = db.chunk_jobs.find_one(key, {"_id": 1, "run_generation": 1})
+    generation = job.get("run_generation")
+    if existing is not None and (
+        generation is None or (existing.get("run_generation") or 0) >= generation
+    ):
+        return None
+    fields = {k: v for k, v in job.items() if k not in key}
+    state = {
+        **fields,
+        "status": "queued",
+        "seq": _next_chunk_seq(job["video_id"]),
+        "attempts": 0,
+        "lease_until": None,
+        "worker": None,
+        "created_at": _now(),
+    }
+    if existing is not None:
+        result = db.chunk_jobs.update_one(
+            {"_id": existing["_id"], "run_generation": existing.get("run_generation")},
+            {"$set": state},
+        )
+        return existing["_id"] if result.modified_count == 1 else None
+    result = db.chunk_jobs.update_one(key, {"$setOnInsert": state}, upsert=True)
+    return result.upserted_id
+
+
+def claim_chunk_job(
+    worker: str,
+    lease_seconds: float,
+    filters: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    # Leases the next queued job, or one whose lease expired because its
+    # worker died. Highest priority class first, then enqueue seq, which
+    # rotates between the videos that have queued chunks.
+    db = get_db()
+    now = _now()
+    query: Dict[str, Any] = {
+        "$or": [
+            {"status": "queued"},
+            {"status": "leased", "lease_until": {"$lt": now}},
+        ]
+    }
+    query.update(filters or {})
+    job = db.chunk_jobs.find_one_and_update(
+        query,
+        {
+            "$set": {
+                "status": "leased",
+                "lease_until": now + timedelta(seconds=lease_seconds),
+                "worker": worker,
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[
+            ("priority", ASCENDING),
+            ("seq", ASCENDING),
+            ("created_at", ASCENDING),
+        ],
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is not None and job.get("seq") is not None:
+        db.chunk_queue_state.update_one(
+            {"_id": QUEUE_CLOCK_ID}, {"$max": {"seq": job["seq"]}}, upsert=True
+        )
+    return job
+
+
+def renew_chunk_job_lease(job_id: ObjectId, worker: str, lease_seconds: float) -> bool:
+    # Extends a lease this worker still holds. Returns False if the lease was
+    # lost (expired and taken over, or the job was cancelled or finished).
+    db = get_db()
+    now = _now()
+    result = db.chunk_jobs.update_one(
+        {"_id": job_id, "status": "leased", "worker": worker},
+        {
+            "$set": {
+                "lease_until": now + timedelta(seconds=lease_seconds),
+                "updated_at": now,
+            }
+        },
+    )
+    return result.matched_count == 1
+
+
+def finish_chunk_job(job_id: ObjectId, worker: str, status: str) -> bool:
+    # Moves a leased job to done, failed or back to queued. Returns False if
+    # the lease was lost (expired and taken over, or the job was cancelled).
+    db = get_db()
+    result = db.chunk_jobs.update_one(
+        {"_id": job_id, "status": "leased", "worker": worker},
+        {"$set": {"status": status, "lease_until": None, "updated_at": _now()}},
+    )
+    return result.modified_count == 1
+
+
+def expire_queued_chunk_job(video_id: str, chunk_index: int) -> bool:
+    # Marks a job that never started as expired, so its chunk file can go.
+    # Returns False if the job is not queued.
+    db = get_db()
+    result = db.chunk_jobs.update_one(
+        {"video_id": video_id, "chunk_index": chunk_index, "status": "queued"},
+        {"$set": {"status": "expired", "updated_at": _now()}},
+    )
+    return result.modified_count == 1
+
+
+def queued_chunk_job_ids(job_ids: List[ObjectId]) -> List[ObjectId]:
+    # The ones of job_ids that are still waiting to be claimed.
+    db = get_db()
+    return [
+        job["_id"]
+        for job in db.chunk_jobs.find(
+            {"_id": {"$in": job_ids}, "status": "queued"}, {"_id": 1}
+        )
+    ]
+
+
+def get_chunk_job_status(video_id: str, chunk_index: int) -> Optional[str]:
+    db = get_db()
+    job = db.chunk_jobs.find_one(
+        {"video_id": video_id, "chunk_index": chunk_index}, {"status": 1}
+    )
+    return job["status"] if job else None
+
+
+def cancel_chunk_jobs(video_id: Optional[str] = None) -> int:
+    db = get_db()
+    query: Dict[str, Any] = {"status": {"$in": ["queued", "leased"]}}
+    if video_id:
+        query["video_id"] = video_id
+    result = db.chunk_jobs.update_many(
+        query, {"$set": {"status": "cancelled", "updated_at": _now()}}
+    )
+    return result.modified_count
+
+
+def delete_chunk_jobs(video_id: str) -> int:
+    db = get_db()
+    db.chunk_queue_state.delete_one({"_id": video_id})
+    return db.chunk_jobs.delete_many({"video_id": video_id}).deleted_count
+
+
+def count_chunk_jobs(statuses: List[str]) -> int:
+    db = get_db()
+    return db.chunk_jobs.count_documents({"status": {"$in": statuses}})
+
+
+EventCallback = Callable[[Dict[str, Any]], None]
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class BatchWriter:
+    # Write-behind buffer for events and chunk summaries. Documents are
+    # grouped into insert_many calls, flushed when a batch fills up or after
+    # flush_interval seconds; on_durable callbacks run once the write lands.
+    # Documents whose write fails go back to the front of the buffer and are
+    # retried with backoff: indefinitely while Mongo is unreachable, and up to
+    # max_write_attempts times for errors reported on the document itself.
+    # Rollup counters are updated after the events are durable; if that
+    # fails, the rollups are flagged stale and rebuilt from the events.
+    def __init__(
+        self,
+        max_batch_size: int = 200,
+        flush_interval: float = 0.25,
+        max_pending: int = 5000,
+        max_write_attempts: int = 5,
+        max_retry_delay: float = 30.0,
+        rollup_rebuild_interval: float = 60.0,
+    ):
+        self.max_batch_size = max(1, max_batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max(self.max_batch_size, max_pending)
+        self.max_write_attempts = max(1, max_write_attempts)
+        self.max_retry_delay = max_retry_delay
+        self.dropped = 0
+        self._events: List[Tuple[Dict[str, Any], Optional[EventCallback]]] = []
+        self._summaries: List[Dict[str, Any]] = []
+        # Failed attempts per document _id, for documents waiting for a retry.
+        self._attempts: Dict[Any, int] = {}
+        self._retry_delay = 0.0
+        self.rollup_rebuild_interval = rollup_rebuild_interval
+        self._rollups_stale = False
+        self._rollups_marked = False
+        self._next_rollup_rebuild = 0.0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="batch-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, attempts: int = 3) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+        for attempt in range(attempts):
+            self.flush()
+            with self._cond:
+                pending = self._pending_count()
+            if not pending:
+                break
+            if attempt + 1 < attempts:
+                time.sleep(min(self._retry_delay, 2.0))
+        else:
+            logger.error("Exiting with %d events and summaries not written", pending)
+        if self._rollups_stale and not self._rollups_marked:
+            # Leaves the rebuild to the next writer that checks the flag.
+            try:
+                mark_event_rollups_stale()
+            except Exception:
+                logger.exception("Could not flag event rollups as stale")
+
+    def _pending_count(self) -> int:
+        return len(self._events) + len(self._summaries)
+
+    def add_event(
+        self, event: Dict[str, Any], on_durable: Optional[EventCallback] = None
+    ) -> ObjectId:
+        # The id is assigned client-side so callers can reference the event
+        # before it is written.
+        event.setdefault("_id", ObjectId())
+        with self._cond:
+            while self._pending_count() >= self.max_pending and not self._stop.is_set():
+                self._cond.wait()
+            self._events.append((event, on_durable))
+            if self._pending_count() >= self.max_batch_size:
+                self._cond.notify_all()
+        return event["_id"]
+
+    def add_chunk_summary(self, summary: Dict[str, Any]) -> ObjectId:
+        summary.setdefault("_id", ObjectId())
+        with self._cond:
+            while self._pending_count() >= self.max_pending and not self._stop.is_set():
+                self._cond.wait()
+            self._summaries.append(summary)
+            if self._pending_count() >= self.max_batch_size:
+                self._cond.notify_all()
+        return summary["_id"]
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stop.is_set()
+                    or self._pending_count() >= self.max_batch_size,
+                    timeout=self.flush_interval,
+                )
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Batch flush failed")
+            self._repair_rollups()
+            if self._retry_delay:
+                self._stop.wait(self._retry_delay)
+
+    def _repair_rollups(self) -> None:
+        # Every rollup_rebuild_interval, rebuilds the rollups if this writer
+        # failed to update them or any process flagged them stale. Runs on
+        # the writer thread, so no increment from this writer can interleave
+        # with the rebuild.
+        if time.monotonic() < self._next_rollup_rebuild:
+            return
+        self._next_rollup_rebuild = time.monotonic() + self.rollup_rebuild_interval
+        try:
+            if self._rollups_stale and not self._rollups_marked:
+                # Persisted first, so another process or a restart rebuilds
+                # even if this one does not.
+                mark_event_rollups_stale()
+                self._rollups_marked = True
+            if not event_rollups_stale():
+                self._rollups_stale = False
+                self._rollups_marked = False
+                return
+            if not rebuild_event_rollups():
+                logger.info("Event rollups are being rebuilt by another process")
+                return
+        except Exception:
+            logger.exception("Rebuilding event rollups failed; retrying later")
+            return
+        self._rollups_stale = False
+        self._rollups_marked = False
+        logger.info("Rebuilt event rollups")
+
+    def _insert(
+        self, collection: str, docs: List[Dict[str, Any]]
+    ) -> Tuple[List[int], List[int], bool]:
+        # Returns (indexes of stored docs, indexes to retry, whether the
+        # failure was a lost connection rather than a per-document error).
+        try:
+            get_db()[collection].insert_many(docs, ordered=False)
+            return list(range(len(docs))), [], False
+        except BulkWriteError as exc:
+            errors = {
+                error["index"]: error for error in exc.details.get("writeErrors", [])
+            }
+            failed = [
+                idx
+                for idx, error in errors.items()
+                if error.get("code") != DUPLICATE_KEY_ERROR
+            ]
+            duplicates = [
+                idx
+                for idx, error in errors.items()
+                if error.get("code") == DUPLICATE_KEY_ERROR
+            ]
+            if failed:
+                logger.warning(
+                    "%d of %d %s were not written: %s",
+                    len(failed),
+                    len(docs),
+                    collection,
+                    errors[failed[0]].get("errmsg"),
+                )
+            # _ids are assigned client-side, so a duplicate whose _id exists
+            # was stored by an earlier attempt; any other duplicate lost to a
+            # document another writer stored first (events' dedupe_key) and
+            # is dropped.
+            rejected = set(failed)
+            if duplicates:
+                try:
+                    existing = {
+                        doc["_id"]
+                        for doc in get_db()[collection].find(
+                            {"_id": {"$in": [docs[idx]["_id"] for idx in duplicates]}},
+                            {"_id": 1},
+                        )
+                    }
+                except PyMongoError:
+                    # Unknown; retry them, the next attempt resolves it.
+                    return (
+                        [idx for idx in range(len(docs)) if idx not in errors],
+                        failed + duplicates,
+                        True,
+                    )
+                rejected.update(
+                    idx for idx in duplicates if docs[idx]["_id"] not in existing
+                )
+            stored = [idx for idx in range(len(docs)) if idx not in rejected]
+            return stored, failed, False
+        except ConnectionFailure:
+            logger.warning(
+                "Mongo unreachable; keeping %d %s for retry", len(docs), collection
+            )
+            return [], list(range(len(docs))), True
+        except Exception:
+            logger.exception("Failed to write %d %s", len(docs), collection)
+            return [], list(range(len(docs))), False
+
+    def _keep_for_retry(
+        self, items: List[Any], ids: List[Any], transient: bool
+    ) -> List[Any]:
+        kept = []
+        for item, doc_id in zip(items, ids):
+            if not transient:
+                attempts = self._attempts.get(doc_id, 0) + 1
+                if attempts >= self.max_write_attempts:
+                    logger.error(
+                        "Dropping document %s after %d failed writes", doc_id, attempts
+                    )
+                    self._attempts.pop(doc_id, None)
+                    self.dropped += 1
+                    continue
+                self._attempts[doc_id] = attempts
+            kept.append(item)
+        return kept
+
+    def flush(self) -> None:
+        with self._cond:
+            events = self._events
+            summaries = self._summaries
+            self._events = []
+            self._summaries = []
+            self._cond.notify_all()
+        if not events and not summaries:
+            return
+
+        # Events and summaries are written independently, so a failure of one
+        # never holds back the alerts of the other.
+        retry_events: List[Tuple[Dict[str, Any], Optional[EventCallback]]] = []
+        retry_summaries: List[Dict[str, Any]] = []
+        stored_events: List[Tuple[Dict[str, Any], Optional[EventCallback]]] = []
+        stored_summaries: List[Dict[str, Any]] = []
+        if events:
+            stored, failed, transient = self._insert(
+                "events", [event for event, _ in events]
+            )
+            stored_events = [events[idx] for idx in stored]
+            retry_events = self._keep_for_retry(
+                [events[idx] for idx in failed],
+                [events[idx][0]["_id"] for idx in failed],
+                transient,
+            )
+        if summaries:
+            stored, failed, transient = self._insert("chunk_summaries", summaries)
+            stored_summaries = [summaries[idx] for idx in stored]
+            retry_summaries = self._keep_for_retry(
+                [summaries[idx] for idx in failed],
+                [summaries[idx]["_id"] for idx in failed],
+                transient,
+            )
+
+        with self._cond:
+            # Retried documents go first so they are not overtaken by newer ones.
+            self._events[:0] = retry_events
+            self._summaries[:0] = retry_summaries
+        if retry_events or retry_summaries:
+            self._retry_delay = min(
+                self.max_retry_delay, max(self.flush_interval, self._retry_delay * 2)
+            )
+        else:
+            self._retry_delay = 0.0
+
+        for event, _ in stored_events:
+            self._attempts.pop(event["_id"], None)
+        for summary in stored_summaries:
+            self._attempts.pop(summary["_id"], None)
+
+        if stored_events:
+            _notify_write("events", [event for event, _ in stored_events])
+        if stored_summaries:
+            _notify_write("chunk_summaries", stored_summaries)
+
+        for event, on_durable in stored_events:
+            if on_durable is None:
+                continue
+            try:
+                on_durable(event)
+            except Exception:
+                logger.exception("Event callback failed")
+
+        # Rollups are derived data: alerts never wait on them, and a failed
+        # increment is repaired by a rebuild instead of retried, which could
+        # count an event twice. Increments go on while a rebuild is pending;
+        # the rebuild replaces whatever they added.
+        if stored_events:
+            try:
+                update_event_rollups([event for event, _ in stored_events])
+            except Exception:
+                logger.exception("Failed to update event rollups; rebuilding them")
+                self._rollups_stale = True
+                self._next_rollup_rebuild = 0.0
+
+
 def to_object_id(value: str) -> ObjectId:
     return ObjectId(value)
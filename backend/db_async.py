@@ -0,0 +1,147 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from backend import db
+
+# pymongo is blocking; request handlers run every query on this dedicated
+# pool so a slow query never stalls the event loop (or the SSE stream) and
+# does not compete with the default executor.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_EXECUTOR_WORKERS", "16")),
+    thread_name_prefix="db",
+)
+
+
+async def _run(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def create_video(
+    filename: str,
+    filepath: str,
+    use_case: str,
+    original_name: str,
+    sha256: Optional[str] = None,
+) -> ObjectId:
+    return await _run(
+        db.create_video,
+        filename=filename,
+        filepath=filepath,
+        use_case=use_case,
+        original_name=original_name,
+        sha256=sha256,
+    )
+
+
+async def update_video(video_id: ObjectId, fields: Dict[str, Any]) -> None:
+    await _run(db.update_video, video_id, fields)
+
+
+async def get_video(video_id: ObjectId) -> Optional[Dict[str, Any]]:
+    return await _run(db.get_video, video_id)
+
+
+async def get_video_keyframes(video_id: str) -> Optional[List[float]]:
+    return await _run(db.get_video_keyframes, video_id)
+
+
+async def find_video_by_sha256(sha256: str) -> Optional[Dict[str, Any]]:
+    return await _run(db.find_video_by_sha256, sha256)
+
+
+async def create_upload(
+    filename: str,
+    filepath: str,
+    use_case: str,
+    size: Optional[int] = None,
+) -> ObjectId:
+    return await _run(db.create_upload, filename, filepath, use_case, size=size)
+
+
+async def get_upload(upload_id: ObjectId) -> Optional[Dict[str, Any]]:
+    return await _run(db.get_upload, upload_id)
+
+
+async def update_upload(upload_id: ObjectId, fields: Dict[str, Any]) -> None:
+    await _run(db.update_upload, upload_id, fields)
+
+
+async def list_stale_uploads(updated_before: datetime) -> List[Dict[str, Any]]:
+    return await _run(db.list_stale_uploads, updated_before)
+
+
+async def expire_upload(upload_id: ObjectId, updated_before: datetime) -> bool:
+    return await _run(db.expire_upload, upload_id, updated_before)
+
+
+async def list_events(
+    filters: Dict[str, Any],
+    limit: int = 100,
+    after: Optional[Tuple[datetime, ObjectId]] = None,
+    fields: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    return await _run(db.list_events, filters, limit=limit, after=after, fields=fields)
+
+
+async def update_event(
+    event_id: ObjectId, fields: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    return await _run(db.update_event, event_id, fields)
+
+
+async def review_events(
+    fields: Dict[str, Any],
+    event_ids: Optional[List[ObjectId]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    max_events: int = 5000,
+) -> Tuple[List[Dict[str, Any]], List[ObjectId]]:
+    return await _run(
+        db.review_events,
+        fields,
+        event_ids=event_ids,
+        filters=filters,
+        max_events=max_events,
+    )
+
+
+async def get_event(event_id: ObjectId) -> Optional[Dict[str, Any]]:
+    return await _run(db.get_event, event_id)
+
+
+async def event_analytics(filters: Dict[str, Any]) -> Dict[str, Any]:
+    return await _run(db.event_analytics, filters)
+
+
+async def search_events(
+    query: str, filters: Dict[str, Any], limit: int = 10
+) -> List[Dict[str, Any]]:
+    return await _run(db.search_events, query, filters, limit=limit)
+
+
+async def list_chunk_summaries(
+    filters: Dict[str, Any], limit: int = 50
+) -> List[Dict[str, Any]]:
+    return await _run(db.list_chunk_summaries, filters, limit=limit)
+
+
+async def search_chunk_summaries(
+    query: str, filters: Dict[str, Any], limit: int = 10
+) -> List[Dict[str, Any]]:
+    return await _run(db.search_chunk_summaries, query, filters, limit=limit)
+
+
+async def count_chunk_jobs(statuses: List[str]) -> int:
+    return await _run(db.count_chunk_jobs, statuses)
+
+
+async def get_documents_by_ids(
+    collection: str, ids: List[ObjectId]
+) -> List[Dict[str, Any]]:
+    return await _run(db.get_documents_by_ids, collection, ids)
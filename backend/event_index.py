@@ -0,0 +1,65 @@
+import bisect
+import threading
+from typing import Dict, List
+
+from backend.db import list_event_timestamps
+
+
+class EventIntervalIndex:
+    # Sorted start timestamps per video and event type, used to de-duplicate
+    # detections without a Mongo query per event. A video's entries are
+    # loaded from Mongo the first time it is seen. Timestamps more than
+    # retain_seconds before the newest one are dropped, so a live stream's
+    # entries stay bounded; chunks finish roughly in order, so nothing that
+    # old can still fall within a dedupe window.
+    def __init__(self, retain_seconds: float = 3600.0):
+        self.retain_seconds = retain_seconds
+        self._videos: Dict[str, Dict[str, List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _video_entries(self, video_id: str) -> Dict[str, List[float]]:
+        with self._lock:
+            entries = self._videos.get(video_id)
+        if entries is not None:
+            return entries
+        loaded = list_event_timestamps(video_id)
+        for timestamps in loaded.values():
+            timestamps.sort()
+        with self._lock:
+            return self._videos.setdefault(video_id, loaded)
+
+    def add_if_new(
+        self,
+        video_id: str,
+        event_type: str,
+        timestamp_start: float,
+        window_seconds: float,
+    ) -> bool:
+        # Returns False when an event of the same type already starts within
+        # window_seconds; otherwise records the event and returns True.
+        if not video_id or not event_type:
+            return True
+        entries = self._video_entries(video_id)
+        with self._lock:
+            timestamps = entries.setdefault(event_type, [])
+            low = timestamp_start - window_seconds
+            high = timestamp_start + window_seconds
+            idx = bisect.bisect_left(timestamps, low)
+            if idx < len(timestamps) and timestamps[idx] <= high:
+                return False
+            timestamps.insert(idx, timestamp_start)
+            expired = bisect.bisect_left(
+                timestamps, timestamps[-1] - self.retain_seconds
+            )
+            if expired:
+                del timestamps[:expired]
+            return True
+
+    def forget(self, video_id: str) -> None:
+        # Dropped entries are loaded from Mongo again if the video comes back.
+        with self._lock:
+            self._videos.pop(video_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._videos)
@@ -1,20 +1,43 @@
+import asyncio
+import json
 import logging
+import os
 import queue
+import socket
 import threading
 import time
+from collections import OrderedDict, deque
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Callable, Deque, Dict, List, Optional
 
-from backend.config import get_use_case
+from backend.config import (
+    DEFAULT_DEDUPE_WINDOW_SECONDS,
+    DEFAULT_PRIORITY,
+    PRIORITY_CLASSES,
+    get_use_case,
+)
 from backend.db import (
-    find_recent_event,
+    BatchWriter,
+    advance_video_run,
+    cancel_chunk_jobs,
+    claim_chunk_job,
+    count_chunk_jobs,
+    enqueue_chunk_job,
+    expire_queued_chunk_job,
+    finish_chunk_job,
+    get_chunk_job_status,
+    get_video_run_generation,
     increment_video_failed,
     increment_video_processed,
-    insert_chunk_summary,
-    insert_event,
+    increment_video_skipped,
+    increment_video_throttled,
     maybe_mark_video_complete,
+    queued_chunk_job_ids,
+    renew_chunk_job_lease,
+    to_object_id,
 )
+from backend.event_index import EventIntervalIndex
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +81,14 @@ ELEVATED_KEYWORDS = {
 }
 
 
+def _dedupe_key(event_type: str, timestamp_start: float, window_seconds: float) -> str:
+    # Events closer than window_seconds are duplicates; two events in the same
+    # window-wide bucket always are, so the unique index on this key rejects
+    # only what the interval index would, for writers in any process.
+    bucket = int(timestamp_start // window_seconds) if window_seconds > 0 else 0
+    return f"{event_type}:{window_seconds:g}:{bucket}"
+
+
 def _infer_severity(event_type: str | None, description: str | None) -> str:
     text = f"{event_type or ''} {description or ''}".lower()
     if any(keyword in text for keyword in HUMAN_KEYWORDS):
@@ -79,138 +110,753 @@ class ChunkTask:
     timestamp_end: float
     use_case: str
     total_chunks: int
+    # JPEG frames from the single-pass extractor; None means extract per chunk.
+    frames: Optional[List[bytes]] = None
+    # Offset of each frame from the chunk start, in seconds.
+    frame_times: Optional[List[float]] = None
+    # Scheduling class from PRIORITY_CLASSES; lower runs first.
+    priority: int = PRIORITY_CLASSES[DEFAULT_PRIORITY]
+    # Virtual chunks: chunk_path is the original upload and this is the
+    # (start, end) range to analyze. None means chunk_path is the chunk.
+    clip_start: Optional[float] = None
+    clip_end: Optional[float] = None
+    # Set once the task is stored in (or leased from) the chunk_jobs collection.
+    job_id: Optional[str] = None
+    attempts: int = 0
+    # videos.run_generation when the chunk was queued; None skips the check.
+    run_generation: Optional[int] = None
+    # sha256 of the uploaded file; with the chunk's time range it keys the
+    # analysis cache. None (streams) keys it on the chunk file's content.
+    source_hash: Optional[str] = None
+    # Worker id the job is leased to; leases are renewed from another thread.
+    worker: Optional[str] = None
+    # Set when the task turned out to belong to a stopped or replaced run;
+    # it is acked without counting towards the current run's progress.
+    stale: bool = False
+
+
+def _task_clip(task: ChunkTask) -> Optional[tuple[float, float]]:
+    if task.clip_start is None or task.clip_end is None:
+        return None
+    return (task.clip_start, task.clip_end)
+
+
+# ChunkTask fields persisted with each job; frames stay in process memory.
+JOB_FIELDS = (
+    "video_id",
+    "chunk_path",
+    "chunk_filename",
+    "chunk_index",
+    "timestamp_start",
+    "timestamp_end",
+    "use_case",
+    "total_chunks",
+    "priority",
+    "clip_start",
+    "clip_end",
+    "run_generation",
+    "source_hash",
+)
+
+
+class AlertSubscriber:
+    def __init__(self, max_queue_size: int):
+        self.max_queue_size = max_queue_size
+        self.dropped = 0
+        self._buffer: Deque[tuple[int, str]] = deque()
+        self._ready = asyncio.Event()
+
+    def push(self, event_id: int, data: str) -> None:
+        if len(self._buffer) >= self.max_queue_size:
+            # Drop if subscriber is too slow
+            self.dropped += 1
+            return
+        self._buffer.append((event_id, data))
+        self._ready.set()
+
+    async def get(self) -> tuple[int, str]:
+        while not self._buffer:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._buffer.popleft()
 
 
 class AlertBroker:
-    def __init__(self, max_queue_size: int = 100):
-        self._subscribers: List[queue.Queue] = []
-        self._lock = threading.Lock()
+    # Fans alerts out to SSE clients on the event loop. publish() may be
+    # called from any thread: the event is handed to the loop once,
+    # serialized once, and appended to each subscriber's bounded buffer.
+    # Recent alerts are kept in a ring buffer for Last-Event-ID replay.
+    def __init__(
+        self,
+        serializer: Callable[[Dict[str, Any]], str] = json.dumps,
+        max_queue_size: int = 100,
+        replay_size: int = 256,
+    ):
+        self._serializer = serializer
         self._max_queue_size = max_queue_size
+        self._subscribers: List[AlertSubscriber] = []
+        self._history: Deque[tuple[int, str]] = deque(maxlen=replay_size)
+        # Millisecond-based ids keep increasing across restarts, so a stale
+        # Last-Event-ID from a previous process never hides new alerts.
+        self._last_id = int(time.time() * 1000)
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
 
-    def subscribe(self) -> queue.Queue:
-        q: queue.Queue = queue.Queue(maxsize=self._max_queue_size)
-        with self._lock:
-            self._subscribers.append(q)
-        return q
+    def subscribe(self, last_event_id: Optional[int] = None) -> AlertSubscriber:
+        subscriber = AlertSubscriber(self._max_queue_size)
+        if last_event_id is not None:
+            for event_id, data in self._history:
+                if event_id > last_event_id:
+                    subscriber.push(event_id, data)
+        self._subscribers.append(subscriber)
+        return subscriber
 
-    def unsubscribe(self, q: queue.Queue):
-        with self._lock:
-            if q in self._subscribers:
-                self._subscribers.remove(q)
+    def unsubscribe(self, subscriber: AlertSubscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.remove(subscriber)
 
     def publish(self, event: Dict[str, Any]):
-        with self._lock:
-            for q in list(self._subscribers):
-                try:
-                    q.put_nowait(event)
-                except queue.Full:
-                    # Drop if subscriber is too slow
-                    continue
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: Dict[str, Any]) -> None:
+        try:
+            data = self._serializer(event)
+        except Exception:
+            logger.exception("Failed to serialize alert")
+            return
+        self._last_id += 1
+        self._history.append((self._last_id, data))
+        for subscriber in self._subscribers:
+            subscriber.push(self._last_id, data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "dropped": [subscriber.dropped for subscriber in self._subscribers],
+        }
+
+
+class ChunkJobQueue:
+    # Chunk queue stored in the chunk_jobs collection, so pending chunks
+    # survive restarts and any process sharing the database can work on them.
+    # A worker leases a job for lease_seconds; if it dies, the lease runs out
+    # and the job becomes visible again. While a job is held, a heartbeat
+    # thread renews its lease every lease_seconds / 3, so slow analyses are
+    # not taken over by another worker. Pre-extracted frames are kept only
+    # in this process, for at most max_cached_frames jobs; producers wait in
+    # wait_for_frame_room until a worker claims one. Jobs queued without
+    # frames, or claimed by another process, extract them from the chunk.
+    def __init__(
+        self,
+        lease_seconds: float = 300.0,
+        max_cached_frames: int = 32,
+        poll_interval: float = 0.5,
+    ):
+        self.lease_seconds = lease_seconds
+        self.max_cached_frames = max_cached_frames
+        self.poll_interval = poll_interval
+        self._frames: OrderedDict[str, tuple] = OrderedDict()
+        self._frames_lock = threading.Lock()
+        self._frames_claimed = threading.Event()
+        self._wakeup = threading.Event()
+        # job_id -> task, for the jobs this process holds a lease on.
+        self._held: Dict[str, ChunkTask] = {}
+        self._held_lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def _worker_id(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+    def qsize(self) -> int:
+        return count_chunk_jobs(["queued"])
+
+    def put(self, task: ChunkTask) -> bool:
+        # Never blocks; returns False if the chunk was already queued.
+        job_id = enqueue_chunk_job({field: getattr(task, field) for field in JOB_FIELDS})
+        if job_id is None:
+            return False
+        task.job_id = str(job_id)
+        if task.frames:
+            with self._frames_lock:
+                # Full only if the producer did not wait for room: the newest
+                # jobs go without frames rather than evicting ones that will
+                # be claimed sooner.
+                if len(self._frames) < self.max_cached_frames:
+                    self._frames[task.job_id] = (
+                        task.video_id,
+                        task.frames,
+                        task.frame_times,
+                    )
+        self._wakeup.set()
+        return True
+
+    def _claim(self, filters: Optional[Dict[str, Any]] = None) -> Optional[ChunkTask]:
+        job = claim_chunk_job(self._worker_id(), self.lease_seconds, filters)
+        if job is None:
+            return None
+        task = ChunkTask(**{field: job[field] for field in JOB_FIELDS if field in job})
+        task.job_id = str(job["_id"])
+        task.attempts = int(job.get("attempts", 0))
+        task.worker = job["worker"]
+        with self._held_lock:
+            self._held[task.job_id] = task
+        with self._frames_lock:
+            cached = self._frames.pop(task.job_id, None)
+        if cached is not None:
+            _, task.frames, task.frame_times = cached
+            self._frames_claimed.set()
+        return task
+
+    def wait_for_frame_room(self, *stop_events: threading.Event) -> bool:
+        # Blocks while max_cached_frames queued jobs' frames are held, so a
+        # whole-video decode runs only a little ahead of analysis instead of
+        # dropping what it decoded. Frames of jobs that left the queue some
+        # other way (claimed by another process, cancelled) are dropped while
+        # waiting. Returns False if one of stop_events was set.
+        while True:
+            self._frames_claimed.clear()
+            with self._frames_lock:
+                if len(self._frames) < self.max_cached_frames:
+                    return True
+            if any(event.is_set() for event in stop_events):
+                return False
+            if not self._frames_claimed.wait(self.poll_interval):
+                self._drop_unqueued_frames()
+
+    def _drop_unqueued_frames(self) -> None:
+        with self._frames_lock:
+            job_ids = list(self._frames)
+        queued = queued_chunk_job_ids([to_object_id(job_id) for job_id in job_ids])
+        queued_ids = {str(job_id) for job_id in queued}
+        with self._frames_lock:
+            for job_id in job_ids:
+                if job_id not in queued_ids:
+                    self._frames.pop(job_id, None)
+
+    def get(self, timeout: float | None = None) -> ChunkTask:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._wakeup.clear()
+            task = self._claim()
+            if task is not None:
+                return task
+            wait = self.poll_interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise queue.Empty
+                wait = min(wait, remaining)
+            self._wakeup.wait(wait)
+
+    def take_following(self, task: ChunkTask, limit: int) -> List[ChunkTask]:
+        # Leases up to limit jobs that directly follow task in the same video
+        # (consecutive chunk indexes, same use case) so they can be analyzed
+        # in one request. Never waits.
+        taken: List[ChunkTask] = []
+        last = task
+        while len(taken) < limit:
+            following = self._claim(
+                {
+                    "video_id": task.video_id,
+                    "chunk_index": last.chunk_index + 1,
+                    "use_case": task.use_case,
+                }
+            )
+            if following is None:
+                break
+            taken.append(following)
+            last = following
+        return taken
+
+    def owns(self, task: ChunkTask) -> bool:
+        # Renews the lease and returns False if it was lost. Called right
+        # before results are stored, so they are only written by the worker
+        # that holds the job, with a full lease period left to write them.
+        if task.job_id is None:
+            return True
+        return renew_chunk_job_lease(
+            to_object_id(task.job_id), task.worker or "", self.lease_seconds
+        )
+
+    def ack(self, task: ChunkTask, status: str = "done") -> bool:
+        # Returns False if this worker no longer holds the lease.
+        if task.job_id is None:
+            return True
+        with self._held_lock:
+            self._held.pop(task.job_id, None)
+        return finish_chunk_job(
+            to_object_id(task.job_id), task.worker or self._worker_id(), status
+        )
+
+    def start_heartbeat(self, stop_event: threading.Event) -> None:
+        if self._heartbeat and self._heartbeat.is_alive():
+            return
+
+        def run():
+            while not stop_event.wait(self.lease_seconds / 3):
+                with self._held_lock:
+                    held = list(self._held.values())
+                for task in held:
+                    try:
+                        if not self.owns(task):
+                            logger.warning("Lost the lease on %s", task.chunk_filename)
+                            with self._held_lock:
+                                self._held.pop(task.job_id, None)
+                    except Exception:
+                        logger.exception("Renewing the lease on %s failed", task.job_id)
+
+        self._heartbeat = threading.Thread(
+            target=run, name="chunk-lease-heartbeat", daemon=True
+        )
+        self._heartbeat.start()
+
+    def retry(self, task: ChunkTask) -> bool:
+        return self.ack(task, status="queued")
+
+    def cancel(self, video_id: str) -> int:
+        with self._frames_lock:
+            for job_id in [
+                job_id
+                for job_id, cached in self._frames.items()
+                if cached[0] == video_id
+            ]:
+                del self._frames[job_id]
+        return cancel_chunk_jobs(video_id)
+
+    def clear(self) -> int:
+        with self._frames_lock:
+            self._frames.clear()
+        return cancel_chunk_jobs()
 
 
 class EventProcessor:
-    def __init__(self, analyzer, alert_broker: AlertBroker):
+    def __init__(
+        self,
+        analyzer,
+        alert_broker: AlertBroker,
+        writer: BatchWriter,
+        num_workers: int = 1,
+        cache=None,
+        batch_size: int = 1,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 3,
+    ):
         self.analyzer = analyzer
         self.alert_broker = alert_broker
-        self.queue: queue.Queue[ChunkTask] = queue.Queue(maxsize=500)
+        self.writer = writer
+        self.cache = cache
+        self.event_index = EventIntervalIndex()
+        self.num_workers = max(1, num_workers)
+        # Consecutive chunks of one video analyzed per Gemini request.
+        self.batch_size = max(1, batch_size)
+        # Jobs are retried until they have been leased max_attempts times.
+        self.max_attempts = max(1, max_attempts)
+        # Enough pre-extracted chunks to keep every worker busy for a few
+        # batches while the producer waits.
+        self.queue = ChunkJobQueue(
+            lease_seconds=lease_seconds,
+            max_cached_frames=max(8, 4 * self.num_workers * self.batch_size),
+        )
         self.stop_event = threading.Event()
-        self.thread: threading.Thread | None = None
+        self.threads: List[threading.Thread] = []
+        self._video_locks: Dict[str, threading.Lock] = {}
+        # Set when a video is stopped; checked by in-flight tasks before they
+        # store anything.
+        self._cancel_tokens: Dict[str, threading.Event] = {}
+        self._video_locks_guard = threading.Lock()
+        # Per-video state (dedupe index, lock, cancelled token) is dropped
+        # when the video completes, or after idle_seconds without a chunk,
+        # e.g. when another process finished it.
+        self.idle_seconds = 2 * lease_seconds
+        self._last_seen: Dict[str, float] = {}
+        self._next_prune = 0.0
 
     def start(self):
-        if self.thread and self.thread.is_alive():
+        self.threads = [t for t in self.threads if t.is_alive()]
+        if self.threads:
             return
         self.stop_event.clear()
-        self.thread = threading.Thread(target=self._worker, daemon=True)
-        self.thread.start()
+        self.queue.start_heartbeat(self.stop_event)
+        for idx in range(self.num_workers):
+            t = threading.Thread(
+                target=self._worker, name=f"chunk-worker-{idx}", daemon=True
+            )
+            self.threads.append(t)
+            t.start()
 
     def stop(self):
         self.stop_event.set()
 
     def clear_queue(self):
-        while True:
-            try:
-                self.queue.get_nowait()
-                self.queue.task_done()
-            except queue.Empty:
-                break
+        self.queue.clear()
+
+    def cancel_video(self, video_id: str) -> int:
+        # Drops only this video's queued chunks and tells its in-flight
+        # chunks to discard their results: directly in this process, and
+        # through the video's run generation in every other one. Returns the
+        # number of jobs dropped.
+        self.cancel_token(video_id).set()
+        advance_video_run(video_id)
+        dropped = self.queue.cancel(video_id)
+        # The token stays set for the segmentation loop and in-flight chunks;
+        # the idle sweep drops it later.
+        self.event_index.forget(video_id)
+        with self._video_locks_guard:
+            self._video_locks.pop(video_id, None)
+        return dropped
+
+    def reset_video(self, video_id: str):
+        # Clears a previous cancellation before the video is started again.
+        with self._video_locks_guard:
+            self._cancel_tokens[video_id] = threading.Event()
+
+    def is_cancelled(self, video_id: str) -> bool:
+        return self.cancel_token(video_id).is_set()
+
+    def is_current(self, task: ChunkTask) -> bool:
+        # False once the task's run was stopped or replaced by a restart,
+        # from this process or another one.
+        if self.is_cancelled(task.video_id):
+            return False
+        if task.run_generation is None:
+            return True
+        return get_video_run_generation(task.video_id) == task.run_generation
+
+    def cancel_token(self, video_id: str) -> threading.Event:
+        with self._video_locks_guard:
+            self._last_seen[video_id] = time.monotonic()
+            token = self._cancel_tokens.get(video_id)
+            if token is None:
+                token = threading.Event()
+                self._cancel_tokens[video_id] = token
+            return token
+
+    def enqueue(
+        self, task: ChunkTask, stop_event: Optional[threading.Event] = None
+    ) -> bool:
+        # With stop_event, a task carrying frames waits until this process's
+        # workers have claimed enough earlier ones (see wait_for_frame_room).
+        # Returns False if the chunk was already queued or stop_event was set.
+        if (
+            task.frames
+            and stop_event is not None
+            and any(thread.is_alive() for thread in self.threads)
+        ):
+            self.queue.wait_for_frame_room(stop_event, self.stop_event)
+            if stop_event.is_set():
+                return False
+        return self.queue.put(task)
+
+    def release_chunk(self, video_id: str, chunk_index: int) -> bool:
+        # Called before a stream chunk file is deleted. A chunk still waiting
+        # in the queue is expired and counted as skipped; one being analyzed
+        # (or put back for a retry) is kept. Returns True if the file can go.
+        if expire_queued_chunk_job(video_id, chunk_index):
+            logger.warning(
+                "Chunk %d of video %s expired before it was analyzed",
+                chunk_index,
+                video_id,
+            )
+            increment_video_skipped(video_id)
+            processed = increment_video_processed(video_id)
+            if processed is not None and maybe_mark_video_complete(
+                video_id, processed, 0
+            ):
+                self.forget_video(video_id)
+            return True
+        return get_chunk_job_status(video_id, chunk_index) not in ("queued", "leased")
 
-    def enqueue(self, task: ChunkTask):
-        self.queue.put(task)
+    def forget_video(self, video_id: str) -> None:
+        # Drops the in-memory state of a video that completed or failed.
+        # Later chunks of a new run load it again.
+        self.event_index.forget(video_id)
+        with self._video_locks_guard:
+            self._video_locks.pop(video_id, None)
+            self._cancel_tokens.pop(video_id, None)
+            self._last_seen.pop(video_id, None)
+
+    def _prune_idle_videos(self) -> None:
+        now = time.monotonic()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + min(60.0, self.idle_seconds)
+        with self._video_locks_guard:
+            idle = [
+                video_id
+                for video_id, seen in self._last_seen.items()
+                if now - seen > self.idle_seconds
+            ]
+            for video_id in idle:
+                lock = self._video_locks.get(video_id)
+                if lock is not None and lock.locked():
+                    continue
+                self._video_locks.pop(video_id, None)
+                self._last_seen.pop(video_id, None)
+                # An unset token may still be held by a segmentation loop
+                # that a later stop has to reach.
+                token = self._cancel_tokens.get(video_id)
+                if token is not None and token.is_set():
+                    del self._cancel_tokens[video_id]
+        for video_id in idle:
+            self.event_index.forget(video_id)
+
+    def _video_lock(self, video_id: str) -> threading.Lock:
+        with self._video_locks_guard:
+            self._last_seen[video_id] = time.monotonic()
+            lock = self._video_locks.get(video_id)
+            if lock is None:
+                lock = threading.Lock()
+                self._video_locks[video_id] = lock
+            return lock
 
     def _worker(self):
         while not self.stop_event.is_set():
+            self._prune_idle_videos()
             try:
                 task: ChunkTask = self.queue.get(timeout=1)
             except queue.Empty:
                 continue
 
+            if task.attempts > self.max_attempts:
+                # Every earlier lease expired without an ack: the worker died
+                # on this chunk. Give up on it rather than crash the next one.
+                logger.warning("Giving up on chunk %s", task.chunk_filename)
+                self._finish([task], status="failed")
+                continue
+
+            tasks = [task]
+            if self.batch_size > 1:
+                tasks += self.queue.take_following(task, self.batch_size - 1)
+
             try:
-                logger.info(
-                    "Analyzing chunk %s for video %s",
-                    task.chunk_filename,
-                    task.video_id,
-                )
-                use_case = get_use_case(task.use_case)
-                analysis = self.analyzer.analyze_chunk(task.chunk_path, use_case)
-                if isinstance(analysis, dict):
-                    events = analysis.get("events", [])
-                    summary = analysis.get("summary", "")
-                    analysis_failed = analysis.get("analysis_failed")
-                else:
-                    # Backward-compatible: analyzer used to return just a list of events.
-                    events = analysis if isinstance(analysis, list) else []
-                    summary = ""
-                    analysis_failed = None
-
-                if analysis_failed:
-                    increment_video_failed(task.video_id)
-
-                for event in events:
-                    event_type = event.get("event_type")
-                    if find_recent_event(
-                        task.video_id,
-                        event_type,
-                        float(task.timestamp_start),
-                    ):
-                        continue
-                    description = event.get("description", "")
-                    event_doc = {
-                        "video_id": task.video_id,
-                        "chunk_filename": task.chunk_filename,
-                        "chunk_index": task.chunk_index,
-                        "timestamp_start": task.timestamp_start,
-                        "timestamp_end": task.timestamp_end,
-                        "event_type": event_type,
-                        "event_description": description,
-                        "confidence": event.get("confidence", 0.0),
-                        "explanation": event.get("explanation", ""),
-                        "status": "pending_review",
-                        "severity": _infer_severity(event_type, description),
-                        "reviewer_notes": None,
-                        "detected_at": datetime.utcnow(),
-                        "reviewed_at": None,
-                    }
-                    inserted_id = insert_event(event_doc)
-                    event_doc["id"] = str(inserted_id)
-                    self.alert_broker.publish(event_doc)
-
-                if summary:
-                    summary_doc = {
-                        "video_id": task.video_id,
-                        "chunk_filename": task.chunk_filename,
-                        "chunk_index": task.chunk_index,
-                        "timestamp_start": task.timestamp_start,
-                        "timestamp_end": task.timestamp_end,
-                        "summary": summary,
-                        "detected_at": datetime.utcnow(),
-                    }
-                    insert_chunk_summary(summary_doc)
+                self._process_tasks(tasks)
             except Exception:
                 # swallow errors to keep worker alive
-                logger.exception("Error processing chunk %s", task.chunk_filename)
+                logger.exception(
+                    "Error processing chunks %s",
+                    ", ".join(t.chunk_filename for t in tasks),
+                )
                 time.sleep(0.25)
-            finally:
-                processed = increment_video_processed(task.video_id)
-                if processed is not None:
-                    maybe_mark_video_complete(task.video_id, processed, task.total_chunks)
-                self.queue.task_done()
+                for failed in tasks:
+                    if failed.attempts < self.max_attempts:
+                        self.queue.retry(failed)
+                    else:
+                        self._finish([failed], status="failed")
+                continue
+            self._finish(tasks)
+
+    def _finish(self, tasks: List[ChunkTask], status: str = "done"):
+        for done in tasks:
+            if done.stale:
+                self.queue.ack(done, status="cancelled")
+                continue
+            if not self.queue.ack(done, status=status):
+                # The lease expired and another worker owns the chunk now, or
+                # the video was stopped; that worker does the counting.
+                continue
+            if status == "failed":
+                increment_video_failed(done.video_id)
+            # Counters are atomic $inc updates, so chunks may finish in any order.
+            processed = increment_video_processed(done.video_id)
+            if processed is not None and maybe_mark_video_complete(
+                done.video_id, processed, done.total_chunks
+            ):
+                self.forget_video(done.video_id)
+
+    def _process_tasks(self, tasks: List[ChunkTask]):
+        # All tasks share a video and use case (see ChunkJobQueue.take_following).
+        for task in tasks:
+            task.stale = not self.is_current(task)
+        tasks = [task for task in tasks if not task.stale]
+        if not tasks:
+            return
+        logger.info(
+            "Analyzing chunks %s for video %s",
+            ", ".join(t.chunk_filename for t in tasks),
+            tasks[0].video_id,
+        )
+        use_case = get_use_case(tasks[0].use_case)
+        contents: List[Optional[str]] = [None] * len(tasks)
+        analyses: List[Any] = [None] * len(tasks)
+        # Looked up under the model the analyzer would use now; stored under
+        # the model that actually answered, which differs after a fallback.
+        lookup_model = self.analyzer.model_name
+        if self.cache is not None:
+            for idx, task in enumerate(tasks):
+                contents[idx] = self._cache_content(task)
+                key = self.cache.make_key(
+                    contents[idx], task.use_case, use_case, lookup_model
+                )
+                if key:
+                    analyses[idx] = self.cache.get(key)
+        from_cache = [analysis is not None for analysis in analyses]
+        misses = [idx for idx, hit in enumerate(from_cache) if not hit]
+        if len(misses) == 1:
+            task = tasks[misses[0]]
+            analyses[misses[0]] = self.analyzer.analyze_chunk(
+                task.chunk_path,
+                use_case,
+                frames=task.frames,
+                frame_times=task.frame_times,
+                clip=_task_clip(task),
+            )
+        elif misses:
+            results = self.analyzer.analyze_chunks(
+                [
+                    (
+                        tasks[idx].chunk_path,
+                        tasks[idx].frames,
+                        tasks[idx].frame_times,
+                        _task_clip(tasks[idx]),
+                    )
+                    for idx in misses
+                ],
+                use_case,
+            )
+            for idx, analysis in zip(misses, results):
+                analyses[idx] = analysis
+        for idx in misses:
+            analysis = analyses[idx]
+            if (
+                contents[idx]
+                and isinstance(analysis, dict)
+                and not analysis.get("analysis_failed")
+            ):
+                key = self.cache.make_key(
+                    contents[idx],
+                    tasks[idx].use_case,
+                    use_case,
+                    analysis.get("model") or lookup_model,
+                )
+                self.cache.put(key, analysis)
+
+        for task, analysis, cached in zip(tasks, analyses, from_cache):
+            # Drop the frame bytes as soon as they are analyzed.
+            task.frames = None
+            task.frame_times = None
+            self._handle_analysis(task, use_case, analysis, cached)
+
+    def _cache_content(self, task: ChunkTask) -> Optional[str]:
+        return self.cache.content_hash(
+            task.chunk_path,
+            task.timestamp_start,
+            task.timestamp_end,
+            source_hash=task.source_hash,
+            clip=_task_clip(task) is not None,
+        )
+
+    def has_cached_analysis(self, task: ChunkTask, use_case: Dict[str, Any]) -> bool:
+        # For producers: a chunk whose analysis is cached needs no frames.
+        if self.cache is None:
+            return False
+        key = self.cache.make_key(
+            self._cache_content(task),
+            task.use_case,
+            use_case,
+            self.analyzer.model_name,
+        )
+        return key is not None and self.cache.contains(key)
+
+    def _handle_analysis(
+        self,
+        task: ChunkTask,
+        use_case: Dict[str, Any],
+        analysis: Any,
+        from_cache: bool,
+    ):
+        if not self.is_current(task):
+            # The video was stopped or restarted while this chunk was being
+            # analyzed.
+            task.stale = True
+            return
+        if not self.queue.owns(task):
+            # The lease ran out and another worker took the chunk over, or the
+            # job was cancelled; that worker stores its own results.
+            logger.info("Discarding results of %s: lease lost", task.chunk_filename)
+            return
+        if isinstance(analysis, dict):
+            events = analysis.get("events", [])
+            summary = analysis.get("summary", "")
+            analysis_failed = analysis.get("analysis_failed")
+        else:
+            # Backward-compatible: analyzer used to return just a list of events.
+            events = analysis if isinstance(analysis, list) else []
+            summary = ""
+            analysis_failed = None
+
+        if analysis_failed:
+            increment_video_failed(task.video_id)
+        elif isinstance(analysis, dict) and analysis.get("skipped"):
+            increment_video_skipped(task.video_id)
+        if (
+            not from_cache
+            and isinstance(analysis, dict)
+            and analysis.get("throttle_retries")
+        ):
+            increment_video_throttled(task.video_id)
+
+        dedupe_window = float(
+            use_case.get("dedupe_window_seconds", DEFAULT_DEDUPE_WINDOW_SECONDS)
+        )
+        # Chunks of the same video run concurrently; serialize the dedupe
+        # check and insert so neighbouring chunks cannot both store an event.
+        # The interval index only knows this process's events and what was
+        # in Mongo when the video was loaded; the dedupe_key unique index
+        # makes the insert of a duplicate from another process fail instead.
+        with self._video_lock(task.video_id):
+            for event in events:
+                event_type = event.get("event_type")
+                if not self.event_index.add_if_new(
+                    task.video_id,
+                    event_type,
+                    float(task.timestamp_start),
+                    dedupe_window,
+                ):
+                    continue
+                description = event.get("description", "")
+                event_doc = {
+                    "video_id": task.video_id,
+                    "chunk_filename": task.chunk_filename,
+                    "chunk_index": task.chunk_index,
+                    "timestamp_start": task.timestamp_start,
+                    "timestamp_end": task.timestamp_end,
+                    "event_type": event_type,
+                    "event_description": description,
+                    "dedupe_key": (
+                        _dedupe_key(
+                            event_type, float(task.timestamp_start), dedupe_window
+                        )
+                        if event_type
+                        else None
+                    ),
+                    "confidence": event.get("confidence", 0.0),
+                    "explanation": event.get("explanation", ""),
+                    "status": "pending_review",
+                    "severity": _infer_severity(event_type, description),
+                    "reviewer_notes": None,
+                    "detected_at": datetime.utcnow(),
+                    "reviewed_at": None,
+                }
+                self.writer.add_event(event_doc, on_durable=self._publish_event)
+
+        if summary:
+            summary_doc = {
+                "video_id": task.video_id,
+                "chunk_filename": task.chunk_filename,
+                "chunk_index": task.chunk_index,
+                "timestamp_start": task.timestamp_start,
+                "timestamp_end": task.timestamp_end,
+                "summary": summary,
+                "detected_at": datetime.utcnow(),
+            }
+            self.writer.add_chunk_summary(summary_doc)
+
+    def _publish_event(self, event_doc: Dict[str, Any]):
+        # Runs on the writer thread once the event is stored.
+        event_doc["id"] = str(event_doc["_id"])
+        self.alert_broker.publish(event_doc)
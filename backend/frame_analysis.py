@@ -0,0 +1,91 @@
+import io
+import math
+from typing import List
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Frames are compared as small grayscale thumbnails; a pixel counts as changed
+# when its intensity moves by more than the noise floor, which absorbs JPEG
+# artifacts and sensor noise.
+THUMBNAIL_SIZE = (160, 90)
+PIXEL_NOISE_FLOOR = 25
+
+
+def frames_to_gray(frames: List[bytes]) -> np.ndarray:
+    thumbs = []
+    for frame in frames:
+        with Image.open(io.BytesIO(frame)) as image:
+            thumbs.append(np.asarray(image.convert("L").resize(THUMBNAIL_SIZE)))
+    return np.stack(thumbs).astype(np.int16)
+
+
+def activity_score(frames: List[bytes]) -> float | None:
+    # Largest fraction of changed pixels between consecutive frames, or None
+    # when there are too few frames to compare.
+    if len(frames) < 2:
+        return None
+    gray = frames_to_gray(frames)
+    changed = np.abs(np.diff(gray, axis=0)) > PIXEL_NOISE_FLOOR
+    return float(changed.mean(axis=(1, 2)).max())
+
+
+def select_informative_frames(
+    frames: List[bytes], max_frames: int, min_change: float
+) -> List[int]:
+    # Walks the candidates in order and keeps a frame only when it differs
+    # from the last kept one by at least min_change. The first and last
+    # candidates are always kept so motion gating still has a pair to
+    # compare. If more frames qualify than the budget allows, the biggest
+    # changes win. Returns the kept indices in chronological order.
+    if len(frames) <= 1 or max_frames <= 1:
+        return list(range(min(len(frames), max(max_frames, 0))))
+    gray = frames_to_gray(frames)
+    last = len(frames) - 1
+    kept = [0]
+    scores = [float("inf")]
+    for idx in range(1, last):
+        change = float((np.abs(gray[idx] - gray[kept[-1]]) > PIXEL_NOISE_FLOOR).mean())
+        if change >= min_change:
+            kept.append(idx)
+            scores.append(change)
+    kept.append(last)
+    scores.append(float("inf"))
+    if len(kept) > max_frames:
+        best = sorted(range(len(kept)), key=lambda k: scores[k], reverse=True)
+        kept = sorted(kept[k] for k in best[:max_frames])
+    return kept
+
+
+def build_mosaic(
+    frames: List[bytes],
+    labels: List[str],
+    tile_width: int,
+    jpeg_quality: int,
+) -> bytes:
+    # Packs the frames into one near-square grid (left to right, top to
+    # bottom), each tile downsized to tile_width and stamped with its label.
+    images = []
+    for frame in frames:
+        with Image.open(io.BytesIO(frame)) as image:
+            rgb = image.convert("RGB")
+        height = max(1, round(rgb.height * tile_width / rgb.width))
+        images.append(rgb.resize((tile_width, height)))
+    tile_height = max(image.height for image in images)
+    columns = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    mosaic = Image.new("RGB", (columns * tile_width, rows * tile_height))
+    draw = ImageDraw.Draw(mosaic)
+    font = ImageFont.load_default(size=max(12, tile_width // 20))
+    for idx, image in enumerate(images):
+        x = (idx % columns) * tile_width
+        y = (idx // columns) * tile_height
+        mosaic.paste(image, (x, y))
+        if idx < len(labels):
+            origin = (x + 4, y + 4)
+            left, top, right, bottom = draw.textbbox(origin, labels[idx], font=font)
+            draw.rectangle((left - 3, top - 3, right + 3, bottom + 3), fill="black")
+            draw.text(origin, labels[idx], fill="white", font=font)
+    out = io.BytesIO()
+    mosaic.save(out, format="JPEG", quality=jpeg_quality)
+    return out.getvalue()
@@ -8,6 +8,15 @@ class StartMonitoringRequest(BaseModel):
     video_id: str
     use_case: Optional[str] = None
     chunk_duration_seconds: Optional[int] = Field(default=None, ge=2, le=60)
+    priority: Optional[str] = Field(default=None, description="high, normal or bulk")
+
+
+class StartStreamRequest(BaseModel):
+    url: str = Field(description="RTSP/HLS/UDP URL, file path or named pipe")
+    name: Optional[str] = None
+    use_case: Optional[str] = None
+    chunk_duration_seconds: Optional[int] = Field(default=None, ge=2, le=60)
+    priority: Optional[str] = Field(default=None, description="high, normal or bulk")
 
 
 class ReviewRequest(BaseModel):
@@ -16,6 +25,21 @@ class ReviewRequest(BaseModel):
     reviewer_notes: Optional[str] = None
 
 
+class EventFilter(BaseModel):
+    status: Optional[str] = None
+    event_type: Optional[str] = None
+    video_id: Optional[str] = None
+
+
+class BulkReviewRequest(BaseModel):
+    # Either event_ids or filter selects the events.
+    event_ids: Optional[List[str]] = None
+    filter: Optional[EventFilter] = None
+    status: str
+    severity: Optional[str] = None
+    reviewer_notes: Optional[str] = None
+
+
 class SearchRequest(BaseModel):
     query: str
     limit: int = Field(default=10, ge=1, le=100)
@@ -32,6 +56,20 @@ class UploadResponse(BaseModel):
     status: str
 
 
+class CreateUploadRequest(BaseModel):
+    filename: str
+    use_case: Optional[str] = None
+    size: Optional[int] = Field(default=None, gt=0, description="Total size in bytes")
+
+
+class UploadSessionOut(BaseModel):
+    upload_id: str
+    offset: int
+    size: Optional[int] = None
+    status: str
+    video_id: Optional[str] = None
+
+
 class EventOut(BaseModel):
     id: str
     video_id: str
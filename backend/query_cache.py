@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+# Cache scope of a query that is not restricted to one video.
+GLOBAL_SCOPE = None
+
+
+class _Entry:
+    __slots__ = ("value", "scope", "expires_at", "size")
+
+    def __init__(self, value: Any, scope: Optional[str], expires_at: float, size: int):
+        self.value = value
+        self.scope = scope
+        self.expires_at = expires_at
+        self.size = size
+
+
+def _estimate_size(value: Any) -> int:
+    # Serialized JSON length; cached values are API responses, so this tracks
+    # what they weigh closely enough for a budget.
+    return len(json.dumps(value, default=str))
+
+
+class QueryCache:
+    # In-process LRU cache of search and event list responses with a TTL.
+    # Each entry is scoped to the video_id its query filtered on, or to
+    # GLOBAL_SCOPE. A write for a video drops that video's entries plus the
+    # global ones, which may include the video's documents. Entries for
+    # other videos stay.
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 30.0,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._keys_by_scope: Dict[Optional[str], Set[Hashable]] = {}
+        # Bumped on invalidation; a result computed before a write to its
+        # scope is not stored afterwards.
+        self._generations: Dict[Optional[str], int] = {}
+        self._global_generation = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind: str, **params: Any) -> Tuple:
+        # Only the free-text query is case and whitespace insensitive; ids,
+        # filters and cursors are matched exactly, as Mongo matches them.
+        normalized = []
+        for name, value in sorted(params.items()):
+            if name == "query" and isinstance(value, str):
+                value = " ".join(value.lower().split())
+            normalized.append((name, value))
+        return (kind, tuple(normalized))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def generation(self, scope: Optional[str]) -> int:
+        with self._lock:
+            return self._generation(scope)
+
+    def _generation(self, scope: Optional[str]) -> int:
+        if scope is GLOBAL_SCOPE:
+            return self._global_generation
+        return self._generations.get(scope, 0)
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        scope: Optional[str],
+        generation: Optional[int] = None,
+    ) -> None:
+        if self.max_entries <= 0:
+            return
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation(scope):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(
+                value, scope, time.monotonic() + self.ttl_seconds, size
+            )
+            self._keys_by_scope.setdefault(scope, set()).add(key)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        keys = self._keys_by_scope.get(entry.scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_scope[entry.scope]
+
+    def invalidate_videos(self, video_ids: Set[Optional[str]]) -> None:
+        with self._lock:
+            self._global_generation += 1
+            scopes = {GLOBAL_SCOPE}
+            for video_id in video_ids:
+                if video_id is not None:
+                    self._generations[video_id] = self._generations.get(video_id, 0) + 1
+                    scopes.add(video_id)
+            for scope in scopes:
+                for key in list(self._keys_by_scope.get(scope, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def on_write(self, collection: str, docs: List[Dict[str, Any]], op: str) -> None:
+        video_ids = {doc.get("video_id") for doc in docs}
+        if video_ids:
+            self.invalidate_videos(video_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
@@ -0,0 +1,111 @@
+import random
+import threading
+import time
+from typing import Any, Dict
+
+
+class _TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class RateLimiter:
+    # Shared by all analysis workers. Requests wait for a concurrency slot and
+    # for both the requests-per-minute and tokens-per-minute buckets. The
+    # concurrency limit follows AIMD: it grows by about one slot per window
+    # of successful calls and halves when the API throttles. A budget of 0
+    # disables that bucket.
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 4,
+        min_concurrency: int = 1,
+        decrease_cooldown_seconds: float = 2.0,
+    ):
+        self._requests = (
+            _TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self._tokens = _TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._decrease_cooldown = decrease_cooldown_seconds
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self.throttled = 0
+
+    def acquire(self, tokens: int = 0) -> None:
+        with self._cond:
+            while True:
+                wait = None
+                if self._in_flight < int(self._limit):
+                    now = time.monotonic()
+                    wait = 0.0
+                    if self._requests is not None:
+                        self._requests.refill(now)
+                        wait = max(wait, self._requests.wait_time(1))
+                    if self._tokens is not None:
+                        # A single oversized request must not wait forever.
+                        tokens = min(tokens, self._tokens.capacity)
+                        self._tokens.refill(now)
+                        wait = max(wait, self._tokens.wait_time(tokens))
+                    if wait <= 0:
+                        if self._requests is not None:
+                            self._requests.tokens -= 1
+                        if self._tokens is not None:
+                            self._tokens.tokens -= tokens
+                        self._in_flight += 1
+                        return
+                self._cond.wait(timeout=wait)
+
+    def release(self, throttled: bool = False) -> None:
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            if throttled:
+                self.throttled += 1
+                now = time.monotonic()
+                # In-flight calls that started before the cut would otherwise
+                # halve the limit again for the same burst.
+                if now - self._last_decrease >= self._decrease_cooldown:
+                    self._limit = max(float(self.min_concurrency), self._limit / 2)
+                    self._last_decrease = now
+            else:
+                self._limit = min(
+                    float(self.max_concurrency), self._limit + 1.0 / self._limit
+                )
+            self._cond.notify_all()
+
+    def record_tokens(self, extra_tokens: int) -> None:
+        # Charge the difference between actual and estimated token usage.
+        if self._tokens is None or not extra_tokens:
+            return
+        with self._cond:
+            self._tokens.tokens -= extra_tokens
+
+    def backoff_delay(
+        self, attempt: int, base: float = 1.0, cap: float = 60.0
+    ) -> float:
+        # Exponential backoff with full jitter.
+        return random.uniform(0, min(cap, base * (2**attempt)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "concurrency_limit": round(self._limit, 2),
+                "in_flight": self._in_flight,
+                "throttled": self.throttled,
+            }
@@ -0,0 +1,173 @@
+import logging
+import os
+import shutil
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HLS_SEGMENT_SECONDS = 4
+
+
+def parse_hls_ladder(spec: str) -> List[Tuple[int, int]]:
+    # "360:800,720:2500" -> [(360, 800), (720, 2500)]: output height and video
+    # bitrate in kbit/s per variant.
+    ladder = []
+    for item in spec.split(","):
+        height, _, kbps = item.strip().partition(":")
+        if height and kbps:
+            ladder.append((int(height), int(kbps)))
+    return sorted(ladder)
+
+
+def _run_ffmpeg(cmd: List[str]) -> None:
+    subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def remux_faststart(source_path: str, output_path: str) -> None:
+    # Puts the moov atom first so a player can seek with range requests
+    # without downloading the rest of the file. Stream copy when the codecs
+    # fit in MP4, re-encode otherwise.
+    tmp_path = f"{output_path}.tmp.mp4"
+    copy_cmd = [
+        "ffmpeg",
+        "-y",
+        "-v",
+        "error",
+        "-i",
+        source_path,
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0?",
+        "-c",
+        "copy",
+        "-movflags",
+        "+faststart",
+        tmp_path,
+    ]
+    try:
+        _run_ffmpeg(copy_cmd)
+    except subprocess.CalledProcessError as exc:
+        logger.info(
+            "Faststart copy failed for %s, re-encoding: %s",
+            source_path,
+            exc.stderr.decode("utf-8", errors="ignore")[:400],
+        )
+        _run_ffmpeg(
+            [
+                "ffmpeg",
+                "-y",
+                "-v",
+                "error",
+                "-i",
+                source_path,
+                "-map",
+                "0:v:0",
+                "-map",
+                "0:a:0?",
+                "-c:v",
+                "libx264",
+                "-preset",
+                "veryfast",
+                "-crf",
+                "23",
+                "-c:a",
+                "aac",
+                "-b:a",
+                "128k",
+                "-movflags",
+                "+faststart",
+                tmp_path,
+            ]
+        )
+    os.replace(tmp_path, output_path)
+
+
+def build_hls_ladder(
+    source_path: str, output_dir: str, ladder: List[Tuple[int, int]]
+) -> str:
+    # Encodes one VOD HLS variant per (height, kbps) with keyframes on segment
+    # boundaries, so a seek only fetches one short segment. Returns the path
+    # of the master playlist.
+    os.makedirs(output_dir, exist_ok=True)
+    master_lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for height, kbps in ladder:
+        variant = f"{height}p"
+        variant_dir = os.path.join(output_dir, variant)
+        shutil.rmtree(variant_dir, ignore_errors=True)
+        os.makedirs(variant_dir)
+        _run_ffmpeg(
+            [
+                "ffmpeg",
+                "-y",
+                "-v",
+                "error",
+                "-i",
+                source_path,
+                "-map",
+                "0:v:0",
+                "-map",
+                "0:a:0?",
+                "-vf",
+                f"scale=-2:{height}",
+                "-c:v",
+                "libx264",
+                "-preset",
+                "veryfast",
+                "-b:v",
+                f"{kbps}k",
+                "-maxrate",
+                f"{kbps}k",
+                "-bufsize",
+                f"{kbps * 2}k",
+                "-force_key_frames",
+                f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+                "-c:a",
+                "aac",
+                "-b:a",
+                "64k",
+                "-f",
+                "hls",
+                "-hls_time",
+                str(HLS_SEGMENT_SECONDS),
+                "-hls_playlist_type",
+                "vod",
+                "-hls_segment_filename",
+                os.path.join(variant_dir, "segment_%05d.ts"),
+                os.path.join(variant_dir, "index.m3u8"),
+            ]
+        )
+        master_lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={(kbps + 64) * 1000}")
+        master_lines.append(f"{variant}/index.m3u8")
+    master_path = os.path.join(output_dir, "master.m3u8")
+    with open(master_path, "w") as f:
+        f.write("\n".join(master_lines) + "\n")
+    return master_path
+
+
+def prepare_renditions(
+    source_path: str,
+    output_dir: str,
+    faststart: bool = True,
+    hls_ladder: Optional[List[Tuple[int, int]]] = None,
+) -> Dict[str, Optional[str]]:
+    # Returns the paths of the renditions that were produced; a failed one is
+    # logged and left out so playback falls back to the original upload.
+    os.makedirs(output_dir, exist_ok=True)
+    result: Dict[str, Optional[str]] = {"faststart_path": None, "hls_master": None}
+    if faststart:
+        output_path = os.path.join(output_dir, "faststart.mp4")
+        try:
+            remux_faststart(source_path, output_path)
+            result["faststart_path"] = output_path
+        except (subprocess.CalledProcessError, OSError):
+            logger.exception("Faststart remux failed for %s", source_path)
+    if hls_ladder:
+        try:
+            result["hls_master"] = build_hls_ladder(
+                source_path, os.path.join(output_dir, "hls"), hls_ladder
+            )
+        except (subprocess.CalledProcessError, OSError):
+            logger.exception("HLS encoding failed for %s", source_path)
+    return result
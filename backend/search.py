@@ -1,7 +1,418 @@
-from typing import Any, Dict, List
+import functools
+import hashlib
+import logging
+import math
+import re
+import threading
+from datetime import datetime, timedelta
+from itertools import zip_longest
+from typing import Any, Dict, List, Optional, Tuple
 
-from backend.db import search_events
+import numpy as np
+from bson import ObjectId
+
+from backend.db import get_documents_by_ids, iter_search_documents, search_events
+
+logger = logging.getLogger(__name__)
+
+# The "embedding" here is not a learned model: it is a hashed bag of words
+# in which the synonyms listed in CONCEPTS collapse to one feature. It knows
+# no paraphrase outside that list and no word order beyond bigrams, so
+# callers merge its hits with the Mongo text index (merge_hits) rather than
+# use it alone. Extending CONCEPTS is the way to teach it new vocabulary.
+
+# Hashed feature space. Large enough that distinct concepts and bigrams
+# practically never share a slot; vectors are sparse, so only the slots a
+# document uses cost memory.
+EMBEDDING_DIM = 2**18
+# Cosine similarity below this is not a match.
+DEFAULT_MIN_SCORE = 0.2
+
+# Words that describe the same thing in footage summaries map to one concept,
+# so "someone fell" and "person collapsed" share their features.
+CONCEPTS: Dict[str, List[str]] = {
+    "person": [
+        "person", "people", "someone", "somebody", "man", "men", "woman", "women",
+        "individual", "pedestrian", "guy", "human", "figure", "child", "kid",
+        "student", "adult", "visitor", "worker",
+    ],
+    "fall": [
+        "fall", "fell", "fallen", "falling", "collapse", "collapsed", "trip",
+        "tripped", "slip", "slipped", "faint", "fainted", "stumble", "stumbled",
+    ],
+    "fight": [
+        "fight", "fought", "brawl", "scuffle", "punch", "punched", "assault",
+        "altercation", "attack", "attacked", "kick", "kicked", "shove", "shoved",
+    ],
+    "run": ["run", "ran", "running", "sprint", "flee", "fled", "chase", "chased"],
+    "vehicle": [
+        "car", "cars", "vehicle", "truck", "van", "bus", "motorcycle", "bike",
+        "bicycle", "scooter", "suv", "taxi",
+    ],
+    "collision": [
+        "crash", "crashed", "collision", "collide", "collided", "accident",
+        "hit", "struck", "rear-ended",
+    ],
+    "weapon": ["weapon", "gun", "pistol", "rifle", "knife", "blade", "firearm"],
+    "fire": ["fire", "flame", "flames", "smoke", "burning", "blaze"],
+    "theft": [
+        "theft", "steal", "stole", "stolen", "stealing", "shoplift", "robbery",
+        "rob", "robbed", "burglary", "snatch", "snatched",
+    ],
+    "intrusion": [
+        "intrusion", "trespass", "trespassing", "intruder", "climb", "climbed",
+        "unauthorized", "break-in", "sneak", "sneaked",
+    ],
+    "crowd": ["crowd", "group", "gathering", "mob", "crowded"],
+    "loiter": ["loiter", "loitering", "linger", "lingering", "idle", "waiting"],
+    "vandalism": ["vandalism", "vandal", "graffiti", "damage", "damaged", "smash"],
+    "medical": [
+        "medical", "injured", "injury", "unconscious", "hurt", "bleeding",
+        "emergency", "lying", "motionless",
+    ],
+    "enter": ["enter", "entered", "entering", "arrive", "arrived", "approach"],
+    "exit": ["exit", "exited", "leave", "leaving", "left", "depart", "departed"],
+    "bag": [
+        "bag", "backpack", "package", "parcel", "luggage", "suitcase", "box",
+        "unattended",
+    ],
+}
+LEXICON = {word: concept for concept, words in CONCEPTS.items() for word in words}
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "in", "on", "at",
+    "of", "to", "and", "or", "with", "any", "there", "did", "does", "do", "what",
+    "when", "where", "who", "happen", "happened", "show", "me", "find", "video",
+    "footage", "clip", "scene", "it", "this", "that", "near", "into", "from",
+}
+# Letters and digits of any script, so non-English summaries index too.
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:-[^\W_]+)?")
+
+
+def _stem(word: str) -> str:
+    for suffix, min_length in (("ing", 6), ("ed", 5), ("es", 5), ("s", 4)):
+        if word.endswith(suffix) and len(word) >= min_length and not word.endswith("ss"):
+            return word[: -len(suffix)]
+    return word
+
+
+def _terms(text: str) -> List[str]:
+    terms = []
+    for word in TOKEN_PATTERN.findall(text.casefold()):
+        if word in STOPWORDS:
+            continue
+        concept = LEXICON.get(word)
+        if concept is None:
+            stem = _stem(word)
+            concept = LEXICON.get(stem, stem)
+        terms.append(concept)
+    return terms
+
+
+@functools.lru_cache(maxsize=200000)
+def _feature_slot(feature: str) -> Tuple[int, float]:
+    value = int.from_bytes(
+        hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+    return value % EMBEDDING_DIM, 1.0 if value >> 63 else -1.0
+
+
+def embed(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    # Signed feature hashing of concepts and concept bigrams, L2-normalized,
+    # so a dot product is the cosine similarity. CPU-only and deterministic.
+    # Returns the sparse vector as (slots, values), slots ascending.
+    terms = _terms(text)
+    weights: Dict[str, float] = {}
+    for term in terms:
+        weights[term] = weights.get(term, 0.0) + 1.0
+    for first, second in zip(terms, terms[1:]):
+        bigram = f"{first} {second}"
+        weights[bigram] = weights.get(bigram, 0.0) + 0.5
+    vector: Dict[int, float] = {}
+    for feature, count in weights.items():
+        slot, sign = _feature_slot(feature)
+        vector[slot] = vector.get(slot, 0.0) + sign * (
+            1.0 + math.log(count) if count >= 1 else count
+        )
+    slots = np.array(
+        sorted(slot for slot, value in vector.items() if value), dtype=np.int64
+    )
+    values = np.array([vector[slot] for slot in slots], dtype=np.float32)
+    norm = float(np.linalg.norm(values))
+    return slots, values / norm if norm else values
+
+
+def _document_text(collection: str, doc: Dict[str, Any]) -> str:
+    if collection == "chunk_summaries":
+        return doc.get("summary") or ""
+    event_type = (doc.get("event_type") or "").replace("_", " ")
+    return " ".join(
+        part
+        for part in (event_type, doc.get("event_description"), doc.get("explanation"))
+        if part
+    )
+
+
+SEARCH_FIELDS = {
+    "chunk_summaries": ["summary", "video_id", "detected_at"],
+    "events": [
+        "event_type",
+        "event_description",
+        "explanation",
+        "video_id",
+        "status",
+        "detected_at",
+    ],
+}
+# Filters run_search passes that the index can evaluate itself.
+FILTER_FIELDS = ("video_id", "status", "event_type")
+
+
+class SemanticIndex:
+    # In-memory vector index over chunk summaries and events. Hashed
+    # embeddings are sparse, so vectors are stored as per-dimension postings
+    # (row, weight), created for a dimension on first use; a query only reads
+    # the postings of the dimensions its own vector uses and sums them with
+    # np.bincount. Filter fields are kept
+    # as integer codes per row so video, status and event type filters are
+    # applied to the hits with array lookups.
+    # Writes of this process arrive through on_write; refresh() picks up the
+    # ones other processes stored, by detected_at. Documents are stamped
+    # before they are buffered and written, so each refresh looks back
+    # refresh_lag_seconds from the newest one seen; rows already indexed are
+    # skipped. Status changes made elsewhere are not seen, so callers check
+    # filters again on the documents they fetch (see matching).
+    def __init__(
+        self,
+        initial_capacity: int = 1024,
+        refresh_interval: float = 5.0,
+        refresh_lag_seconds: float = 120.0,
+    ):
+        self.refresh_interval = refresh_interval
+        self.refresh_lag_seconds = refresh_lag_seconds
+        self._since: Dict[str, datetime] = {}
+        self._stop = threading.Event()
+        self._post_rows: Dict[int, np.ndarray] = {}
+        self._post_weights: Dict[int, np.ndarray] = {}
+        self._post_len: Dict[int, int] = {}
+        self._count = 0
+        self._ids: List[ObjectId] = []
+        self._rows_by_id: Dict[Any, int] = {}
+        self._collections: Dict[str, int] = {"chunk_summaries": 1, "events": 2}
+        self._columns = {
+            name: np.zeros(initial_capacity, dtype=np.int32)
+            for name in ("collection", *FILTER_FIELDS)
+        }
+        # Per field: value -> code; 0 means the field is missing.
+        self._codes: Dict[str, Dict[Any, int]] = {name: {} for name in FILTER_FIELDS}
+        self._lock = threading.RLock()
+        self.ready = False
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _code(self, field: str, value: Any, create: bool = True) -> Optional[int]:
+        if value is None:
+            return 0
+        codes = self._codes[field]
+        code = codes.get(value)
+        if code is None and create:
+            code = len(codes) + 1
+            codes[value] = code
+        return code
+
+    def _append_posting(self, dim: int, row: int, weight: float) -> None:
+        length = self._post_len.get(dim, 0)
+        if not length:
+            self._post_rows[dim] = np.empty(4, dtype=np.int32)
+            self._post_weights[dim] = np.empty(4, dtype=np.float32)
+        elif length == len(self._post_rows[dim]):
+            self._post_rows[dim] = np.resize(self._post_rows[dim], length * 2)
+            self._post_weights[dim] = np.resize(self._post_weights[dim], length * 2)
+        self._post_rows[dim][length] = row
+        self._post_weights[dim][length] = weight
+        self._post_len[dim] = length + 1
+
+    def add(self, collection: str, doc: Dict[str, Any]) -> None:
+        if collection not in self._collections or "_id" not in doc:
+            return
+        text = _document_text(collection, doc)
+        if not text:
+            return
+        dims, values = embed(text)
+        with self._lock:
+            if doc["_id"] in self._rows_by_id:
+                return
+            row = self._count
+            if row == len(self._columns["collection"]):
+                for name, column in self._columns.items():
+                    self._columns[name] = np.resize(column, row * 2)
+            for dim, value in zip(dims, values):
+                self._append_posting(int(dim), row, float(value))
+            self._columns["collection"][row] = self._collections[collection]
+            for field in FILTER_FIELDS:
+                self._columns[field][row] = self._code(field, doc.get(field))
+            self._ids.append(doc["_id"])
+            self._rows_by_id[doc["_id"]] = row
+            self._count += 1
+
+    def update(self, doc: Dict[str, Any]) -> None:
+        with self._lock:
+            row = self._rows_by_id.get(doc.get("_id"))
+            if row is None:
+                return
+            for field in FILTER_FIELDS:
+                if field in doc and field != "video_id":
+                    self._columns[field][row] = self._code(field, doc[field])
+
+    def on_write(self, collection: str, docs: List[Dict[str, Any]], op: str) -> None:
+        for doc in docs:
+            if op == "update":
+                self.update(doc)
+            else:
+                self.add(collection, doc)
+
+    def supports(self, filters: Dict[str, Any]) -> bool:
+        return self.ready and all(
+            field in FILTER_FIELDS and isinstance(value, str)
+            for field, value in filters.items()
+        )
+
+    def query(
+        self,
+        text: str,
+        collection: str,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: int = 10,
+        min_score: float = DEFAULT_MIN_SCORE,
+    ) -> List[Tuple[ObjectId, float]]:
+        # Top-k documents of collection by cosine similarity to text, best
+        # first, restricted to rows matching filters (field -> value).
+        dims, values = embed(text)
+        if not dims.size or collection not in self._collections:
+            return []
+        with self._lock:
+            required = {"collection": self._collections[collection]}
+            for field, value in (filters or {}).items():
+                code = self._code(field, value, create=False)
+                if code is None:
+                    return []
+                required[field] = code
+            used = [
+                (int(dim), value)
+                for dim, value in zip(dims, values)
+                if self._post_len.get(int(dim))
+            ]
+            rows = [self._post_rows[dim][: self._post_len[dim]] for dim, _ in used]
+            weights = [
+                self._post_weights[dim][: self._post_len[dim]] * value
+                for dim, value in used
+            ]
+            if not sum(len(part) for part in rows):
+                return []
+            scores = np.bincount(
+                np.concatenate(rows),
+                weights=np.concatenate(weights),
+                minlength=self._count,
+            )
+            hits = np.flatnonzero(scores >= min_score)
+            for field, code in required.items():
+                hits = hits[self._columns[field][hits] == code]
+            if hits.size > limit:
+                hits = hits[np.argpartition(-scores[hits], limit)[:limit]]
+            hits = hits[np.argsort(-scores[hits], kind="stable")]
+            return [(self._ids[row], float(scores[row])) for row in hits]
+
+    def _scan(self, collection: str, since: Optional[datetime]) -> None:
+        newest = self._since.get(collection)
+        fields = SEARCH_FIELDS[collection]
+        for doc in iter_search_documents(collection, fields, since):
+            self.add(collection, doc)
+            detected_at = doc.get("detected_at")
+            if detected_at is not None and (newest is None or detected_at > newest):
+                newest = detected_at
+        if newest is not None:
+            self._since[collection] = newest
+
+    def load(self) -> None:
+        # Indexes everything already in Mongo; writes that land meanwhile are
+        # added through on_write and skipped here as duplicates.
+        for collection in SEARCH_FIELDS:
+            self._scan(collection, None)
+        self.ready = True
+        logger.info("Semantic index ready with %d documents", self._count)
+
+    def refresh(self) -> None:
+        lag = timedelta(seconds=self.refresh_lag_seconds)
+        for collection in SEARCH_FIELDS:
+            since = self._since.get(collection)
+            self._scan(collection, since - lag if since is not None else None)
+
+    def start_loading(self) -> threading.Thread:
+        def run():
+            try:
+                self.load()
+            except Exception:
+                logger.exception("Building the semantic index failed")
+                return
+            while not self._stop.wait(self.refresh_interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception("Refreshing the semantic index failed")
+
+        self._stop.clear()
+        t = threading.Thread(target=run, name="semantic-index-load", daemon=True)
+        t.start()
+        return t
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "documents": self._count,
+                "postings": int(sum(self._post_len.values())),
+                "dimensions_used": len(self._post_len),
+            }
+
+
+semantic_index = SemanticIndex()
+
+
+def matching(docs: List[Dict[str, Any]], filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Drops documents whose filter fields changed in another process since
+    # the index saw them.
+    return [
+        doc
+        for doc in docs
+        if all(doc.get(field) == value for field, value in filters.items())
+    ]
+
+
+def merge_hits(*ranked: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    # Interleaves ranked result lists, best of each first, skipping documents
+    # already taken, so text matches the embedding misses still make the cut.
+    merged: List[Dict[str, Any]] = []
+    seen = set()
+    for row in zip_longest(*ranked):
+        for doc in row:
+            if doc is None or doc.get("_id") in seen:
+                continue
+            seen.add(doc.get("_id"))
+            merged.append(doc)
+    return merged[:limit]
 
 
 def run_search(query: str, filters: Dict[str, Any], limit: int = 10) -> List[Dict[str, Any]]:
-    return search_events(query, filters, limit)
+    semantic_hits: List[Dict[str, Any]] = []
+    if semantic_index.supports(filters):
+        hits = semantic_index.query(query, "events", filters, limit=limit)
+        if hits:
+            semantic_hits = matching(
+                get_documents_by_ids("events", [doc_id for doc_id, _ in hits]), filters
+            )
+    # The text index finds the exact words the embedding has no concept for
+    # (a name, an id, a number, an unlisted synonym).
+    return merge_hits(semantic_hits, search_events(query, filters, limit), limit=limit)
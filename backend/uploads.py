@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Request bodies arrive in small pieces; they are buffered to this size before
+# each write so a multi-GB upload does not cost one thread hop per piece.
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+# sha256 state of uploads in progress, with the number of bytes it covers.
+# It only lives in this process; after a restart it is rebuilt from the
+# partial file.
+_hashers: Dict[str, Tuple[Any, int]] = {}
+
+
+def _hash_prefix(path: str, length: int):
+    hasher = hashlib.sha256()
+    remaining = length
+    with open(path, "rb") as f:
+        while remaining > 0:
+            block = f.read(min(WRITE_BUFFER_BYTES, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+async def get_hasher(upload_id: str, path: str, offset: int):
+    cached = _hashers.get(upload_id)
+    if cached is not None and cached[1] == offset:
+        return cached[0]
+    if offset == 0 or not os.path.exists(path):
+        return hashlib.sha256()
+    return await asyncio.to_thread(_hash_prefix, path, offset)
+
+
+def forget_hasher(upload_id: str) -> None:
+    _hashers.pop(upload_id, None)
+
+
+def hasher_ids() -> List[str]:
+    return list(_hashers)
+
+
+def _open_at(path: str, offset: int):
+    f = open(path, "r+b" if os.path.exists(path) else "wb")
+    # Drop anything past the offset left by an interrupted part.
+    f.truncate(offset)
+    f.seek(offset)
+    return f
+
+
+def _write_block(f, hasher, data: bytes) -> None:
+    f.write(data)
+    hasher.update(data)
+
+
+async def write_stream(
+    path: str,
+    offset: int,
+    stream: AsyncIterator[bytes],
+    hasher,
+    upload_id: str | None = None,
+) -> Tuple[int, bool]:
+    # Writes stream to path starting at offset, hashing as it goes. Disk I/O
+    # runs on worker threads. Returns (bytes written, interrupted); bytes
+    # received before a dropped connection are kept so the client can resume
+    # from offset + written.
+    f = await asyncio.to_thread(_open_at, path, offset)
+    written = 0
+    interrupted = False
+    buffer = bytearray()
+    try:
+        try:
+            async for piece in stream:
+                buffer += piece
+                if len(buffer) >= WRITE_BUFFER_BYTES:
+                    data = bytes(buffer)
+                    buffer.clear()
+                    await asyncio.to_thread(_write_block, f, hasher, data)
+                    written += len(data)
+        except Exception:
+            logger.info("Upload stream for %s ended early", path)
+            interrupted = True
+        if buffer:
+            data = bytes(buffer)
+            await asyncio.to_thread(_write_block, f, hasher, data)
+            written += len(data)
+    finally:
+        await asyncio.to_thread(f.close)
+    if upload_id is not None:
+        _hashers[upload_id] = (hasher, offset + written)
+    return written, interrupted
@@ -1,26 +1,65 @@
 import io
 import json
 import logging
+import math
 import os
 import subprocess
 import tempfile
-from typing import Any, Dict, List
+import threading
+import time
+from typing import Any, Dict, Iterator, List
 
 import google.generativeai as genai
 from google.api_core import exceptions as gexc
 from PIL import Image
 
+from backend.config import (
+    DEFAULT_CANDIDATE_INTERVAL_SECONDS,
+    DEFAULT_FRAME_INTERVAL_SECONDS,
+    DEFAULT_FRAME_PACKING,
+    DEFAULT_FRAME_SAMPLING,
+    DEFAULT_MAX_FRAMES,
+    DEFAULT_MIN_FRAME_CHANGE,
+    DEFAULT_MOSAIC_JPEG_QUALITY,
+    DEFAULT_MOSAIC_TILE_WIDTH,
+)
+from backend.frame_analysis import (
+    activity_score,
+    build_mosaic,
+    select_informative_frames,
+)
+from backend.rate_limiter import RateLimiter
+
 logger = logging.getLogger(__name__)
 
+NO_ACTIVITY_SUMMARY = "No activity detected."
+MAX_CANDIDATE_FRAMES = 240
+# Rough Gemini input cost used to reserve tokens before a call: small images
+# cost one tile, larger ones one tile per 768x768 crop.
+TOKENS_PER_IMAGE_TILE = 258
+IMAGE_TILE_SIZE = 768
+SMALL_IMAGE_SIZE = 384
+CHARS_PER_TOKEN = 4
+THROTTLE_ERRORS = (gexc.ResourceExhausted, gexc.TooManyRequests)
+
 
 def extract_frames(
-    video_path: str, frame_interval_seconds: int = 1, max_frames: int = 6
+    video_path: str,
+    frame_interval_seconds: float = 1,
+    max_frames: int = 6,
+    clip: tuple[float, float] | None = None,
 ) -> tuple[List[bytes], str | None]:
+    # clip limits extraction to a (start, end) range of video_path, for
+    # virtual chunks that point into the original upload.
+    seek_args: List[str] = []
+    if clip is not None:
+        seek_args = ["-ss", f"{clip[0]:.3f}", "-t", f"{clip[1] - clip[0]:.3f}"]
     with tempfile.TemporaryDirectory() as tmpdir:
-        output_pattern = os.path.join(tmpdir, "frame_%02d.jpg")
+        output_pattern = os.path.join(tmpdir, "frame_%04d.jpg")
         cmd = [
             "ffmpeg",
             "-y",
+            *seek_args,
             "-i",
             video_path,
             "-vf",
@@ -41,9 +80,15 @@ def extract_frames(
             )
             return [], "ffmpeg_error"
 
-        frames = sorted(
-            [os.path.join(tmpdir, f) for f in os.listdir(tmpdir) if f.endswith(".jpg")]
-        )
+        # Ordered by frame number: MAX_CANDIDATE_FRAMES can exceed what the
+        # zero padding covers, and "frame_100" sorts before "frame_99".
+        frames = [
+            os.path.join(tmpdir, f)
+            for f in sorted(
+                (f for f in os.listdir(tmpdir) if f.endswith(".jpg")),
+                key=lambda name: int(name[len("frame_") : -len(".jpg")]),
+            )
+        ]
         # copy frame paths before temp dir cleanup
         frame_bytes = []
         for frame_path in frames:
@@ -55,6 +100,140 @@ def extract_frames(
     return frame_bytes, None
 
 
+def _split_jpegs(buffer: bytearray) -> List[bytes]:
+    # mjpeg output is a plain concatenation of JPEG images. 0xFF bytes inside
+    # the entropy-coded data are stuffed, so EOI markers are unambiguous.
+    images = []
+    while True:
+        start = buffer.find(b"\xff\xd8")
+        if start == -1:
+            buffer.clear()
+            return images
+        end = buffer.find(b"\xff\xd9", start + 2)
+        if end == -1:
+            del buffer[:start]
+            return images
+        images.append(bytes(buffer[start : end + 2]))
+        del buffer[: end + 2]
+
+
+def iter_sampled_frames(
+    video_path: str, frame_interval_seconds: float = 1
+) -> Iterator[tuple[float, bytes]]:
+    # One ffmpeg decode for the whole video; sampled frames are streamed over
+    # a pipe and yielded as (timestamp, jpeg) in order.
+    cmd = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-i",
+        video_path,
+        "-vf",
+        f"fps=1/{frame_interval_seconds}",
+        "-f",
+        "image2pipe",
+        "-vcodec",
+        "mjpeg",
+        "pipe:1",
+    ]
+    with tempfile.TemporaryFile() as stderr_file:
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        except OSError as exc:
+            logger.warning("Frame extraction failed for %s: %s", video_path, exc)
+            return
+
+        buffer = bytearray()
+        frame_number = 0
+        try:
+            while True:
+                data = proc.stdout.read(1024 * 1024)
+                if not data:
+                    break
+                buffer.extend(data)
+                for image in _split_jpegs(buffer):
+                    yield frame_number * frame_interval_seconds, image
+                    frame_number += 1
+            returncode = proc.wait()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+
+        if returncode != 0:
+            stderr_file.seek(0)
+            logger.warning(
+                "Frame extraction failed for %s: %s",
+                video_path,
+                stderr_file.read().decode("utf-8", errors="ignore")[:400],
+            )
+
+
+class VideoFrameSampler:
+    # Hands out the frames of a single decode by time range. Ranges must be
+    # asked for in ascending order; frames before a range are dropped.
+    def __init__(self, video_path: str, frame_interval_seconds: float = 1):
+        self._frames = iter_sampled_frames(video_path, frame_interval_seconds)
+        self._pending: tuple[float, bytes] | None = None
+
+    def take(
+        self, start: float, end: float, max_frames: int
+    ) -> tuple[List[bytes], List[float]]:
+        # Returns up to max_frames frames in [start, end) and their offsets
+        # from start, in seconds.
+        frames: List[bytes] = []
+        offsets: List[float] = []
+        while True:
+            if self._pending is None:
+                self._pending = next(self._frames, None)
+                if self._pending is None:
+                    break
+            timestamp, image = self._pending
+            if timestamp >= end:
+                break
+            self._pending = None
+            if timestamp >= start and len(frames) < max_frames:
+                frames.append(image)
+                offsets.append(round(timestamp - start, 3))
+        return frames, offsets
+
+    def close(self) -> None:
+        self._frames.close()
+
+
+def frame_sampling_params(
+    use_case: Dict[str, Any], chunk_duration_seconds: float | None = None
+) -> tuple[float, int]:
+    # Returns (sampling interval, frames to decode per chunk). Without a chunk
+    # duration the candidate count is left to the length of the chunk file.
+    max_frames = int(use_case.get("max_frames") or DEFAULT_MAX_FRAMES)
+    if use_case.get("frame_sampling", DEFAULT_FRAME_SAMPLING) == "adaptive":
+        interval = float(
+            use_case.get("candidate_interval_seconds")
+            or DEFAULT_CANDIDATE_INTERVAL_SECONDS
+        )
+        if chunk_duration_seconds is None:
+            return interval, MAX_CANDIDATE_FRAMES
+        candidates = max(max_frames, int(chunk_duration_seconds / interval) + 1)
+        return interval, candidates
+    interval = float(
+        use_case.get("frame_interval_seconds") or DEFAULT_FRAME_INTERVAL_SECONDS
+    )
+    return interval, max_frames
+
+
+def select_frames(
+    frames: List[bytes], offsets: List[float], use_case: Dict[str, Any]
+) -> tuple[List[bytes], List[float]]:
+    max_frames = int(use_case.get("max_frames") or DEFAULT_MAX_FRAMES)
+    if use_case.get("frame_sampling", DEFAULT_FRAME_SAMPLING) != "adaptive":
+        return frames[:max_frames], offsets[:max_frames]
+    min_change = float(use_case.get("min_frame_change") or DEFAULT_MIN_FRAME_CHANGE)
+    keep = select_informative_frames(frames, max_frames, min_change)
+    return [frames[i] for i in keep], [offsets[i] for i in keep]
+
+
 def _extract_json(text: str) -> Dict[str, Any]:
     start = text.find("{")
     end = text.rfind("}")
@@ -63,10 +242,43 @@ def _extract_json(text: str) -> Dict[str, Any]:
     return json.loads(text[start : end + 1])
 
 
+def _estimate_tokens(content: List[Any]) -> int:
+    tokens = 0
+    for part in content:
+        if isinstance(part, str):
+            tokens += len(part) // CHARS_PER_TOKEN
+            continue
+        width, height = getattr(part, "size", (0, 0))
+        if max(width, height) <= SMALL_IMAGE_SIZE:
+            tokens += TOKENS_PER_IMAGE_TILE
+        else:
+            tiles = math.ceil(width / IMAGE_TILE_SIZE) * math.ceil(
+                height / IMAGE_TILE_SIZE
+            )
+            tokens += tiles * TOKENS_PER_IMAGE_TILE
+    return tokens
+
+
 class GeminiVisionAnalyzer:
-    def __init__(self, api_key: str, model_name: str):
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str,
+        rate_limiter: RateLimiter | None = None,
+        max_throttle_retries: int = 5,
+    ):
         self.api_key = api_key
         self.model_name = model_name
+        self.rate_limiter = rate_limiter
+        self.max_throttle_retries = max_throttle_retries
+        self.throttle_retries = 0
+        self.throttle_failures = 0
+        self.frame_bytes_extracted = 0
+        self.image_bytes_sent = 0
+        self._stats_lock = threading.Lock()
+        # analyze_chunk is called from several worker threads; model switching
+        # must not interleave.
+        self._model_lock = threading.Lock()
         if not api_key or api_key.startswith("YOUR_"):
             self.enabled = False
             logger.warning("Gemini API key missing; analyzer disabled.")
@@ -112,17 +324,75 @@ class GeminiVisionAnalyzer:
         self.model = genai.GenerativeModel(self.model_candidates[self.model_index])
         self.model_name = self.model_candidates[self.model_index]
 
-    def _generate_with_fallback(self, content):
+    def _generate(self, model, content) -> tuple[Any, int]:
+        # Returns (response, retries spent on throttling). Raises the last
+        # throttling error once max_throttle_retries is exhausted.
+        estimate = _estimate_tokens(content)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(estimate)
+            try:
+                response = model.generate_content(content)
+            except THROTTLE_ERRORS:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.release(throttled=True)
+                if attempt >= self.max_throttle_retries:
+                    with self._stats_lock:
+                        self.throttle_failures += 1
+                    raise
+                delay = (
+                    self.rate_limiter.backoff_delay(attempt)
+                    if self.rate_limiter is not None
+                    else 2**attempt
+                )
+                attempt += 1
+                with self._stats_lock:
+                    self.throttle_retries += 1
+                logger.info("Gemini throttled; retry %d in %.1fs", attempt, delay)
+                time.sleep(delay)
+                continue
+            except Exception:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.release()
+                raise
+            if self.rate_limiter is not None:
+                self.rate_limiter.release()
+                usage = getattr(response, "usage_metadata", None)
+                actual = getattr(usage, "total_token_count", 0) or 0
+                if actual > estimate:
+                    self.rate_limiter.record_tokens(actual - estimate)
+            return response, attempt
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats: Dict[str, Any] = {
+                "throttle_retries": self.throttle_retries,
+                "throttle_failures": self.throttle_failures,
+                "frame_bytes_extracted": self.frame_bytes_extracted,
+                "image_bytes_sent": self.image_bytes_sent,
+            }
+        if self.rate_limiter is not None:
+            stats["rate_limiter"] = self.rate_limiter.stats()
+        return stats
+
+    def _generate_with_fallback(self, content) -> tuple[Any, int, str]:
+        # Returns (response, throttle retries, name of the model that answered).
         last_error: Exception | None = None
+        start_index = self.model_index
         for offset in range(len(self.model_candidates)):
-            idx = (self.model_index + offset) % len(self.model_candidates)
-            if idx != self.model_index:
-                self._set_model(idx)
+            idx = (start_index + offset) % len(self.model_candidates)
+            with self._model_lock:
+                if idx != self.model_index:
+                    self._set_model(idx)
+                model = self.model
+                model_name = self.model_name
             try:
-                return self.model.generate_content(content)
+                response, throttle_retries = self._generate(model, content)
+                return response, throttle_retries, model_name
             except gexc.NotFound as exc:
                 last_error = exc
-                logger.warning("Gemini model not found: %s", self.model_name)
+                logger.warning("Gemini model not found: %s", model_name)
                 continue
             except Exception as exc:
                 last_error = exc
@@ -131,26 +401,154 @@ class GeminiVisionAnalyzer:
             raise last_error
         raise RuntimeError("No Gemini model available")
 
-    def analyze_chunk(self, video_path: str, use_case: Dict[str, Any]) -> Dict[str, Any]:
-        if not self.enabled:
-            return {"events": [], "summary": "", "analysis_failed": "disabled"}
-
-        frames, extraction_error = extract_frames(video_path)
+    def _prepare_frames(
+        self,
+        video_path: str,
+        use_case: Dict[str, Any],
+        frames: List[bytes] | None,
+        frame_times: List[float] | None,
+        clip: tuple[float, float] | None = None,
+    ) -> tuple[List[bytes], List[float] | None, Dict[str, Any] | None]:
+        # Returns (frames, frame_times, result). result is set when the chunk
+        # is settled without an API call (no frames, or no activity).
+        extraction_error = None
+        if not frames:
+            # Frames were not pre-extracted by the single-pass decoder.
+            interval, max_frames = frame_sampling_params(use_case)
+            frames, extraction_error = extract_frames(
+                video_path,
+                frame_interval_seconds=interval,
+                max_frames=max_frames,
+                clip=clip,
+            )
+            frames, frame_times = select_frames(
+                frames, [round(i * interval, 3) for i in range(len(frames))], use_case
+            )
         if not frames:
             logger.info("No frames extracted for %s", video_path)
-            return {
+            return [], None, {
                 "events": [],
                 "summary": "",
                 "analysis_failed": extraction_error or "frame_extraction",
             }
 
-        prompt = (
+        activity_threshold = float(use_case.get("activity_threshold") or 0.0)
+        if activity_threshold > 0:
+            score = activity_score(frames)
+            if score is not None and score < activity_threshold:
+                return frames, frame_times, {
+                    "events": [],
+                    "summary": NO_ACTIVITY_SUMMARY,
+                    "analysis_failed": None,
+                    "skipped": "no_activity",
+                    "activity_score": score,
+                }
+        return frames, frame_times, None
+
+    def _image_parts(
+        self,
+        video_path: str,
+        frames: List[bytes],
+        frame_times: List[float] | None,
+        use_case: Dict[str, Any],
+    ) -> tuple[List[Any], str]:
+        # Returns the PIL images to send for one chunk and a note describing
+        # how to read them.
+        note = ""
+        if frame_times and len(frame_times) == len(frames):
+            # Adaptive sampling spaces frames unevenly; tell the model when each
+            # one was taken.
+            note = "Frame timestamps (seconds from clip start): " + ", ".join(
+                f"{t:g}" for t in frame_times
+            )
+        images = frames
+        if use_case.get("frame_packing", DEFAULT_FRAME_PACKING) == "mosaic":
+            if not frame_times or len(frame_times) != len(frames):
+                frame_times = [float(i) for i in range(len(frames))]
+            images = [
+                build_mosaic(
+                    frames,
+                    [f"t={t:g}s" for t in frame_times],
+                    tile_width=int(
+                        use_case.get("mosaic_tile_width") or DEFAULT_MOSAIC_TILE_WIDTH
+                    ),
+                    jpeg_quality=int(
+                        use_case.get("mosaic_jpeg_quality")
+                        or DEFAULT_MOSAIC_JPEG_QUALITY
+                    ),
+                )
+            ]
+            note = (
+                f"The image is a grid of {len(frames)} frames in chronological "
+                "order (left to right, top to bottom), each labeled with its "
+                "timestamp."
+            )
+        extracted_bytes = sum(len(frame) for frame in frames)
+        sent_bytes = sum(len(image) for image in images)
+        with self._stats_lock:
+            self.frame_bytes_extracted += extracted_bytes
+            self.image_bytes_sent += sent_bytes
+        logger.debug(
+            "Chunk %s payload: %d frame bytes -> %d image bytes in %d parts",
+            video_path,
+            extracted_bytes,
+            sent_bytes,
+            len(images),
+        )
+        return [Image.open(io.BytesIO(image)) for image in images], note
+
+    def _base_prompt(self, use_case: Dict[str, Any]) -> str:
+        return (
             f"{use_case['system_prompt']}\n\n"
             f"Context: {use_case['context']}\n\n"
             "Events to detect:\n"
             + "\n".join([f"- {event}" for event in use_case["events"]])
             + "\n\n"
-            "Return JSON only in this format:\n"
+        )
+
+    def _normalize_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        normalized = []
+        for event in events:
+            if not event.get("detected", False):
+                continue
+            normalized.append(
+                {
+                    "event_type": event.get("event_type", "unknown"),
+                    "confidence": float(event.get("confidence", 0.0)),
+                    "description": event.get("description", ""),
+                    "explanation": event.get("explanation", ""),
+                }
+            )
+        return normalized
+
+    def analyze_chunk(
+        self,
+        video_path: str,
+        use_case: Dict[str, Any],
+        frames: List[bytes] | None = None,
+        frame_times: List[float] | None = None,
+        clip: tuple[float, float] | None = None,
+    ) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"events": [], "summary": "", "analysis_failed": "disabled"}
+
+        frames, frame_times, result = self._prepare_frames(
+            video_path, use_case, frames, frame_times, clip
+        )
+        if result is not None:
+            return result
+        return self._analyze_single(video_path, use_case, frames, frame_times)
+
+    def _analyze_single(
+        self,
+        video_path: str,
+        use_case: Dict[str, Any],
+        frames: List[bytes],
+        frame_times: List[float] | None,
+    ) -> Dict[str, Any]:
+        prompt = (
+            self._base_prompt(use_case)
+            + "Return JSON only in this format:\n"
             "{\n"
             "  \"summary\": \"1-2 sentence general description of what is happening in the clip (not limited to the event list).\",\n"
             "  \"events\": [\n"
@@ -160,12 +558,19 @@ class GeminiVisionAnalyzer:
             "}\n"
             "If nothing is detected, return {\"summary\": \"\", \"events\": []}."
         )
+        images, note = self._image_parts(video_path, frames, frame_times, use_case)
+        if note:
+            prompt += f"\n\n{note}"
 
-        content = [prompt]
-        for frame in frames:
-            content.append(Image.open(io.BytesIO(frame)))
+        content = [prompt, *images]
 
-        response = self._generate_with_fallback(content)
+        try:
+            response, throttle_retries, model_name = self._generate_with_fallback(
+                content
+            )
+        except THROTTLE_ERRORS:
+            logger.warning("Gemini still throttled after retries for %s", video_path)
+            return {"events": [], "summary": "", "analysis_failed": "rate_limited"}
         try:
             data = _extract_json(response.text)
         except Exception:
@@ -173,21 +578,134 @@ class GeminiVisionAnalyzer:
                 "Gemini response not valid JSON; ignoring. Response: %s",
                 (response.text or "")[:400],
             )
-            return {"events": [], "summary": "", "analysis_failed": "invalid_json"}
-        events = data.get("events", [])
-        summary = data.get("summary", "") or ""
+            return {
+                "events": [],
+                "summary": "",
+                "analysis_failed": "invalid_json",
+                "throttle_retries": throttle_retries,
+                "model": model_name,
+            }
 
-        normalized = []
-        for event in events:
-            if not event.get("detected", False):
-                continue
-            normalized.append(
-                {
-                    "event_type": event.get("event_type", "unknown"),
-                    "confidence": float(event.get("confidence", 0.0)),
-                    "description": event.get("description", ""),
-                    "explanation": event.get("explanation", ""),
-                }
+        return {
+            "events": self._normalize_events(data.get("events", [])),
+            "summary": data.get("summary", "") or "",
+            "analysis_failed": None,
+            "throttle_retries": throttle_retries,
+            "model": model_name,
+        }
+
+    def analyze_chunks(
+        self,
+        chunks: List[
+            tuple[
+                str,
+                List[bytes] | None,
+                List[float] | None,
+                tuple[float, float] | None,
+            ]
+        ],
+        use_case: Dict[str, Any],
+    ) -> List[Dict[str, Any]]:
+        # Analyzes consecutive chunks of one video in a single request so the
+        # prompt and event list are paid once. chunks holds (video_path,
+        # frames, frame_times, clip) per chunk; one result is returned per
+        # chunk, in order.
+        if not self.enabled:
+            return [
+                {"events": [], "summary": "", "analysis_failed": "disabled"}
+                for _ in chunks
+            ]
+
+        results: List[Dict[str, Any] | None] = []
+        batch: List[tuple[int, str, List[bytes], List[float] | None]] = []
+        for video_path, frames, frame_times, clip in chunks:
+            frames, frame_times, result = self._prepare_frames(
+                video_path, use_case, frames, frame_times, clip
+            )
+            if result is None:
+                batch.append((len(results), video_path, frames, frame_times))
+            results.append(result)
+
+        if len(batch) == 1:
+            idx, video_path, frames, frame_times = batch[0]
+            # Frames are already prepared; analyze_chunk would do it again.
+            results[idx] = self._analyze_single(
+                video_path, use_case, frames, frame_times
+            )
+        elif batch:
+            for idx, result in self._analyze_batch(batch, use_case).items():
+                results[idx] = result
+        return [
+            result
+            if result is not None
+            else {"events": [], "summary": "", "analysis_failed": "missing_in_batch"}
+            for result in results
+        ]
+
+    def _analyze_batch(
+        self,
+        batch: List[tuple[int, str, List[bytes], List[float] | None]],
+        use_case: Dict[str, Any],
+    ) -> Dict[int, Dict[str, Any]]:
+        prompt = (
+            self._base_prompt(use_case)
+            + f"You are given {len(batch)} consecutive clips from the same camera, "
+            "in order. The images for clip N follow the line \"Clip N\".\n\n"
+            "Return JSON only in this format, with one entry per clip:\n"
+            "{\n"
+            "  \"clips\": [\n"
+            "    {\"clip\": 1, \"summary\": \"1-2 sentence general description of what is happening in the clip (not limited to the event list).\", "
+            "\"events\": [{\"event_type\": \"fight\", \"detected\": true, \"confidence\": 0.82, "
+            "\"description\": \"Brief description\", \"explanation\": \"Why you flagged it\"}]}\n"
+            "  ]\n"
+            "}\n"
+            "If nothing is detected in a clip, give it \"summary\": \"\" and \"events\": []."
+        )
+        content: List[Any] = [prompt]
+        for clip_number, (_, video_path, frames, frame_times) in enumerate(batch, 1):
+            images, note = self._image_parts(video_path, frames, frame_times, use_case)
+            content.append(f"Clip {clip_number}" + (f" ({note})" if note else ""))
+            content.extend(images)
+
+        def failed(reason: str, **extra: Any) -> Dict[int, Dict[str, Any]]:
+            return {
+                idx: {"events": [], "summary": "", "analysis_failed": reason, **extra}
+                for idx, *_ in batch
+            }
+
+        try:
+            response, throttle_retries, model_name = self._generate_with_fallback(
+                content
+            )
+        except THROTTLE_ERRORS:
+            logger.warning(
+                "Gemini still throttled after retries for a %d-clip batch", len(batch)
+            )
+            return failed("rate_limited")
+        try:
+            data = _extract_json(response.text)
+        except Exception:
+            logger.warning(
+                "Gemini batch response not valid JSON; ignoring. Response: %s",
+                (response.text or "")[:400],
+            )
+            return failed(
+                "invalid_json", throttle_retries=throttle_retries, model=model_name
             )
 
-        return {"events": normalized, "summary": summary, "analysis_failed": None}
+        results: Dict[int, Dict[str, Any]] = {}
+        for clip in data.get("clips", []) or []:
+            try:
+                position = int(clip.get("clip")) - 1
+            except (TypeError, ValueError):
+                continue
+            if not 0 <= position < len(batch):
+                continue
+            results[batch[position][0]] = {
+                "events": self._normalize_events(clip.get("events", []) or []),
+                "summary": clip.get("summary", "") or "",
+                "analysis_failed": None,
+                "throttle_retries": throttle_retries,
+                "model": model_name,
+            }
+        return results
@@ -1,74 +1,271 @@
-import glob
+import bisect
+import csv
 import logging
 import os
 import subprocess
-from typing import List
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 
-def split_video_to_chunks(
-    video_path: str, output_dir: str, chunk_duration_seconds: int
+def _segment_command(
+    video_path: str,
+    output_pattern: str,
+    chunk_duration_seconds: int,
+    reencode: bool,
 ) -> List[str]:
-    os.makedirs(output_dir, exist_ok=True)
-    output_pattern = os.path.join(output_dir, "chunk_%04d.mp4")
-
-    cmd_copy = [
+    if reencode:
+        codec_args = [
+            "-c:v",
+            "libx264",
+            "-preset",
+            "veryfast",
+            "-crf",
+            "23",
+            "-c:a",
+            "aac",
+            "-b:a",
+            "128k",
+        ]
+    else:
+        codec_args = ["-c", "copy", "-map", "0"]
+    return [
         "ffmpeg",
         "-y",
+        "-v",
+        "error",
         "-i",
         video_path,
-        "-c",
-        "copy",
+        *codec_args,
+        "-f",
+        "segment",
+        "-segment_time",
+        str(chunk_duration_seconds),
+        "-reset_timestamps",
+        "1",
+        # ffmpeg appends each segment to the list as soon as it is closed,
+        # with the times it really starts and ends: stream copy can only cut
+        # on keyframes, so they drift from multiples of segment_time.
+        "-segment_list",
+        "pipe:1",
+        "-segment_list_type",
+        "csv",
+        output_pattern,
+    ]
+
+
+def _stream_segment_command(
+    url: str,
+    output_pattern: str,
+    chunk_duration_seconds: int,
+    start_number: int,
+) -> List[str]:
+    input_args = ["-fflags", "nobuffer", "-flags", "low_delay"]
+    if url.startswith("rtsp://"):
+        input_args += ["-rtsp_transport", "tcp"]
+    return [
+        "ffmpeg",
+        "-y",
+        "-v",
+        "error",
+        *input_args,
+        "-i",
+        url,
         "-map",
-        "0",
+        "0:v:0",
+        "-an",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-tune",
+        "zerolatency",
+        # Live sources rarely send keyframes on our boundaries; force one at
+        # every chunk start so segments close on time.
+        "-force_key_frames",
+        f"expr:gte(t,n_forced*{chunk_duration_seconds})",
         "-f",
         "segment",
         "-segment_time",
         str(chunk_duration_seconds),
+        "-segment_start_number",
+        str(start_number),
         "-reset_timestamps",
         "1",
+        "-segment_list",
+        "pipe:1",
+        "-segment_list_type",
+        "flat",
         output_pattern,
     ]
 
+
+def _iter_segments(
+    cmd: List[str], output_dir: str, stop_event: Optional[threading.Event] = None
+) -> Iterator[Tuple[str, Optional[float], Optional[float]]]:
+    # Yields (path, start, end) per closed segment; start and end are None
+    # for a flat segment list.
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        if stop_event is not None:
+            # Reading the segment list blocks until ffmpeg closes a segment;
+            # stop ffmpeg directly so a stalled source cannot hold us up.
+            def terminate_on_stop():
+                while proc.poll() is None:
+                    if stop_event.wait(0.5):
+                        proc.terminate()
+                        try:
+                            proc.wait(timeout=5)
+                        except subprocess.TimeoutExpired:
+                            # Blocked opening a pipe or socket; SIGTERM is not
+                            # handled until it returns.
+                            proc.kill()
+                        return
+
+            threading.Thread(target=terminate_on_stop, daemon=True).start()
+        try:
+            for line in proc.stdout:
+                text = line.decode("utf-8", errors="ignore").strip()
+                if not text:
+                    continue
+                fields = next(csv.reader([text]))
+                path = os.path.join(output_dir, os.path.basename(fields[0]))
+                if len(fields) >= 3:
+                    yield path, float(fields[1]), float(fields[2])
+                else:
+                    yield path, None, None
+            returncode = proc.wait()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+        if returncode != 0:
+            stderr_file.seek(0)
+            raise subprocess.CalledProcessError(
+                returncode, cmd, stderr=stderr_file.read()
+            )
+
+
+def iter_video_chunks(
+    video_path: str, output_dir: str, chunk_duration_seconds: int
+) -> Iterator[Tuple[str, float, float]]:
+    # Yields (chunk_path, start, end) in order as ffmpeg finishes writing each
+    # segment, so analysis can start before the whole file has been split.
+    # start and end are the segment's times in the source; with stream copy
+    # a segment runs to the first keyframe after its boundary, so they are
+    # not multiples of chunk_duration_seconds and there may be fewer chunks.
+    os.makedirs(output_dir, exist_ok=True)
+    output_pattern = os.path.join(output_dir, "chunk_%04d.mp4")
+
+    produced = 0
     try:
-        subprocess.run(
-            cmd_copy, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
+        for segment in _iter_segments(
+            _segment_command(video_path, output_pattern, chunk_duration_seconds, False),
+            output_dir,
+        ):
+            produced += 1
+            yield segment
+        return
     except subprocess.CalledProcessError as exc:
+        if produced:
+            # Chunks were already handed out; a re-encode would renumber them.
+            raise
         logger.warning(
             "FFmpeg stream copy failed, falling back to re-encode: %s",
-            exc.stderr.decode("utf-8", errors="ignore")[:400],
-        )
-        cmd_encode = [
-            "ffmpeg",
-            "-y",
-            "-i",
-            video_path,
-            "-c:v",
-            "libx264",
-            "-preset",
-            "veryfast",
-            "-crf",
-            "23",
-            "-c:a",
-            "aac",
-            "-b:a",
-            "128k",
-            "-f",
-            "segment",
-            "-segment_time",
-            str(chunk_duration_seconds),
-            "-reset_timestamps",
-            "1",
-            output_pattern,
-        ]
-        subprocess.run(
-            cmd_encode, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            (exc.stderr or b"").decode("utf-8", errors="ignore")[:400],
         )
 
-    chunks = sorted(glob.glob(os.path.join(output_dir, "chunk_*.mp4")))
-    return chunks
+    yield from _iter_segments(
+        _segment_command(video_path, output_pattern, chunk_duration_seconds, True),
+        output_dir,
+    )
+
+
+STREAM_CHUNK_PATTERN = "chunk_%06d.mp4"
+
+
+def iter_stream_chunks(
+    url: str,
+    output_dir: str,
+    chunk_duration_seconds: int,
+    start_index: int = 0,
+    retention_chunks: int = 0,
+    stop_event: Optional[threading.Event] = None,
+    max_reconnects: int = 5,
+    reconnect_delay_seconds: float = 2.0,
+    release_chunk: Optional[Callable[[int], bool]] = None,
+) -> Iterator[Tuple[int, str]]:
+    # Segments a live source (RTSP/HLS/UDP URL, file or named pipe) into
+    # rolling chunks and yields (chunk_index, path) as each one closes. Only
+    # the newest retention_chunks files are kept on disk (0 keeps all).
+    # A chunk past retention is deleted once release_chunk(index) returns
+    # True; until then it is kept and asked again after the next chunk.
+    # Reconnects when the source drops; stops when stop_event is set or the
+    # source ends.
+    os.makedirs(output_dir, exist_ok=True)
+    output_pattern = os.path.join(output_dir, STREAM_CHUNK_PATTERN)
+    index = start_index
+    failures = 0
+    expired: Deque[int] = deque()
+
+    def remove_expired() -> None:
+        while expired:
+            if release_chunk is not None and not release_chunk(expired[0]):
+                # Kept in order: a chunk still being analyzed holds back the
+                # newer ones too, which are then released together.
+                return
+            path = output_pattern % expired.popleft()
+            if os.path.exists(path):
+                os.remove(path)
+    while True:
+        produced = 0
+        try:
+            for chunk_path, _, _ in _iter_segments(
+                _stream_segment_command(
+                    url, output_pattern, chunk_duration_seconds, index
+                ),
+                output_dir,
+                stop_event=stop_event,
+            ):
+                produced += 1
+                yield index, chunk_path
+                if retention_chunks > 0 and index >= retention_chunks:
+                    expired.append(index - retention_chunks)
+                    remove_expired()
+                index += 1
+            return
+        except subprocess.CalledProcessError as exc:
+            if stop_event is not None and stop_event.is_set():
+                return
+            failures = 0 if produced else failures + 1
+            if failures > max_reconnects:
+                raise
+            logger.warning(
+                "Stream %s dropped, reconnecting: %s",
+                url,
+                (exc.stderr or b"").decode("utf-8", errors="ignore")[:400],
+            )
+        if stop_event is not None:
+            if stop_event.wait(reconnect_delay_seconds):
+                return
+        else:
+            time.sleep(reconnect_delay_seconds)
+
+
+def split_video_to_chunks(
+    video_path: str, output_dir: str, chunk_duration_seconds: int
+) -> List[str]:
+    return [
+        chunk_path
+        for chunk_path, _, _ in iter_video_chunks(
+            video_path, output_dir, chunk_duration_seconds
+        )
+    ]
 
 
 def get_video_duration_seconds(video_path: str) -> float:
@@ -90,3 +287,78 @@ def get_video_duration_seconds(video_path: str) -> float:
         return float(raw)
     except ValueError:
         return 0.0
+
+
+def get_keyframe_times(video_path: str) -> List[float]:
+    # Presentation times of the video keyframes; reads packet flags only, so
+    # nothing is decoded.
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+        video_path,
+    ]
+    result = subprocess.run(
+        cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    times = []
+    for line in result.stdout.decode("utf-8", errors="ignore").splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" not in flags:
+            continue
+        try:
+            times.append(float(pts_time))
+        except ValueError:
+            continue
+    return sorted(times)
+
+
+def plan_virtual_chunks(
+    duration_seconds: float, chunk_duration_seconds: int
+) -> List[Tuple[float, float]]:
+    # Logical chunks are exact time ranges of the source; nothing is written.
+    ranges = []
+    start = 0.0
+    while start < duration_seconds:
+        end = min(start + chunk_duration_seconds, duration_seconds)
+        ranges.append((round(start, 3), round(end, 3)))
+        start += chunk_duration_seconds
+    return ranges
+
+
+def cut_clip_command(
+    video_path: str, start: float, end: float, keyframes: List[float]
+) -> List[str]:
+    # Stream-copies [start, end) of the source as fragmented MP4 on stdout.
+    # A copy can only begin on a keyframe, so the cut starts at the last
+    # keyframe at or before start and runs until end.
+    idx = bisect.bisect_right(keyframes, start) - 1
+    cut_start = keyframes[idx] if idx >= 0 else start
+    return [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-ss",
+        f"{cut_start:.3f}",
+        "-i",
+        video_path,
+        "-t",
+        f"{max(end - cut_start, 0.1):.3f}",
+        "-map",
+        "0",
+        "-c",
+        "copy",
+        "-avoid_negative_ts",
+        "make_zero",
+        "-movflags",
+        "frag_keyframe+empty_moov+default_base_moof",
+        "-f",
+        "mp4",
+        "pipe:1",
+    ]
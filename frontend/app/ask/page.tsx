@@ -77,7 +77,13 @@ export default function AskPage() {
     mode: "ask",
   });
 
-  const { progress, chunksAnalyzed, totalChunks, failedChunks } = useProcessingStatus({
+  const {
+    progress,
+    chunksAnalyzed,
+    totalChunks,
+    failedChunks,
+    segmentationError,
+  } = useProcessingStatus({
     sessionId,
     enabled: hasSession,
     pollInterval: 2000,
@@ -186,6 +192,7 @@ export default function AskPage() {
               chunksAnalyzed={chunksAnalyzed}
               totalChunks={totalChunks}
               failedChunks={failedChunks}
+              segmentationError={segmentationError}
             />
           </div>
 
@@ -6,6 +6,7 @@ interface ProcessingStatusProps {
   chunksAnalyzed: number;
   totalChunks: number;
   failedChunks?: number;
+  segmentationError?: string | null;
 }
 
 /** Displays video processing progress and chunks analyzed. */
@@ -14,6 +15,7 @@ export function ProcessingStatus({
   chunksAnalyzed,
   totalChunks,
   failedChunks = 0,
+  segmentationError = null,
 }: ProcessingStatusProps) {
   return (
     <div className="mt-4 space-y-2">
@@ -38,6 +40,11 @@ export function ProcessingStatus({
           Analysis warning: {failedChunks} chunk{failedChunks === 1 ? "" : "s"} failed to process.
         </p>
       )}
+      {segmentationError && (
+        <p className="text-xs text-red-300">
+          Segmentation stopped early; the rest of the video was not analyzed: {segmentationError}
+        </p>
+      )}
     </div>
   );
 }
@@ -71,6 +71,7 @@ export default function DashboardPage() {
     chunksAnalyzed,
     totalChunks,
     failedChunks,
+    segmentationError,
   } = useProcessingStatus({ sessionId, enabled: hasSession, pollInterval: 2000 });
 
   const {
@@ -148,6 +149,7 @@ export default function DashboardPage() {
               chunksAnalyzed={chunksAnalyzed}
               totalChunks={totalChunks}
               failedChunks={failedChunks}
+              segmentationError={segmentationError}
             />
           </div>
 
@@ -2,6 +2,7 @@
 
 import { useState, useCallback, useEffect } from "react";
 import { fetchProcessingStatus } from "@/lib/api";
+import type { ProcessingStatus } from "@/lib/api";
 
 /** Options for useProcessingStatus hook */
 interface UseProcessingStatusOptions {
@@ -17,7 +18,7 @@ export function useProcessingStatus(options: UseProcessingStatusOptions = {}) {
     enabled = true,
     pollInterval = 5000,
   } = options;
-  const [status, setStatus] = useState({
+  const [status, setStatus] = useState<ProcessingStatus>({
     progress: 0,
     chunksAnalyzed: 0,
     totalChunks: 0,
@@ -56,6 +57,7 @@ export function useProcessingStatus(options: UseProcessingStatusOptions = {}) {
     chunksAnalyzed: status.chunksAnalyzed,
     totalChunks: status.totalChunks,
     failedChunks: status.failedChunks ?? 0,
+    segmentationError: status.segmentationError ?? null,
     isLoading,
     error,
     refetch: load,
@@ -12,6 +12,7 @@ export interface ProcessingStatus {
   chunksAnalyzed: number;
   totalChunks: number;
   failedChunks?: number;
+  segmentationError?: string | null;
 }
 
 /** Active video session metadata */